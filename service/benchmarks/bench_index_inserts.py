@@ -0,0 +1,123 @@
+"""Insert throughput of `messages` before and after dropping dead indexes.
+
+Needs a Postgres with the service schema (for the `type` enum and
+uuid_generate_v7). Builds two scratch tables with the columns of `messages`:
+one with the index set of migrations 000001-000006, one with the set left
+after 000007. It then inserts the same batches into each, the way the group
+commit does (multi-row INSERT of `--batch` rows), and reports rows/s and
+index size as JSON.
+
+    python benchmarks/bench_index_inserts.py --rows 2000000 --json indexes.json
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import asyncpg
+
+ROOT = Path(__file__).resolve().parents[1]
+for p in (ROOT, ROOT / "src"):
+    if str(p) not in sys.path:
+        sys.path.insert(0, str(p))
+
+from db.connection import AsyncDatabase  # noqa: E402
+
+# Índices secundarios de cada variante (la PK es común a ambas)
+KEPT = [
+    "(thread_id, user_id)",
+    "(thread_id, type, created_at)",
+    "(thread_id, deleted_at, created_at)",
+    "(user_id, created_at)",
+    "(thread_id, id)",
+    "(created_at)",
+    "((lower(content)))",
+    "(thread_id, created_at DESC, id DESC) WHERE deleted_at IS NULL",
+]
+PRUNED = [
+    "(user_id, created_at)",
+    "(thread_id, id)",
+    "(thread_id, created_at DESC, id DESC) WHERE deleted_at IS NULL",
+]
+VARIANTS = {"before_000007": KEPT, "after_000007": PRUNED}
+
+
+async def _bench(
+    conn: asyncpg.Connection,
+    name: str,
+    indexes: List[str],
+    rows: int,
+    batch: int,
+    threads: int,
+) -> Dict[str, Any]:
+    table = f"bench_messages_{name}"
+    await conn.execute(f"DROP TABLE IF EXISTS {table}")
+    await conn.execute(
+        f"CREATE TABLE {table} (LIKE messages INCLUDING DEFAULTS, PRIMARY KEY (id, created_at))"
+    )
+    for columns in indexes:
+        await conn.execute(f"CREATE INDEX ON {table} {columns}")
+    # Mismo INSERT multi-fila que CreateMessagesBatch, con contenido realista
+    insert = f"""
+        INSERT INTO {table} (id, thread_id, user_id, type, content, created_at, updated_at)
+        SELECT uuid_generate_v7(),
+               ('00000000-0000-0000-0000-' || lpad(to_hex(g % $2), 12, '0'))::uuid,
+               gen_random_uuid(), 'text', repeat('hola ', 20), NOW(), NOW()
+        FROM generate_series(1, $1) AS g
+    """
+    started = time.perf_counter()
+    done = 0
+    while done < rows:
+        n = min(batch, rows - done)
+        await conn.execute(insert, n, threads)
+        done += n
+    elapsed = time.perf_counter() - started
+    index_bytes = await conn.fetchval("SELECT pg_indexes_size($1::regclass)", table)
+    await conn.execute(f"DROP TABLE {table}")
+    return {
+        "indexes": len(indexes),
+        "rows": rows,
+        "seconds": round(elapsed, 2),
+        "rows_per_s": round(rows / elapsed),
+        "index_bytes": index_bytes,
+    }
+
+
+async def main_async(args: argparse.Namespace) -> Dict[str, Any]:
+    conn = await asyncpg.connect(args.dsn)
+    try:
+        return {
+            name: await _bench(conn, name, indexes, args.rows, args.batch, args.threads)
+            for name, indexes in VARIANTS.items()
+        }
+    finally:
+        await conn.close()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--dsn", default=AsyncDatabase().dsn())
+    ap.add_argument("--rows", type=int, default=2_000_000)
+    ap.add_argument("--batch", type=int, default=64)
+    ap.add_argument("--threads", type=int, default=10_000)
+    ap.add_argument("--json", help="write results to this file")
+    args = ap.parse_args()
+
+    results = asyncio.run(main_async(args))
+    for name, r in results.items():
+        print(
+            f"{name:14s} {r['indexes']} indexes: {r['rows_per_s']:,} rows/s, "
+            f"indexes {r['index_bytes'] / 2**20:,.0f} MiB"
+        )
+    before, after = results["before_000007"], results["after_000007"]
+    print(f"speedup x{after['rows_per_s'] / before['rows_per_s']:.2f}")
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Client-side decode cost of a page of `paths`: jsonb vs text[].
+
+Needs a Postgres (any database). Fills a temp table with `--limit` rows
+holding the same path list as jsonb and as text[], then times fetching the
+page through each column: jsonb with the stdlib codec (before 000008),
+jsonb with the orjson codec, and text[] decoded natively by asyncpg. An
+`id`-only fetch is the round-trip baseline; `decode_us` is the difference.
+
+    python benchmarks/bench_paths_decode.py --limit 200 --json paths.json
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict
+
+import asyncpg
+
+ROOT = Path(__file__).resolve().parents[1]
+for p in (ROOT, ROOT / "src"):
+    if str(p) not in sys.path:
+        sys.path.insert(0, str(p))
+
+from db.connection import AsyncDatabase, json_dumps, json_loads  # noqa: E402
+
+PATHS = ["/a/b/c.png", "/a/b/d.pdf", "/a/e.txt"]
+
+
+async def _time_fetch(conn: asyncpg.Connection, sql: str, limit: int, n: int) -> float:
+    stmt = await conn.prepare(sql)
+    await stmt.fetch(limit)
+    times = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        await stmt.fetch(limit)
+        times.append(time.perf_counter() - t0)
+    return statistics.median(times) * 1e6
+
+
+async def _with_codec(
+    dsn: str, encoder: Callable[[Any], str], decoder: Callable[[str], Any]
+) -> asyncpg.Connection:
+    conn = await asyncpg.connect(dsn)
+    await conn.set_type_codec(
+        "jsonb", encoder=encoder, decoder=decoder, schema="pg_catalog"
+    )
+    return conn
+
+
+async def main_async(args: argparse.Namespace) -> Dict[str, Any]:
+    stdlib = await _with_codec(args.dsn, json.dumps, json.loads)
+    fast = await _with_codec(args.dsn, json_dumps, json_loads)
+    try:
+        for conn in (stdlib, fast):
+            # Tabla temporal por conexión, con las mismas filas
+            await conn.execute("""
+                CREATE TEMP TABLE bench_paths (
+                  id int PRIMARY KEY, paths_jsonb jsonb, paths_array text[]
+                )
+                """)
+            await conn.execute(
+                """
+                INSERT INTO bench_paths
+                SELECT g, $2::jsonb, $3::text[] FROM generate_series(1, $1) AS g
+                """,
+                args.limit,
+                PATHS,
+                PATHS,
+            )
+        select = "SELECT {} FROM bench_paths ORDER BY id LIMIT $1"
+        baseline = await _time_fetch(stdlib, select.format("id"), args.limit, args.n)
+        cases = {
+            "jsonb.stdlib": (stdlib, "id, paths_jsonb"),
+            "jsonb.orjson": (fast, "id, paths_jsonb"),
+            "text_array": (stdlib, "id, paths_array"),
+        }
+        results: Dict[str, Any] = {
+            "limit": args.limit,
+            "baseline_us": round(baseline, 1),
+        }
+        for name, (conn, columns) in cases.items():
+            total = await _time_fetch(conn, select.format(columns), args.limit, args.n)
+            results[name] = {
+                "page_us": round(total, 1),
+                "decode_us": round(total - baseline, 1),
+            }
+        return results
+    finally:
+        await stdlib.close()
+        await fast.close()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--dsn", default=AsyncDatabase().dsn())
+    ap.add_argument("--limit", type=int, default=200)
+    ap.add_argument("-n", type=int, default=500, help="fetches per case")
+    ap.add_argument("--json", help="write results to this file")
+    args = ap.parse_args()
+
+    results = asyncio.run(main_async(args))
+    print(f"baseline (id only): {results['baseline_us']:.1f} us/page")
+    for name in ("jsonb.stdlib", "jsonb.orjson", "text_array"):
+        r = results[name]
+        print(
+            f"{name:13s} {r['page_us']:9.1f} us/page, decode ~{r['decode_us']:.1f} us"
+        )
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Insert throughput with random (v4) vs time-ordered (v7) message ids.
+
+Needs a Postgres with migration 000005 applied (uuid_generate_v7). For each
+id kind it creates a scratch table shaped like `messages` (PK on id plus the
+(thread_id, id) seek index), inserts `--rows` rows in chunks of `--chunk`
+with generate_series, and reports rows/s per chunk, so the slowdown of
+random inserts as the indexes outgrow shared_buffers is visible. Tables are
+dropped at the end unless `--keep`.
+
+    python benchmarks/bench_uuid_inserts.py --rows 10000000 --json v4_v7.json
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import asyncpg
+
+ROOT = Path(__file__).resolve().parents[1]
+for p in (ROOT, ROOT / "src"):
+    if str(p) not in sys.path:
+        sys.path.insert(0, str(p))
+
+from db.connection import AsyncDatabase  # noqa: E402
+
+GENERATORS = {"v4": "gen_random_uuid()", "v7": "uuid_generate_v7()"}
+
+
+async def _bench(
+    conn: asyncpg.Connection, kind: str, rows: int, chunk: int, threads: int, keep: bool
+) -> Dict[str, Any]:
+    table = f"bench_messages_uuid_{kind}"
+    await conn.execute(f"DROP TABLE IF EXISTS {table}")
+    await conn.execute(f"""
+        CREATE TABLE {table} (
+          id uuid PRIMARY KEY,
+          thread_id uuid NOT NULL,
+          created_at timestamp NOT NULL DEFAULT NOW()
+        )
+        """)
+    await conn.execute(f"CREATE INDEX ON {table} (thread_id, id)")
+    thread_ids = await conn.fetchval(
+        "SELECT array_agg(gen_random_uuid()) FROM generate_series(1, $1)", threads
+    )
+    insert = f"""
+        INSERT INTO {table} (id, thread_id)
+        SELECT {GENERATORS[kind]}, ($1::uuid[])[1 + (g % cardinality($1::uuid[]))]
+        FROM generate_series(1, $2) AS g
+    """
+    per_chunk: List[float] = []
+    started = time.perf_counter()
+    done = 0
+    while done < rows:
+        n = min(chunk, rows - done)
+        t0 = time.perf_counter()
+        await conn.execute(insert, thread_ids, n)
+        per_chunk.append(n / (time.perf_counter() - t0))
+        done += n
+        print(f"{kind} {done:>12,d} rows {per_chunk[-1]:>12,.0f} rows/s", flush=True)
+    elapsed = time.perf_counter() - started
+    sizes = await conn.fetchrow(
+        """
+        SELECT pg_relation_size($1::regclass) AS heap,
+               pg_indexes_size($1::regclass) AS indexes
+        """,
+        table,
+    )
+    if not keep:
+        await conn.execute(f"DROP TABLE {table}")
+    tail = per_chunk[-max(1, len(per_chunk) // 10) :]
+    return {
+        "rows": rows,
+        "seconds": round(elapsed, 2),
+        "rows_per_s": round(rows / elapsed),
+        "first_chunk_rows_per_s": round(per_chunk[0]),
+        "last_10pct_rows_per_s": round(statistics.mean(tail)),
+        "heap_bytes": sizes["heap"],
+        "index_bytes": sizes["indexes"],
+    }
+
+
+async def main_async(args: argparse.Namespace) -> Dict[str, Any]:
+    conn = await asyncpg.connect(args.dsn)
+    try:
+        results = {}
+        for kind in args.kinds:
+            results[kind] = await _bench(
+                conn, kind, args.rows, args.chunk, args.threads, args.keep
+            )
+        return results
+    finally:
+        await conn.close()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--dsn", default=AsyncDatabase().dsn())
+    ap.add_argument("--rows", type=int, default=10_000_000)
+    ap.add_argument("--chunk", type=int, default=100_000)
+    ap.add_argument("--threads", type=int, default=10_000)
+    ap.add_argument("--kinds", nargs="+", default=["v4", "v7"], choices=GENERATORS)
+    ap.add_argument("--keep", action="store_true", help="keep the scratch tables")
+    ap.add_argument("--json", help="write results to this file")
+    args = ap.parse_args()
+
+    results = asyncio.run(main_async(args))
+    for kind, r in results.items():
+        print(
+            f"{kind}: {r['rows_per_s']:,} rows/s overall, "
+            f"{r['first_chunk_rows_per_s']:,} first chunk, "
+            f"{r['last_10pct_rows_per_s']:,} last 10%, "
+            f"indexes {r['index_bytes'] / 2**20:,.0f} MiB"
+        )
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2) + "\n")
+
+
+if __name__ == "__main__":
+    main()
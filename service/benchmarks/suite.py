@@ -0,0 +1,407 @@
+"""Microbenchmark suite for the service's hot paths, with JSON output.
+
+Runs offline (no DB, Redis or broker): the controller and the cache are
+monkeypatched and the ASGI app is driven in process.
+
+    python benchmarks/suite.py --json results/HEAD.json
+    python benchmarks/suite.py --compare results/base.json --only cursor
+    python benchmarks/suite.py --quick
+
+Each case reports the best and median time per operation across `repeat`
+rounds of `number` calls; `--compare` prints the ratio against a previous
+run so two commits can be compared case by case.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import datetime
+import json
+import logging
+import logging.handlers
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import timeit
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+from unittest import mock
+
+ROOT = Path(__file__).resolve().parents[1]
+for p in (ROOT, ROOT / "src"):
+    if str(p) not in sys.path:
+        sys.path.insert(0, str(p))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+
+# API abre su archivo de logs al importarse: no tocar disco, solo durante
+# el import
+with mock.patch("os.makedirs"), mock.patch(
+    "logging.handlers.RotatingFileHandler", lambda *a, **k: logging.NullHandler()
+):
+    import API  # noqa: E402
+
+import cache  # noqa: E402
+import Controller  # noqa: E402
+import ids  # noqa: E402
+from db.connection import compile_query, prepare  # noqa: E402
+from db.sqlc.messages import CREATE_MESSAGE  # noqa: E402
+from db.sqlc.messages import LIST_THREAD_MESSAGES_NOT_DELETED_DESC_BEFORE
+from local_cache import LocalCache  # noqa: E402
+
+# nombre -> (función sin argumentos, número de llamadas por ronda)
+Case = Tuple[Callable[[], Any], int]
+
+
+def _rows(n: int) -> List[Dict[str, Any]]:
+    # Dicts con los mismos tipos que devuelve asyncpg (UUID, datetime, list)
+    thread, user = uuid.uuid4(), uuid.uuid4()
+    base = datetime.datetime(2025, 1, 1, 12, 0, 0)
+    return [
+        {
+            "id": uuid.uuid4(),
+            "thread_id": thread,
+            "user_id": user,
+            "type": "text",
+            "content": "hola " * 20,
+            "paths": ["/a/b/c.png"],
+            "created_at": base - datetime.timedelta(seconds=i),
+            "updated_at": None,
+            "deleted_at": None,
+        }
+        for i in range(n)
+    ]
+
+
+class _StdlibJson:
+    """Fuerza el camino de json de la stdlib en cache._dumps/_loads."""
+
+    def __enter__(self) -> None:
+        self._saved, cache.orjson = cache.orjson, None
+
+    def __exit__(self, *exc: Any) -> None:
+        cache.orjson = self._saved
+
+
+def _timed_without_orjson(fn: Callable[[], Any]) -> Callable[[], Any]:
+    def _run() -> Any:
+        with _StdlibJson():
+            return fn()
+
+    return _run
+
+
+def _prepare_per_call(sql: str, params: Dict[str, Any]) -> Tuple[str, List[Any]]:
+    # Lo que hacía AsyncDatabase.prepare antes de la cache: regex en cada llamada
+    compiled = compile_query(sql)
+    return compiled.sql, [params.get(k) for k in compiled.order]
+
+
+def _prepare_cases() -> Dict[str, Case]:
+    create = {
+        "p1": uuid.uuid4(),
+        "p2": uuid.uuid4(),
+        "p3": "text",
+        "p4": "hola",
+        "p5": ["/a"],
+        "p6": None,
+        "p7": None,
+    }
+    before = {"p1": uuid.uuid4(), "p2": None, "p3": uuid.uuid4(), "p4": 50}
+    return {
+        "prepare.create_message": (lambda: prepare(CREATE_MESSAGE, create), 20000),
+        "prepare.list_before": (
+            lambda: prepare(LIST_THREAD_MESSAGES_NOT_DELETED_DESC_BEFORE, before),
+            20000,
+        ),
+        "prepare.create_message.regex_per_call": (
+            lambda: _prepare_per_call(CREATE_MESSAGE, create),
+            20000,
+        ),
+        "prepare.list_before.regex_per_call": (
+            lambda: _prepare_per_call(
+                LIST_THREAD_MESSAGES_NOT_DELETED_DESC_BEFORE, before
+            ),
+            20000,
+        ),
+    }
+
+
+def _id_cases() -> Dict[str, Case]:
+    return {
+        "ids.uuid4": (uuid.uuid4, 50000),
+        "ids.uuid7": (ids.uuid7, 50000),
+    }
+
+
+def _codec_cases() -> Dict[str, Case]:
+    row = _rows(1)[0]
+    encoded = cache._dumps(row)
+    cases: Dict[str, Case] = {
+        "cache.dumps.stdlib": (
+            _timed_without_orjson(lambda: cache._dumps(row)),
+            5000,
+        ),
+        "cache.loads.stdlib": (
+            _timed_without_orjson(lambda: cache._loads(encoded)),
+            5000,
+        ),
+    }
+    if cache.orjson is not None:
+        cases["cache.dumps.orjson"] = (lambda: cache._dumps(row), 5000)
+        cases["cache.loads.orjson"] = (lambda: cache._loads(encoded), 5000)
+    return cases
+
+
+def _page_cases(limits: List[int]) -> Dict[str, Case]:
+    cases: Dict[str, Case] = {}
+    for limit in limits:
+        rows = _rows(limit)
+        items = [API.to_message_out(r) for r in rows]
+        page = API.MessagesPageOut(items=items, next_cursor="x", has_more=True)
+        number = max(10, 10000 // limit)
+        cases[f"to_message_out.{limit}"] = (
+            lambda rows=rows: [API.to_message_out(r) for r in rows],
+            number,
+        )
+        cases[f"messages_page_out.{limit}"] = (
+            lambda page=page: JSONResponse(jsonable_encoder(page)).body,
+            number,
+        )
+        cases[f"encode_messages_page.{limit}"] = (
+            lambda rows=rows: API.encode_messages_page(rows, "x", True),
+            number,
+        )
+    return cases
+
+
+def _pydantic_page(rows: List[Dict[str, Any]], limit: int) -> bytes:
+    # Camino previo a encode_messages_page y al cuerpo en L1: MessageOut,
+    # MessagesPageOut y lo que hace FastAPI con response_model (validar y
+    # volver a serializar)
+    items = [API.to_message_out(r) for r in rows]
+    page = API.MessagesPageOut(
+        items=items, next_cursor="x", has_more=len(rows) == limit
+    )
+    out = API.MessagesPageOut.model_validate(page)
+    return JSONResponse(jsonable_encoder(out)).body
+
+
+def _list_cases(limits: List[int]) -> Dict[str, Case]:
+    # Miss: filas -> Pydantic (comparar con encode_messages_page.*). Hit de la
+    # primera página: parsear la ventana cacheada y pasar por Pydantic vs.
+    # devolver el cuerpo precodificado del L1. L1 propio, así no depende de
+    # cache_enabled() ni del L1 del módulo
+    l1 = LocalCache(10, 3600)
+    cases: Dict[str, Case] = {}
+    for limit in limits:
+        rows = _rows(limit)
+        raw = [cache._dumps(r) for r in rows]
+        body = _pydantic_page(rows, limit)
+        l1.put("t", ("body", limit), (body, API._etag(body)), l1.generation("t"))
+        number = max(10, 10000 // limit)
+        cases[f"list_miss.pydantic.{limit}"] = (
+            lambda rows=rows, limit=limit: _pydantic_page(rows, limit),
+            number,
+        )
+        cases[f"list_hit.pydantic.{limit}"] = (
+            lambda raw=raw, limit=limit: _pydantic_page(
+                [cache._loads(v) for v in raw], limit
+            ),
+            number,
+        )
+        cases[f"list_hit.cached_body.{limit}"] = (
+            lambda limit=limit: API._page_response(
+                *l1.get("t", ("body", limit)), None
+            ).body,
+            number,
+        )
+    return cases
+
+
+def _cursor_cases() -> Dict[str, Case]:
+    row = _rows(1)[0]
+    cur = API._make_cursor(row)
+    assert cur is not None and API._parse_cursor(cur) is not None
+    return {
+        "cursor.build": (lambda: API._make_cursor(row), 50000),
+        "cursor.parse": (lambda: API._parse_cursor(cur), 50000),
+        "cursor.parse_invalid": (lambda: API._parse_cursor("nope"), 50000),
+    }
+
+
+class _AsgiClient:
+    """Conduce la app ASGI en proceso, sin sockets ni httpx."""
+
+    def __init__(self, app: Any) -> None:
+        self.app = app
+        self.loop = asyncio.new_event_loop()
+
+    async def _get(self, path: str, query: bytes) -> int:
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": query,
+            "root_path": "",
+            "headers": [(b"host", b"bench")],
+            "client": ("127.0.0.1", 1),
+            "server": ("bench", 80),
+        }
+        status: List[int] = []
+
+        async def receive() -> Dict[str, Any]:
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message: Dict[str, Any]) -> None:
+            if message["type"] == "http.response.start":
+                status.append(message["status"])
+
+        await self.app(scope, receive, send)
+        return status[0]
+
+    def batch(self, path: str, query: bytes, n: int) -> None:
+        # Cada llamada incluye un run_until_complete (unas decenas de µs)
+        async def _many() -> None:
+            for _ in range(n):
+                status = await self._get(path, query)
+                if status != 200:
+                    raise RuntimeError(f"unexpected status {status}")
+
+        self.loop.run_until_complete(_many())
+
+
+def _asgi_cases(limits: List[int], stack: contextlib.ExitStack) -> Dict[str, Case]:
+    # Controller y caché reemplazados: mide routing, middlewares, validación,
+    # codificación y respuesta, no la red
+    rows_by_limit = {limit: _rows(limit) for limit in limits}
+
+    async def _list(thread_id: Any, page: int, limit: str) -> Any:
+        return rows_by_limit[int(limit)], None
+
+    async def _noop(*args: Any, **kwargs: Any) -> None:
+        return None
+
+    # Vigentes hasta que run() cierra `stack`, después de medir
+    for target, name, value in (
+        (Controller, "ListMessages", _list),
+        (cache, "cache_enabled", lambda: False),
+        (cache, "get_recent_messages", _noop),
+        (cache, "set_recent_messages", _noop),
+        (API, "set_info", lambda msg: None),
+    ):
+        stack.enter_context(mock.patch.object(target, name, value))
+
+    client = _AsgiClient(API.app)
+    thread = uuid.uuid4()
+    cases: Dict[str, Case] = {}
+    for limit in limits:
+        path = f"/threads/{thread}/messages"
+        query = f"limit={limit}".encode()
+        client.batch(path, query, 1)  # arma el stack de middlewares
+        number = max(10, 5000 // limit)
+        cases[f"asgi.list_miss.{limit}"] = (
+            lambda path=path, query=query: client.batch(path, query, 1),
+            number,
+        )
+    return cases
+
+
+def _git_commit() -> str:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            timeout=5,
+        )
+        return out.stdout.strip() or "unknown"
+    except Exception:
+        return "unknown"
+
+
+def _measure(fn: Callable[[], Any], number: int, repeat: int) -> Dict[str, Any]:
+    fn()  # calentamiento
+    rounds = timeit.repeat(fn, number=number, repeat=repeat)
+    per_op = [r / number * 1e6 for r in rounds]
+    return {
+        "number": number,
+        "repeat": repeat,
+        "best_us": round(min(per_op), 4),
+        "median_us": round(statistics.median(per_op), 4),
+    }
+
+
+def run(
+    only: List[str], limits: List[int], repeat: int, scale: float
+) -> Dict[str, Any]:
+    cases: Dict[str, Case] = {}
+    results: Dict[str, Any] = {}
+    with contextlib.ExitStack() as stack:
+        for group in (
+            _prepare_cases(),
+            _id_cases(),
+            _codec_cases(),
+            _page_cases(limits),
+            _list_cases(limits),
+            _cursor_cases(),
+            _asgi_cases(limits, stack),
+        ):
+            cases.update(group)
+
+        for name, (fn, number) in cases.items():
+            if only and not any(name.startswith(o) for o in only):
+                continue
+            results[name] = _measure(fn, max(1, int(number * scale)), repeat)
+    return {
+        "commit": _git_commit(),
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "orjson": cache.orjson is not None,
+        "results": results,
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--json", help="write results to this file")
+    ap.add_argument("--compare", help="previous results file to compare against")
+    ap.add_argument("--only", nargs="*", default=[], help="case name prefixes")
+    ap.add_argument("--limits", type=int, nargs="+", default=[50, 200])
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--quick", action="store_true", help="few calls, for smoke runs")
+    args = ap.parse_args()
+
+    started = time.perf_counter()
+    report = run(args.only, args.limits, args.repeat, 0.02 if args.quick else 1.0)
+    report["seconds"] = round(time.perf_counter() - started, 2)
+
+    base: Dict[str, Any] = {}
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            base = json.load(f).get("results", {})
+
+    for name, r in report["results"].items():
+        line = f"{name:40s} {r['best_us']:12.3f} us/op (median {r['median_us']:.3f})"
+        if name in base and base[name]["best_us"] > 0:
+            line += f"  x{r['best_us'] / base[name]['best_us']:.2f} vs base"
+        print(line)
+
+    if args.json:
+        out = Path(args.json)
+        out.parent.mkdir(parents=True, exist_ok=True)
+        out.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,355 @@
+"""Plan check for every query of db/queries/messages.sql that reads `messages`.
+
+Seeds synthetic rows spread over the last months inside a transaction, runs
+ANALYZE and EXPLAIN (FORMAT JSON) on each sqlc query (INSERTs aside: they
+only route rows) and checks it against what the partitioning promises:
+
+- `ordered`: the thread listings are served by the keyset index in order
+  (no Sort node, and no Merge Append reading every partition)
+- `pruned`: statements by id only scan the partitions of the id's month
+  (UUIDv7 bounds, +-1 day)
+- `report`: counts, searches and listings without a supporting index scan
+  every partition of their filter; their plan is printed, never failed
+
+Everything is rolled back, so it is safe against a dev or staging database.
+EXPLAIN without ANALYZE never runs the UPDATE/DELETE statements.
+
+    python -m db.check_plans [--dsn postgresql://...] [--rows 50000]
+    python -m db.check_plans --json plans.json
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import sys
+import uuid
+from typing import Any, Collection, Dict, Iterator, List, Tuple
+
+import asyncpg
+
+from db import partitions
+from db.connection import AsyncDatabase, prepare
+from db.sqlc import messages as sqlc_messages
+
+KEYSET_INDEX = "idx_messages_thread_keyset_not_deleted"
+
+ORDERED = "ordered"
+PRUNED = "pruned"
+REPORT = "report"
+
+_ORDERED_SCANS = {"Index Scan", "Index Only Scan"}
+_SPREAD_DAYS = 90
+# Cotas de uuid_v7_created_min/max: ±1 día puede cruzar un cambio de mes
+_MAX_PRUNED_PARTITIONS = 2
+
+
+def plan_nodes(node: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """Yield every node of an EXPLAIN (FORMAT JSON) plan tree."""
+    yield node
+    for child in node.get("Plans", ()):
+        yield from plan_nodes(child)
+
+
+def check_plan(plan: Any, indexes: Collection[str] = (KEYSET_INDEX,)) -> List[str]:
+    """Return the problems found in a plan; empty when it scans `indexes` in order.
+
+    `indexes` holds the parent index name plus, on a partitioned table, the
+    per-partition index names Postgres generated for it.
+    """
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    root = plan[0]["Plan"] if isinstance(plan, list) else plan["Plan"]
+    problems: List[str] = []
+    nodes = list(plan_nodes(root))
+    if not any(
+        n.get("Node Type") in _ORDERED_SCANS and n.get("Index Name") in indexes
+        for n in nodes
+    ):
+        used = sorted({n["Index Name"] for n in nodes if "Index Name" in n})
+        problems.append(f"does not scan {KEYSET_INDEX} (indexes: {used or 'none'})")
+    if any(n.get("Node Type") in {"Sort", "Incremental Sort"} for n in nodes):
+        problems.append("plan has a Sort node")
+    if any(n.get("Node Type") == "Merge Append" for n in nodes):
+        problems.append("plan merges every partition (Merge Append)")
+    return problems
+
+
+def check_pruned(plan: Any, limit: int = _MAX_PRUNED_PARTITIONS) -> List[str]:
+    """Return the problems of a by-id plan; empty when pruning kept `limit` or less.
+
+    On a table that is not partitioned there is nothing to prune.
+    """
+    scanned = [p for p in scanned_partitions(plan) if partitions.partition_month(p)]
+    if len(scanned) > limit:
+        return [f"scans {len(scanned)} partitions (expected <= {limit})"]
+    return []
+
+
+def sort_nodes(plan: Any) -> List[str]:
+    """Sort and Merge Append nodes of a plan, for the `report` queries."""
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    root = plan[0]["Plan"] if isinstance(plan, list) else plan["Plan"]
+    kinds = {"Sort", "Incremental Sort", "Merge Append"}
+    return sorted({n["Node Type"] for n in plan_nodes(root) if n["Node Type"] in kinds})
+
+
+def scanned_partitions(plan: Any) -> List[str]:
+    """Relations scanned by the plan (partitions that survived pruning)."""
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    root = plan[0]["Plan"] if isinstance(plan, list) else plan["Plan"]
+    return sorted(
+        {n["Relation Name"] for n in plan_nodes(root) if "Relation Name" in n}
+    )
+
+
+async def _keyset_indexes(conn: asyncpg.Connection) -> List[str]:
+    rows = await conn.fetch(
+        """
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = $1::regclass
+        """,
+        KEYSET_INDEX,
+    )
+    return [KEYSET_INDEX] + [r["relname"] for r in rows]
+
+
+def uuid7_at(ts: datetime.datetime) -> uuid.UUID:
+    """A UUIDv7 whose timestamp is `ts` (naive timestamps are taken as UTC)."""
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=datetime.timezone.utc)
+    ms = int(ts.timestamp() * 1000)
+    rand = uuid.uuid4().int
+    value = (ms << 80) | (0x7 << 76) | (rand & ((1 << 76) - 1))
+    # Variante RFC 9562 (bits 10)
+    value = (value & ~(0b11 << 62)) | (0b10 << 62)
+    return uuid.UUID(int=value)
+
+
+def _cases(
+    thread_id: uuid.UUID, user_id: uuid.UUID, before: datetime.datetime
+) -> Dict[str, Tuple[str, str, List[Any]]]:
+    """Query name -> (expectation, SQL, values) for every non-INSERT query."""
+    q = sqlc_messages
+    message_id = uuid7_at(before)
+    since = before - datetime.timedelta(days=7)
+    params: Dict[str, Tuple[str, str, Dict[str, Any]]] = {
+        "GET_MESSAGE_BY_ID": (PRUNED, q.GET_MESSAGE_BY_ID, {"p1": message_id}),
+        "GET_MESSAGE_BY_ID_FOR_UPDATE": (
+            PRUNED,
+            q.GET_MESSAGE_BY_ID_FOR_UPDATE,
+            {"p1": message_id},
+        ),
+        "UPDATE_MESSAGE_CONTENT_AND_PATHS": (
+            PRUNED,
+            q.UPDATE_MESSAGE_CONTENT_AND_PATHS,
+            {"p1": message_id, "p2": "plan check"},
+        ),
+        "SOFT_DELETE_MESSAGE": (PRUNED, q.SOFT_DELETE_MESSAGE, {"p1": message_id}),
+        "UPDATE_THREAD_MESSAGE_CONTENT_AND_PATHS": (
+            PRUNED,
+            q.UPDATE_THREAD_MESSAGE_CONTENT_AND_PATHS,
+            {"p1": message_id, "p2": thread_id, "p3": "plan check"},
+        ),
+        "SOFT_DELETE_THREAD_MESSAGE": (
+            PRUNED,
+            q.SOFT_DELETE_THREAD_MESSAGE,
+            {"p1": message_id, "p2": thread_id},
+        ),
+        "RESTORE_MESSAGE": (PRUNED, q.RESTORE_MESSAGE, {"p1": message_id}),
+        "DELETE_MESSAGE_HARD": (PRUNED, q.DELETE_MESSAGE_HARD, {"p1": message_id}),
+        "COUNT_THREAD_MESSAGES": (REPORT, q.COUNT_THREAD_MESSAGES, {"p1": thread_id}),
+        "COUNT_THREAD_MESSAGES_NOT_DELETED": (
+            REPORT,
+            q.COUNT_THREAD_MESSAGES_NOT_DELETED,
+            {"p1": thread_id},
+        ),
+        "COUNT_USER_MESSAGES": (REPORT, q.COUNT_USER_MESSAGES, {"p1": user_id}),
+        "LIST_THREAD_MESSAGES_NOT_DELETED_DESC_FIRST": (
+            ORDERED,
+            q.LIST_THREAD_MESSAGES_NOT_DELETED_DESC_FIRST,
+            {"p1": thread_id, "p2": 50},
+        ),
+        "LIST_THREAD_MESSAGES_NOT_DELETED_DESC_BEFORE": (
+            ORDERED,
+            q.LIST_THREAD_MESSAGES_NOT_DELETED_DESC_BEFORE,
+            {"p1": thread_id, "p2": before, "p3": uuid.uuid4(), "p4": 50},
+        ),
+        "LIST_THREAD_MESSAGES_SEEK_AFTER": (
+            REPORT,
+            q.LIST_THREAD_MESSAGES_SEEK_AFTER,
+            {"p1": thread_id, "p2": message_id, "p3": 50},
+        ),
+        "LIST_THREAD_MESSAGES_SEEK_BEFORE": (
+            REPORT,
+            q.LIST_THREAD_MESSAGES_SEEK_BEFORE,
+            {"p1": thread_id, "p2": message_id, "p3": 50},
+        ),
+        "LIST_THREAD_MESSAGES_BY_TYPE_DESC_FIRST": (
+            REPORT,
+            q.LIST_THREAD_MESSAGES_BY_TYPE_DESC_FIRST,
+            {"p1": thread_id, "p2": "text", "p3": 50},
+        ),
+        "LIST_THREAD_MESSAGES_BY_TYPE_DESC_BEFORE": (
+            REPORT,
+            q.LIST_THREAD_MESSAGES_BY_TYPE_DESC_BEFORE,
+            {"p1": thread_id, "p2": "text", "p3": before, "p4": message_id, "p5": 50},
+        ),
+        "LIST_USER_MESSAGES_SINCE": (
+            REPORT,
+            q.LIST_USER_MESSAGES_SINCE,
+            {"p1": user_id, "p2": since, "p3": 50},
+        ),
+        "LIST_THREAD_MESSAGES_BY_USER": (
+            REPORT,
+            q.LIST_THREAD_MESSAGES_BY_USER,
+            {"p1": thread_id, "p2": user_id, "p3": 50},
+        ),
+        "SEARCH_THREAD_MESSAGES_FTS": (
+            REPORT,
+            q.SEARCH_THREAD_MESSAGES_FTS,
+            {"p1": thread_id, "p2": "plan", "p3": 50},
+        ),
+        "SEARCH_THREAD_MESSAGES_TRGM": (
+            REPORT,
+            q.SEARCH_THREAD_MESSAGES_TRGM,
+            {"p1": thread_id, "p2": "plan", "p3": 50},
+        ),
+        "FIND_MESSAGES_BY_CONTENT_LOWER_PREFIX": (
+            REPORT,
+            q.FIND_MESSAGES_BY_CONTENT_LOWER_PREFIX,
+            {"p1": "plan", "p2": 50},
+        ),
+        "LIST_THREAD_MESSAGES_BY_PATH_CONTAINS": (
+            REPORT,
+            q.LIST_THREAD_MESSAGES_BY_PATH_CONTAINS,
+            {"p1": thread_id, "p2": ["/a"], "p3": 50},
+        ),
+        "LIST_MESSAGES_BY_CREATED_AT_RANGE": (
+            REPORT,
+            q.LIST_MESSAGES_BY_CREATED_AT_RANGE,
+            {"p1": since, "p2": before, "p3": 50},
+        ),
+        "GET_LATEST_MESSAGE_IN_THREAD": (
+            REPORT,
+            q.GET_LATEST_MESSAGE_IN_THREAD,
+            {"p1": thread_id},
+        ),
+        "GET_LATEST_NOT_DELETED_MESSAGE_IN_THREAD": (
+            ORDERED,
+            q.GET_LATEST_NOT_DELETED_MESSAGE_IN_THREAD,
+            {"p1": thread_id},
+        ),
+    }
+    cases: Dict[str, Tuple[str, str, List[Any]]] = {}
+    for name, (expect, sql, values) in params.items():
+        compiled, args = prepare(sql, values)
+        cases[name.lower()] = (expect, compiled, args)
+    return cases
+
+
+def evaluate(expect: str, plan: Any, indexes: Collection[str]) -> Dict[str, Any]:
+    """Problems (only for `ordered` and `pruned`), sort nodes and scanned relations."""
+    if expect == ORDERED:
+        problems = check_plan(plan, indexes)
+    elif expect == PRUNED:
+        problems = check_pruned(plan)
+    else:
+        problems = []
+    return {
+        "expect": expect,
+        "problems": problems,
+        "sort_nodes": sort_nodes(plan),
+        "scans": scanned_partitions(plan),
+    }
+
+
+def format_result(name: str, result: Dict[str, Any]) -> str:
+    if result["problems"]:
+        status = "FAIL: " + "; ".join(result["problems"])
+    elif result["expect"] == REPORT:
+        status = "info" + (
+            ": " + ", ".join(result["sort_nodes"]) if result["sort_nodes"] else ""
+        )
+    else:
+        status = "ok"
+    scans = f"{len(result['scans'])} scanned: {', '.join(result['scans'])}"
+    return f"{name} [{result['expect']}]: {status} ({scans})"
+
+
+async def run(dsn: str, rows: int, threads: int) -> Dict[str, Dict[str, Any]]:
+    """Seed, EXPLAIN every case and roll back; query name -> `evaluate` result."""
+    conn = await asyncpg.connect(dsn)
+    tr = conn.transaction()
+    await tr.start()
+    results: Dict[str, Dict[str, Any]] = {}
+    try:
+        thread_ids = [uuid.uuid4() for _ in range(threads)]
+        user_ids = [uuid.uuid4() for _ in range(max(1, threads // 10))]
+        partitioned = await conn.fetchval(
+            "SELECT relkind = 'p' FROM pg_class WHERE oid = 'messages'::regclass"
+        )
+        if partitioned:
+            # Particiones para los meses sembrados (se revierten con el resto)
+            month = partitions.month_start(datetime.date.today())
+            for n in range(-_SPREAD_DAYS // 28 - 1, 1):
+                await conn.execute(
+                    partitions.create_sql(
+                        partitions.partition_for(partitions.add_months(month, n))
+                    )
+                )
+        # Distribución realista: muchos hilos, ~10% de mensajes borrados,
+        # repartidos en los últimos _SPREAD_DAYS días
+        await conn.execute(
+            """
+            INSERT INTO messages
+              (id, thread_id, user_id, type, content, created_at, updated_at,
+               deleted_at)
+            SELECT gen_random_uuid(), ($1::uuid[])[1 + g % cardinality($1::uuid[])],
+                   ($4::uuid[])[1 + g % cardinality($4::uuid[])], 'text',
+                   'plan check', NOW() - g * ($3::int * interval '1 day' / $2),
+                   NOW(), CASE WHEN g % 10 = 0 THEN NOW() END
+            FROM generate_series(1, $2) AS g
+            """,
+            thread_ids,
+            rows,
+            _SPREAD_DAYS,
+            user_ids,
+        )
+        await conn.execute("ANALYZE messages")
+        indexes = await _keyset_indexes(conn)
+        # Cursor a mitad del rango: debería podar las particiones más nuevas
+        before = datetime.datetime.now() - datetime.timedelta(days=_SPREAD_DAYS // 2)
+        cases = _cases(thread_ids[0], user_ids[0], before)
+        for name, (expect, sql, values) in cases.items():
+            plan = await conn.fetchval("EXPLAIN (FORMAT JSON) " + sql, *values)
+            results[name] = evaluate(expect, plan, indexes)
+    finally:
+        await tr.rollback()
+        await conn.close()
+    return results
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--dsn", default=AsyncDatabase().dsn())
+    ap.add_argument("--rows", type=int, default=50_000)
+    ap.add_argument("--threads", type=int, default=100)
+    ap.add_argument("--json", help="also write the results to this file")
+    args = ap.parse_args()
+    results = asyncio.run(run(args.dsn, args.rows, args.threads))
+    for name, result in results.items():
+        print(format_result(name, result))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+    sys.exit(1 if any(r["problems"] for r in results.values()) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,264 @@
+import asyncio
 import json
 import os
 import re
-from typing import Any, Dict, List, Optional, Tuple
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
 
 import asyncpg
 
+try:
+    import orjson  # type: ignore
+except Exception:  # pragma: no cover - opcional
+    orjson = None  # type: ignore
+
+from db.sqlc import messages as sqlc_messages
+from db.sqlc import outbox as sqlc_outbox
+
+
+def json_dumps(obj: Any) -> str:
+    """JSON text for json/jsonb values (orjson when installed)."""
+    if orjson is not None:
+        return orjson.dumps(obj).decode("utf-8")
+    return json.dumps(obj)
+
+
+json_loads: Callable[[str], Any] = json.loads if orjson is None else orjson.loads
+
+
+class CompiledQuery(NamedTuple):
+    sql: str  # SQL con parámetros posicionales "$N"
+    order: Tuple[str, ...]  # nombre del parámetro (pN) para cada "$N"
+
+
+def compile_query(sql: str) -> CompiledQuery:
+    """Convert ":pN" named params to asyncpg "$N" positional params.
+
+    Preserves the order of first appearance in the SQL string and
+    unescapes sqlc's "\\:" (e.g. "\\:\\:jsonb" casts) back to ":".
+    """
+    order: List[str] = []
+    mapping: Dict[str, int] = {}
+
+    def repl(match: re.Match[str]) -> str:
+        key = match.group(1)  # e.g., p1
+        if key not in mapping:
+            mapping[key] = len(order) + 1
+            order.append(key)
+        return f"${mapping[key]}"
+
+    new_sql = re.sub(r":(p\d+)\b", repl, sql).replace("\\:", ":")
+    return CompiledQuery(new_sql, tuple(order))
+
+
+def _compile_module(module: Any) -> Dict[str, CompiledQuery]:
+    return {
+        value: compile_query(value)
+        for name, value in vars(module).items()
+        if name.isupper() and isinstance(value, str) and "-- name:" in value
+    }
+
+
+# Todas las queries de sqlc se compilan una sola vez al importar
+COMPILED: Dict[str, CompiledQuery] = {
+    **_compile_module(sqlc_messages),
+    **_compile_module(sqlc_outbox),
+}
+
+# Statements del camino caliente (crear y primera página / cursor de la
+# lista): se preparan en cada conexión del pool al abrirla
+HOT_STATEMENTS: Tuple[str, ...] = (
+    sqlc_messages.CREATE_MESSAGE,
+    sqlc_messages.LIST_THREAD_MESSAGES_NOT_DELETED_DESC_FIRST,
+    sqlc_messages.LIST_THREAD_MESSAGES_NOT_DELETED_DESC_BEFORE,
+)
+
+
+# Observadores de ejecución: fn(sql, segundos) tras cada statement
+QueryObserver = Callable[[str, float], None]
+_query_observers: List[QueryObserver] = []
+_query_names: Dict[str, str] = {}
+
+
+def add_query_observer(fn: QueryObserver) -> None:
+    """Register `fn(sql, seconds)`, called after every statement on the pool."""
+    if fn not in _query_observers:
+        _query_observers.append(fn)
+
+
+def remove_query_observer(fn: QueryObserver) -> None:
+    if fn in _query_observers:
+        _query_observers.remove(fn)
+
+
+def query_name(sql: str) -> str:
+    """sqlc query name from the "-- name: X :kind" header, or "raw"."""
+    name = _query_names.get(sql)
+    if name is None:
+        head = sql.lstrip().split("\n", 1)[0].split()
+        name = head[2] if head[:2] == ["--", "name:"] and len(head) > 2 else "raw"
+        if len(_query_names) < 1024:
+            _query_names[sql] = name
+    return name
+
+
+# Observadores de espera del pool: fn(segundos) tras cada acquire
+AcquireObserver = Callable[[float], None]
+_acquire_observers: List[AcquireObserver] = []
+
+
+def add_acquire_observer(fn: AcquireObserver) -> None:
+    """Register `fn(seconds)`, called with the wait of every `pool.acquire()`."""
+    if fn not in _acquire_observers:
+        _acquire_observers.append(fn)
+
+
+# Observadores de statements lentos: fn(sql, args, segundos) solo por encima
+# del umbral, así el caso normal no paga nada por los argumentos
+SlowQueryObserver = Callable[[str, Tuple[Any, ...], float], None]
+_slow_observers: List[Tuple[float, SlowQueryObserver]] = []
+
+
+def add_slow_query_observer(fn: SlowQueryObserver, threshold: float) -> None:
+    """Register `fn(sql, args, seconds)` for statements slower than `threshold`.
+
+    For `fetchmany`/`executemany` the args are those of the first row.
+    """
+    if all(f is not fn for _, f in _slow_observers):
+        _slow_observers.append((threshold, fn))
+
+
+def remove_slow_query_observer(fn: SlowQueryObserver) -> None:
+    _slow_observers[:] = [(t, f) for t, f in _slow_observers if f is not fn]
+
+
+def _first_row(args: Any) -> Tuple[Any, ...]:
+    if isinstance(args, (list, tuple)) and args:
+        return tuple(args[0])
+    return ()
+
+
+def _observe(sql: str, started: float, args: Tuple[Any, ...] = ()) -> None:
+    elapsed = time.perf_counter() - started
+    for fn in _query_observers:
+        try:
+            fn(sql, elapsed)
+        except Exception:
+            pass
+    for threshold, slow in _slow_observers:
+        if elapsed >= threshold:
+            try:
+                slow(sql, args, elapsed)
+            except Exception:
+                pass
+
+
+class TimedConnection(asyncpg.Connection):
+    """asyncpg Connection that reports every statement to the query observers.
+
+    Repeated queries are served by asyncpg's per-connection statement cache
+    (`statement_cache_size`), which survives pool checkouts and is filled
+    with HOT_STATEMENTS when the pool opens the connection; explicit
+    PreparedStatements do not (they are invalidated on every release).
+    """
+
+    async def fetch(self, query: str, *args: Any, **kwargs: Any) -> List[Any]:
+        started = time.perf_counter()
+        try:
+            return await super().fetch(query, *args, **kwargs)
+        finally:
+            _observe(query, started, args)
+
+    async def fetchrow(self, query: str, *args: Any, **kwargs: Any) -> Any:
+        started = time.perf_counter()
+        try:
+            return await super().fetchrow(query, *args, **kwargs)
+        finally:
+            _observe(query, started, args)
+
+    async def fetchval(self, query: str, *args: Any, **kwargs: Any) -> Any:
+        started = time.perf_counter()
+        try:
+            return await super().fetchval(query, *args, **kwargs)
+        finally:
+            _observe(query, started, args)
+
+    async def fetchmany(self, query: str, args: Any, **kwargs: Any) -> List[Any]:
+        started = time.perf_counter()
+        try:
+            return await super().fetchmany(query, args, **kwargs)
+        finally:
+            _observe(query, started, _first_row(args))
+
+    async def execute(self, query: str, *args: Any, **kwargs: Any) -> str:
+        started = time.perf_counter()
+        try:
+            return await super().execute(query, *args, **kwargs)
+        finally:
+            _observe(query, started, args)
+
+    async def executemany(self, command: str, args: Any, **kwargs: Any) -> None:
+        started = time.perf_counter()
+        try:
+            return await super().executemany(command, args, **kwargs)
+        finally:
+            _observe(command, started, _first_row(args))
+
+
+class _TimedAcquire:
+    """`pool.acquire()` that reports how long the caller waited for a connection."""
+
+    __slots__ = ("_pool", "_timeout", "_conn")
+
+    def __init__(self, pool: asyncpg.Pool, timeout: Optional[float]) -> None:
+        self._pool = pool
+        self._timeout = timeout
+        self._conn: Any = None
+
+    async def _acquire(self) -> Any:
+        started = time.perf_counter()
+        conn = await self._pool.acquire(timeout=self._timeout)
+        waited = time.perf_counter() - started
+        for fn in _acquire_observers:
+            try:
+                fn(waited)
+            except Exception:
+                pass
+        return conn
+
+    def __await__(self) -> Any:
+        return self._acquire().__await__()
+
+    async def __aenter__(self) -> Any:
+        self._conn = await self._acquire()
+        return self._conn
+
+    async def __aexit__(self, *exc: Any) -> None:
+        conn, self._conn = self._conn, None
+        await self._pool.release(conn)
+
+
+class TimedPool:
+    """Delegating wrapper over asyncpg.Pool whose `acquire()` is timed."""
+
+    __slots__ = ("_pool",)
+
+    def __init__(self, pool: asyncpg.Pool) -> None:
+        self._pool = pool
+
+    def acquire(self, *, timeout: Optional[float] = None) -> _TimedAcquire:
+        return _TimedAcquire(self._pool, timeout)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._pool, name)
+
 
 class AsyncDatabase:
     """Async DB connector backed by asyncpg Pool.
 
-    - Lazily initializes a shared Pool
+    - Initializes a shared Pool (eagerly via `warm_up`, else on first use)
     - Exposes helpers to prepare SQL with positional parameters
+    - Times every statement through TimedConnection
     """
 
     def __init__(
@@ -20,17 +268,24 @@ class AsyncDatabase:
         password: Optional[str] = None,
         host: Optional[str] = None,
         port: Optional[int] = None,
-        min_size: int = 1,
-        max_size: int = 10,
+        min_size: Optional[int] = None,
+        max_size: Optional[int] = None,
     ) -> None:
         self.name = name or os.getenv("DB_NAME", "messages_service")
         self.user = user or os.getenv("DB_USER", "root")
         self.password = password or os.getenv("DB_PASSWORD", "secret")
         self.host = host or os.getenv("DB_HOST", "database")
         self.port = int(port or os.getenv("DB_PORT", "5432"))
-        self.min_size = min_size
-        self.max_size = max_size
+        self.min_size = int(
+            min_size if min_size is not None else os.getenv("DB_POOL_MIN_SIZE", "1")
+        )
+        self.max_size = int(
+            max_size if max_size is not None else os.getenv("DB_POOL_MAX_SIZE", "10")
+        )
+        self.min_size = min(self.min_size, self.max_size)
         self._pool: Optional[asyncpg.Pool] = None
+        self._timed: Optional[TimedPool] = None
+        self._lock = asyncio.Lock()
 
     def dsn(self) -> str:
         return (
@@ -38,58 +293,119 @@ class AsyncDatabase:
             f"{self.host}:{self.port}/{self.name}"
         )
 
-    async def get_pool(self) -> asyncpg.Pool:
-        if self._pool is None:
-            self._pool = await asyncpg.create_pool(
-                dsn=self.dsn(),
-                min_size=self.min_size,
-                max_size=self.max_size,
-                command_timeout=30,
-                init=self._init_conn,
-            )
-        return self._pool
+    async def get_pool(self) -> TimedPool:
+        if self._timed is None:
+            # Evita crear dos pools si llegan requests durante el arranque
+            async with self._lock:
+                if self._timed is None:
+                    self._pool = await asyncpg.create_pool(
+                        dsn=self.dsn(),
+                        min_size=self.min_size,
+                        max_size=self.max_size,
+                        command_timeout=30,
+                        init=self._init_pool_conn,
+                        connection_class=TimedConnection,
+                    )
+                    self._timed = TimedPool(self._pool)
+        return self._timed
+
+    def pool_stats(self) -> Dict[str, int]:
+        """Current pool size, connections in use and configured maximum."""
+        pool = self._pool
+        if pool is None:
+            return {"size": 0, "in_use": 0, "max_size": self.max_size}
+        size = pool.get_size()
+        return {
+            "size": size,
+            "in_use": size - pool.get_idle_size(),
+            "max_size": self.max_size,
+        }
+
+    async def warm_up(self) -> None:
+        """Create the pool with `min_size` ready connections and check one.
+
+        asyncpg opens (and runs `_init_pool_conn` on) `min_size` connections
+        when the pool is created, so codecs are registered and HOT_STATEMENTS
+        sit in each statement cache before the first request.
+        """
+        pool = await self.get_pool()
+        async with pool.acquire() as conn:
+            await conn.fetchval("SELECT 1")
+
+    async def close(self, timeout: float = 10.0) -> None:
+        pool, self._pool = self._pool, None
+        self._timed = None
+        if pool is None:
+            return
+        try:
+            # Espera a que se devuelvan las conexiones en uso
+            await asyncio.wait_for(pool.close(), timeout)
+        except Exception:
+            pool.terminate()
 
     async def _init_conn(self, conn: asyncpg.Connection) -> None:
         await conn.set_type_codec(
             "json",
-            encoder=json.dumps,
-            decoder=json.loads,
+            encoder=json_dumps,
+            decoder=json_loads,
             schema="pg_catalog",
         )
         await conn.set_type_codec(
             "jsonb",
-            encoder=json.dumps,
-            decoder=json.loads,
+            encoder=json_dumps,
+            decoder=json_loads,
             schema="pg_catalog",
         )
 
+    async def _init_pool_conn(self, conn: asyncpg.Connection) -> None:
+        await self._init_conn(conn)
+        # Connection.prepare() no pasa por el statement cache (use_cache=False)
+        # y su PreparedStatement muere al devolver la conexión; _prepare con
+        # use_cache=True deja el statement donde lo buscan fetch/execute
+        for sql in HOT_STATEMENTS:
+            await conn._prepare(COMPILED[sql].sql, use_cache=True)
+
     @staticmethod
     def prepare(sql: str, params: Dict[str, Any]) -> Tuple[str, List[Any]]:
-        """Convert ":pN" named params to asyncpg "$N" positional params.
+        """Return the precompiled "$N" SQL and its positional values.
 
-        Preserves the order of first appearance in the SQL string.
+        Queries outside db.sqlc are compiled on first use and cached.
         """
-        order: List[str] = []
-        mapping: Dict[str, int] = {}
-
-        def repl(match: re.Match[str]) -> str:
-            key = match.group(1)  # e.g., p1
-            if key not in mapping:
-                mapping[key] = len(order) + 1
-                order.append(key)
-            return f"${mapping[key]}"
-
-        new_sql = re.sub(r":(p\d+)\b", repl, sql)
-        values: List[Any] = [params.get(k) for k in order]
-        return new_sql, values
+        compiled = COMPILED.get(sql)
+        if compiled is None:
+            compiled = COMPILED[sql] = compile_query(sql)
+        return compiled.sql, [params.get(k) for k in compiled.order]
 
 
 _adb = AsyncDatabase()
 
 
-async def get_pool() -> asyncpg.Pool:
+async def get_pool() -> TimedPool:
     return await _adb.get_pool()
 
 
+async def connect_side(**kwargs: Any) -> asyncpg.Connection:
+    """Open a standalone connection (outside the pool) with the same codecs."""
+    conn = await asyncpg.connect(dsn=_adb.dsn(), **kwargs)
+    try:
+        await _adb._init_conn(conn)
+    except Exception:
+        await conn.close()
+        raise
+    return conn
+
+
+def pool_stats() -> Dict[str, int]:
+    return _adb.pool_stats()
+
+
+async def warm_up_pool() -> None:
+    await _adb.warm_up()
+
+
+async def close_pool() -> None:
+    await _adb.close()
+
+
 def prepare(sql: str, params: Dict[str, Any]) -> Tuple[str, List[Any]]:
     return AsyncDatabase.prepare(sql, params)
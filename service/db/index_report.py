@@ -0,0 +1,179 @@
+"""Index usage report for the `messages` table.
+
+For every index on `messages` it reports:
+
+- size and `idx_scan` from pg_stat_user_indexes, summed over the
+  per-partition copies when the table is partitioned
+- which sqlc queries plan through it: each query in db/sqlc/messages.py is
+  PREPAREd and EXPLAINed as a generic plan, so no parameter values are needed
+  and nothing is executed
+- which of those queries the service actually calls, found by reading the
+  `from db.sqlc... import` statements under src/
+
+An index that no service query plans through is reported as `dead`; if its
+`idx_scan` is also 0 after a seeded workload (`make seed` and
+`make consume`), it is `unused` as well. Primary keys are never candidates.
+
+    python -m db.index_report [--dsn postgresql://...] [--json report.json]
+"""
+
+import argparse
+import ast
+import asyncio
+import json
+import re
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Set
+
+import asyncpg
+
+from db.check_plans import plan_nodes
+from db.connection import AsyncDatabase, compile_query
+from db.sqlc import messages as sqlc_messages
+
+ROOT = Path(__file__).resolve().parents[1]
+# En la imagen, src/ se copia directo a /app junto a db/
+SRC = ROOT / "src" if (ROOT / "src").is_dir() else ROOT
+
+_PARAM = re.compile(r"\$(\d+)")
+
+
+def sqlc_queries() -> Dict[str, str]:
+    """Constant name -> SQL for every query in db/sqlc/messages.py."""
+    return {
+        name: value
+        for name, value in vars(sqlc_messages).items()
+        if name.isupper() and isinstance(value, str) and "-- name:" in value
+    }
+
+
+def service_queries(src: Path = SRC) -> Set[str]:
+    """sqlc constants imported by the service modules."""
+    used: Set[str] = set()
+    for path in src.rglob("*.py"):
+        try:
+            tree = ast.parse(path.read_text(encoding="utf-8"))
+        except (OSError, SyntaxError):
+            continue
+        for node in ast.walk(tree):
+            if isinstance(node, ast.ImportFrom) and (node.module or "").startswith(
+                "db.sqlc"
+            ):
+                used.update(a.name for a in node.names if a.name.isupper())
+    return used
+
+
+def classify(
+    index: Dict[str, Any], planned_by: Iterable[str], service: Set[str]
+) -> str:
+    if index["primary"]:
+        return "primary"
+    if not set(planned_by) & service:
+        return "unused" if index["idx_scan"] == 0 else "dead"
+    return "used"
+
+
+async def _indexes(conn: asyncpg.Connection) -> List[Dict[str, Any]]:
+    # Índices del padre; para tablas particionadas suma las copias por partición
+    rows = await conn.fetch("""
+        SELECT p.indexrelid::regclass::text AS name,
+               pg_get_indexdef(p.indexrelid) AS definition,
+               p.indisprimary AS primary,
+               COALESCE(array_agg(i.inhrelid::regclass::text)
+                        FILTER (WHERE i.inhrelid IS NOT NULL), '{}') AS children
+        FROM pg_index p
+        LEFT JOIN pg_inherits i ON i.inhparent = p.indexrelid
+        WHERE p.indrelid = 'messages'::regclass
+        GROUP BY p.indexrelid, p.indisprimary
+        ORDER BY 1
+        """)
+    stats = {r["indexrelname"]: r for r in await conn.fetch("""
+            SELECT indexrelname, idx_scan, pg_relation_size(indexrelid) AS bytes
+            FROM pg_stat_user_indexes
+            """)}
+    out: List[Dict[str, Any]] = []
+    for r in rows:
+        members = [r["name"], *r["children"]]
+        out.append(
+            {
+                "name": r["name"],
+                "definition": r["definition"],
+                "primary": r["primary"],
+                "children": list(r["children"]),
+                "idx_scan": sum(stats[m]["idx_scan"] for m in members if m in stats),
+                "bytes": sum(stats[m]["bytes"] for m in members if m in stats),
+            }
+        )
+    return out
+
+
+async def _planned_indexes(conn: asyncpg.Connection, sql: str, stmt: str) -> Set[str]:
+    compiled = compile_query(sql).sql
+    params = max((int(n) for n in _PARAM.findall(compiled)), default=0)
+    await conn.execute(f"PREPARE {stmt} AS {compiled}")
+    args = "(" + ", ".join(["NULL"] * params) + ")" if params else ""
+    plan = await conn.fetchval(f"EXPLAIN (FORMAT JSON) EXECUTE {stmt}{args}")
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return {n["Index Name"] for n in plan_nodes(plan[0]["Plan"]) if "Index Name" in n}
+
+
+async def build_report(dsn: str) -> Dict[str, Any]:
+    conn = await asyncpg.connect(dsn)
+    try:
+        indexes = await _indexes(conn)
+        parent_of = {c: ix["name"] for ix in indexes for c in ix["children"]}
+        planned: Dict[str, List[str]] = {ix["name"]: [] for ix in indexes}
+        errors: Dict[str, str] = {}
+        tr = conn.transaction()
+        await tr.start()
+        try:
+            # Plan genérico: los NULL no influyen y el plan no se ejecuta
+            await conn.execute("SET LOCAL plan_cache_mode = force_generic_plan")
+            for i, (name, sql) in enumerate(sorted(sqlc_queries().items())):
+                try:
+                    # Savepoint: una query que no planifica no aborta el resto
+                    async with conn.transaction():
+                        used = await _planned_indexes(conn, sql, f"index_report_{i}")
+                except asyncpg.PostgresError as e:
+                    errors[name] = f"{e.__class__.__name__}: {e}"
+                    continue
+                for index in used:
+                    parent = parent_of.get(index, index)
+                    if parent in planned:
+                        planned[parent].append(name)
+        finally:
+            await tr.rollback()
+            # PREPARE no es transaccional
+            await conn.execute("DEALLOCATE ALL")
+    finally:
+        await conn.close()
+
+    service = service_queries()
+    for ix in indexes:
+        ix["planned_by"] = planned[ix["name"]]
+        ix["service_queries"] = sorted(set(planned[ix["name"]]) & service)
+        ix["verdict"] = classify(ix, planned[ix["name"]], service)
+    return {"service_queries": sorted(service), "indexes": indexes, "errors": errors}
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--dsn", default=AsyncDatabase().dsn())
+    ap.add_argument("--json", help="write the full report to this file")
+    args = ap.parse_args()
+
+    report = asyncio.run(build_report(args.dsn))
+    for ix in report["indexes"]:
+        print(
+            f"{ix['verdict']:8s} {ix['name']:42s} {ix['bytes'] / 2**20:9.1f} MiB "
+            f"scans={ix['idx_scan']:<10d} service={','.join(ix['service_queries']) or '-'}"
+        )
+    for name, err in report["errors"].items():
+        print(f"could not plan {name}: {err}")
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,8 @@
+CREATE TABLE IF NOT EXISTS "outbox" (
+  "id" bigserial PRIMARY KEY,
+  "event_type" text NOT NULL,
+  "tag" text NOT NULL,
+  "payload" jsonb NOT NULL,
+  "attempts" int NOT NULL DEFAULT 0,
+  "created_at" timestamp NOT NULL DEFAULT NOW()
+);
@@ -0,0 +1 @@
+DROP INDEX CONCURRENTLY IF EXISTS "idx_messages_thread_keyset_not_deleted";
@@ -0,0 +1,8 @@
+-- Índice parcial para el listado keyset de mensajes no borrados
+-- (ListThreadMessagesNotDeletedDescFirst/Before): mismo orden que el
+-- ORDER BY created_at DESC, id DESC, así no hay Sort ni empates sin resolver.
+-- CONCURRENTLY no bloquea escrituras y no puede correr dentro de una
+-- transacción: este archivo debe tener un único statement.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS "idx_messages_thread_keyset_not_deleted"
+  ON "messages" ("thread_id", "created_at" DESC, "id" DESC)
+  WHERE "deleted_at" IS NULL;
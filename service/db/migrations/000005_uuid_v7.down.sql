@@ -0,0 +1,2 @@
+ALTER TABLE messages ALTER COLUMN id SET DEFAULT gen_random_uuid();
+DROP FUNCTION IF EXISTS uuid_generate_v7();
@@ -0,0 +1,26 @@
+-- UUIDv7 (RFC 9562): 48 bits de milisegundos Unix al frente, así los ids
+-- nuevos caen al final del B-tree de la PK y de idx_messages_thread_seek en
+-- vez de repartirse al azar. Se parte de un v4 (versión y variante ya
+-- puestas), se pisan los primeros 6 bytes con el timestamp y los bits 52-53
+-- pasan la versión de 4 a 7. Postgres 17 no trae uuidv7() nativo.
+CREATE OR REPLACE FUNCTION uuid_generate_v7() RETURNS uuid AS $$
+  SELECT encode(
+    set_bit(
+      set_bit(
+        overlay(
+          uuid_send(gen_random_uuid())
+          PLACING substring(
+            int8send(floor(extract(epoch FROM clock_timestamp()) * 1000)::bigint)
+            FROM 3
+          )
+          FROM 1 FOR 6
+        ),
+        52, 1
+      ),
+      53, 1
+    ),
+    'hex'
+  )::uuid;
+$$ LANGUAGE sql VOLATILE;
+
+ALTER TABLE messages ALTER COLUMN id SET DEFAULT uuid_generate_v7();
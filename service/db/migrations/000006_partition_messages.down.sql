@@ -0,0 +1,35 @@
+-- Vuelve a una tabla única copiando las filas actuales (incluidas las
+-- escritas después del up) y restaura el esquema de 000001-000005.
+DROP FUNCTION IF EXISTS uuid_v7_created_min(uuid);
+DROP FUNCTION IF EXISTS uuid_v7_created_max(uuid);
+DROP TABLE IF EXISTS messages_unpartitioned;
+
+CREATE TABLE "messages_plain" (
+  "id" uuid PRIMARY KEY DEFAULT uuid_generate_v7(),
+  "thread_id" uuid NOT NULL,
+  "user_id" uuid NOT NULL,
+  "type" type,
+  "content" text DEFAULT '',
+  "paths" jsonb DEFAULT null,
+  "created_at" timestamp,
+  "updated_at" timestamp,
+  "deleted_at" timestamp
+);
+
+INSERT INTO messages_plain SELECT * FROM messages;
+
+-- Borra la tabla particionada con sus particiones e índices
+DROP TABLE messages;
+ALTER TABLE messages_plain RENAME TO messages;
+ALTER TABLE messages RENAME CONSTRAINT messages_plain_pkey TO messages_pkey;
+
+CREATE INDEX "idx_messages_thread_user" ON "messages" ("thread_id", "user_id");
+CREATE INDEX "idx_messages_thread_type_created" ON "messages" ("thread_id", "type", "created_at");
+CREATE INDEX "idx_messages_thread_not_deleted_created" ON "messages" ("thread_id", "deleted_at", "created_at");
+CREATE INDEX "idx_messages_user_created" ON "messages" ("user_id", "created_at");
+CREATE INDEX "idx_messages_thread_seek" ON "messages" ("thread_id", "id");
+CREATE INDEX "idx_messages_created_at" ON "messages" ("created_at");
+CREATE INDEX "idx_messages_content_lower" ON "messages" ((lower(content)));
+CREATE INDEX "idx_messages_thread_keyset_not_deleted"
+  ON "messages" ("thread_id", "created_at" DESC, "id" DESC)
+  WHERE "deleted_at" IS NULL;
@@ -0,0 +1,92 @@
+-- messages pasa a PARTITION BY RANGE (created_at) con particiones mensuales
+-- (messages_pYYYYMM). La retención se vuelve un DETACH de la partición vieja
+-- en vez de un DELETE masivo, y los listados recientes solo tocan las
+-- particiones nuevas. Las particiones futuras las crea `python -m
+-- db.partitions` (CronJob messages-service-partitions).
+--
+-- Todo corre en una transacción: la tabla queda bloqueada mientras se copian
+-- las filas. La tabla original queda como messages_unpartitioned (sin sus
+-- índices secundarios) hasta verificar la copia y borrarla a mano.
+
+-- La clave de partición no puede ser NULL
+CREATE TABLE "messages_partitioned" (
+  "id" uuid NOT NULL DEFAULT uuid_generate_v7(),
+  "thread_id" uuid NOT NULL,
+  "user_id" uuid NOT NULL,
+  "type" type,
+  "content" text DEFAULT '',
+  "paths" jsonb DEFAULT null,
+  "created_at" timestamp NOT NULL DEFAULT NOW(),
+  "updated_at" timestamp,
+  "deleted_at" timestamp
+) PARTITION BY RANGE ("created_at");
+
+-- Desde el mes del mensaje más antiguo hasta 3 meses adelante
+DO $$
+DECLARE
+  m date;
+  last_month date := date_trunc('month', NOW() + interval '3 months')::date;
+BEGIN
+  SELECT date_trunc('month', COALESCE(min(COALESCE(created_at, updated_at)), NOW()))::date
+    INTO m FROM messages;
+  WHILE m <= last_month LOOP
+    EXECUTE format(
+      'CREATE TABLE %I PARTITION OF messages_partitioned FOR VALUES FROM (%L) TO (%L)',
+      'messages_p' || to_char(m, 'YYYYMM'), m, (m + interval '1 month')::date
+    );
+    m := (m + interval '1 month')::date;
+  END LOOP;
+END $$;
+
+INSERT INTO messages_partitioned
+  (id, thread_id, user_id, type, content, paths, created_at, updated_at, deleted_at)
+SELECT id, thread_id, user_id, type, content, paths,
+       COALESCE(created_at, updated_at, NOW()), updated_at, deleted_at
+FROM messages;
+
+ALTER TABLE messages RENAME TO messages_unpartitioned;
+ALTER TABLE messages_unpartitioned RENAME CONSTRAINT messages_pkey TO messages_unpartitioned_pkey;
+DROP INDEX IF EXISTS idx_messages_thread_user;
+DROP INDEX IF EXISTS idx_messages_thread_type_created;
+DROP INDEX IF EXISTS idx_messages_thread_not_deleted_created;
+DROP INDEX IF EXISTS idx_messages_user_created;
+DROP INDEX IF EXISTS idx_messages_thread_seek;
+DROP INDEX IF EXISTS idx_messages_created_at;
+DROP INDEX IF EXISTS idx_messages_content_lower;
+DROP INDEX IF EXISTS idx_messages_thread_keyset_not_deleted;
+
+ALTER TABLE messages_partitioned RENAME TO messages;
+
+-- La PK de una tabla particionada debe incluir la clave de partición
+ALTER TABLE messages ADD CONSTRAINT messages_pkey PRIMARY KEY ("id", "created_at");
+
+-- Mismos índices que antes, creados en cada partición
+CREATE INDEX "idx_messages_thread_user" ON "messages" ("thread_id", "user_id");
+CREATE INDEX "idx_messages_thread_type_created" ON "messages" ("thread_id", "type", "created_at");
+CREATE INDEX "idx_messages_thread_not_deleted_created" ON "messages" ("thread_id", "deleted_at", "created_at");
+CREATE INDEX "idx_messages_user_created" ON "messages" ("user_id", "created_at");
+CREATE INDEX "idx_messages_thread_seek" ON "messages" ("thread_id", "id");
+CREATE INDEX "idx_messages_created_at" ON "messages" ("created_at");
+CREATE INDEX "idx_messages_content_lower" ON "messages" ((lower(content)));
+CREATE INDEX "idx_messages_thread_keyset_not_deleted"
+  ON "messages" ("thread_id", "created_at" DESC, "id" DESC)
+  WHERE "deleted_at" IS NULL;
+
+-- Cotas de created_at que se derivan de un id UUIDv7 (±1 día de margen por
+-- zona horaria y desfase de relojes entre la app y la base). Permiten podar
+-- particiones en las queries por id; para ids que no son v7 no acotan nada.
+CREATE OR REPLACE FUNCTION uuid_v7_created_min(id uuid) RETURNS timestamp AS $$
+  SELECT CASE WHEN get_byte(uuid_send(id), 6) >> 4 = 7
+    THEN to_timestamp(('x' || substr(replace(id::text, '-', ''), 1, 12))::bit(48)::bigint / 1000.0)
+         AT TIME ZONE 'UTC' - interval '1 day'
+    ELSE '-infinity'::timestamp
+  END;
+$$ LANGUAGE sql IMMUTABLE STRICT PARALLEL SAFE;
+
+CREATE OR REPLACE FUNCTION uuid_v7_created_max(id uuid) RETURNS timestamp AS $$
+  SELECT CASE WHEN get_byte(uuid_send(id), 6) >> 4 = 7
+    THEN to_timestamp(('x' || substr(replace(id::text, '-', ''), 1, 12))::bit(48)::bigint / 1000.0)
+         AT TIME ZONE 'UTC' + interval '1 day'
+    ELSE 'infinity'::timestamp
+  END;
+$$ LANGUAGE sql IMMUTABLE STRICT PARALLEL SAFE;
@@ -0,0 +1,5 @@
+CREATE INDEX IF NOT EXISTS "idx_messages_thread_user" ON "messages" ("thread_id", "user_id");
+CREATE INDEX IF NOT EXISTS "idx_messages_thread_type_created" ON "messages" ("thread_id", "type", "created_at");
+CREATE INDEX IF NOT EXISTS "idx_messages_thread_not_deleted_created" ON "messages" ("thread_id", "deleted_at", "created_at");
+CREATE INDEX IF NOT EXISTS "idx_messages_created_at" ON "messages" ("created_at");
+CREATE INDEX IF NOT EXISTS "idx_messages_content_lower" ON "messages" ((lower(content)));
@@ -0,0 +1,16 @@
+-- Índices que ninguna query del servicio usa (ver `python -m db.index_report`)
+-- y que cada INSERT igual mantiene en cada partición:
+-- - idx_messages_content_lower: solo FindMessagesByContentLowerPrefix
+-- - idx_messages_created_at: solo ListMessagesByCreatedAtRange, que ya poda
+--   por partición
+-- - idx_messages_thread_user / idx_messages_thread_type_created: listados
+--   por usuario o tipo dentro de un hilo, que el servicio no expone
+-- - idx_messages_thread_not_deleted_created: reemplazado por
+--   idx_messages_thread_keyset_not_deleted (000004)
+-- En una tabla particionada no existe DROP INDEX CONCURRENTLY; el DROP solo
+-- toma el lock un instante (no reescribe datos).
+DROP INDEX IF EXISTS idx_messages_content_lower;
+DROP INDEX IF EXISTS idx_messages_created_at;
+DROP INDEX IF EXISTS idx_messages_thread_user;
+DROP INDEX IF EXISTS idx_messages_thread_type_created;
+DROP INDEX IF EXISTS idx_messages_thread_not_deleted_created;
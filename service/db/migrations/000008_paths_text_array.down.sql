@@ -0,0 +1,6 @@
+ALTER TABLE messages
+  ALTER COLUMN paths TYPE jsonb USING to_jsonb(paths);
+
+ALTER TABLE messages ALTER COLUMN paths SET DEFAULT null;
+
+DROP FUNCTION IF EXISTS jsonb_to_text_array(jsonb);
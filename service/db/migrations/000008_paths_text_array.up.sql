@@ -0,0 +1,27 @@
+-- `paths` siempre es una lista de strings (API: List[str]). Como text[]
+-- asyncpg la decodifica en binario, sin pasar cada fila por el codec JSON.
+-- Cualquier otro valor (objeto, escalar, lista con no-strings) aborta la
+-- migración en vez de perderse en la conversión.
+CREATE OR REPLACE FUNCTION jsonb_to_text_array(j jsonb) RETURNS text[] AS $$
+BEGIN
+  IF jsonb_typeof(j) = 'null' THEN
+    RETURN NULL;
+  END IF;
+  IF jsonb_typeof(j) <> 'array' OR EXISTS (
+    SELECT 1 FROM jsonb_array_elements(j) AS e WHERE jsonb_typeof(e) <> 'string'
+  ) THEN
+    RAISE EXCEPTION 'paths is not a list of strings: %', j;
+  END IF;
+  RETURN ARRAY(
+    SELECT e FROM jsonb_array_elements_text(j) WITH ORDINALITY AS t(e, n) ORDER BY n
+  );
+END
+$$ LANGUAGE plpgsql IMMUTABLE STRICT;
+
+-- El default `null` es jsonb y no tiene cast a text[]; sin default es lo mismo
+ALTER TABLE messages ALTER COLUMN paths DROP DEFAULT;
+
+-- Reescribe cada partición bajo ACCESS EXCLUSIVE: correr en una ventana de
+-- mantenimiento. Ningún índice incluye `paths`, así que no se reconstruye nada.
+ALTER TABLE messages
+  ALTER COLUMN paths TYPE text[] USING jsonb_to_text_array(paths);
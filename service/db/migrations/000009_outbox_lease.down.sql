@@ -0,0 +1,4 @@
+DROP INDEX IF EXISTS idx_outbox_pending;
+ALTER TABLE "outbox" DROP COLUMN IF EXISTS "last_error";
+ALTER TABLE "outbox" DROP COLUMN IF EXISTS "dead_at";
+ALTER TABLE "outbox" DROP COLUMN IF EXISTS "locked_until";
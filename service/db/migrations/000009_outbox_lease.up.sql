@@ -0,0 +1,10 @@
+-- Lease en vez de lock de fila: el relay reclama un lote en una transacción
+-- corta (`locked_until`), publica sin conexión tomada y después borra o
+-- marca. Si la réplica muere, el lease vence y otra retoma el evento.
+ALTER TABLE "outbox" ADD COLUMN "locked_until" timestamp;
+-- Tras OUTBOX_MAX_ATTEMPTS fallos el evento queda en dead letter
+-- (`dead_at`) con el último error, fuera de los lotes
+ALTER TABLE "outbox" ADD COLUMN "dead_at" timestamp;
+ALTER TABLE "outbox" ADD COLUMN "last_error" text;
+
+CREATE INDEX IF NOT EXISTS "idx_outbox_pending" ON "outbox" ("id") WHERE "dead_at" IS NULL;
@@ -0,0 +1,175 @@
+"""Monthly partition maintenance for the `messages` table.
+
+Pre-creates the partitions for the coming months and, when a retention is
+configured, detaches (and optionally drops) the ones that fell out of it.
+Detaching is a catalog operation: no mass DELETE, no table bloat.
+
+    python -m db.partitions [--months-ahead 3] [--retain-months 24] [--drop]
+    python -m db.partitions --dry-run
+
+Partitions are named `messages_pYYYYMM` and cover [month, next month).
+There is no DEFAULT partition (it would turn the ordered Append of the
+keyset listings into a Merge Append); the service reports the headroom with
+`months_ahead` instead.
+"""
+
+import argparse
+import asyncio
+import datetime
+import re
+import sys
+from typing import Iterable, List, NamedTuple, Optional, Set, Tuple
+
+import asyncpg
+
+from db.connection import AsyncDatabase
+
+PARENT = "messages"
+_NAME = re.compile(r"^messages_p(\d{4})(\d{2})$")
+
+
+class Partition(NamedTuple):
+    name: str
+    start: datetime.date
+    end: datetime.date
+
+
+def month_start(day: datetime.date) -> datetime.date:
+    return day.replace(day=1)
+
+
+def add_months(month: datetime.date, n: int) -> datetime.date:
+    index = month.year * 12 + month.month - 1 + n
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def partition_for(month: datetime.date) -> Partition:
+    start = month_start(month)
+    return Partition(f"{PARENT}_p{start:%Y%m}", start, add_months(start, 1))
+
+
+def partition_month(name: str) -> Optional[datetime.date]:
+    match = _NAME.match(name)
+    if match is None:
+        return None
+    return datetime.date(int(match.group(1)), int(match.group(2)), 1)
+
+
+def months_ahead(today: datetime.date, existing: Iterable[str]) -> Optional[int]:
+    """Whole months covered past the current one by the furthest partition.
+
+    0 means only the current month is covered; negative means inserts for
+    today already have no partition. None when there are no monthly
+    partitions (the table is not partitioned).
+    """
+    months = [m for m in (partition_month(name) for name in existing) if m]
+    if not months:
+        return None
+    last, current = max(months), month_start(today)
+    return (last.year - current.year) * 12 + last.month - current.month
+
+
+def create_sql(partition: Partition) -> str:
+    return (
+        f'CREATE TABLE IF NOT EXISTS "{partition.name}" PARTITION OF "{PARENT}" '
+        f"FOR VALUES FROM ('{partition.start.isoformat()}') "
+        f"TO ('{partition.end.isoformat()}')"
+    )
+
+
+def plan(
+    today: datetime.date,
+    existing: Iterable[str],
+    months_ahead: int,
+    retain_months: int = 0,
+) -> Tuple[List[Partition], List[str]]:
+    """Partitions to create (current month + `months_ahead`) and to detach.
+
+    `retain_months` <= 0 keeps everything. The current month is never
+    detached.
+    """
+    existing_set: Set[str] = set(existing)
+    current = month_start(today)
+    create = [
+        p
+        for p in (
+            partition_for(add_months(current, n)) for n in range(months_ahead + 1)
+        )
+        if p.name not in existing_set
+    ]
+    detach: List[str] = []
+    if retain_months > 0:
+        oldest_kept = add_months(current, -(retain_months - 1))
+        for name in sorted(existing_set):
+            month = partition_month(name)
+            if month is not None and month < oldest_kept:
+                detach.append(name)
+    return create, detach
+
+
+async def attached_partitions(conn: asyncpg.Connection) -> List[str]:
+    rows = await conn.fetch(
+        """
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = $1::regclass
+        """,
+        PARENT,
+    )
+    return [r["relname"] for r in rows]
+
+
+async def run(
+    dsn: str, months_ahead: int, retain_months: int, drop: bool, dry_run: bool
+) -> None:
+    conn = await asyncpg.connect(dsn)
+    try:
+        existing = await attached_partitions(conn)
+        create, detach = plan(
+            datetime.date.today(), existing, months_ahead, retain_months
+        )
+        for partition in create:
+            print(f"create {partition.name} [{partition.start}, {partition.end})")
+            if not dry_run:
+                await conn.execute(create_sql(partition))
+        for name in detach:
+            print(f"detach {name}" + (" and drop" if drop else ""))
+            if dry_run:
+                continue
+            # CONCURRENTLY no bloquea lecturas ni escrituras sobre messages;
+            # no puede correr en una transacción (asyncpg: autocommit)
+            await conn.execute(
+                f'ALTER TABLE "{PARENT}" DETACH PARTITION "{name}" CONCURRENTLY'
+            )
+            if drop:
+                await conn.execute(f'DROP TABLE "{name}"')
+        if not create and not detach:
+            print("nothing to do")
+    finally:
+        await conn.close()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--dsn", default=AsyncDatabase().dsn())
+    ap.add_argument("--months-ahead", type=int, default=3)
+    ap.add_argument(
+        "--retain-months", type=int, default=0, help="0 keeps every partition"
+    )
+    ap.add_argument("--drop", action="store_true", help="drop detached partitions")
+    ap.add_argument("--dry-run", action="store_true")
+    args = ap.parse_args()
+    try:
+        asyncio.run(
+            run(
+                args.dsn, args.months_ahead, args.retain_months, args.drop, args.dry_run
+            )
+        )
+    except Exception as e:
+        print(f"partition maintenance failed: {e.__class__.__name__}: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
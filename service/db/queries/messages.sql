@@ -1,10 +1,12 @@
 -- name: GetMessageByID :one
 SELECT * FROM messages
-WHERE id = $1;
+WHERE id = $1
+  AND created_at BETWEEN uuid_v7_created_min($1) AND uuid_v7_created_max($1);
 
 -- name: GetMessageByIDForUpdate :one
 SELECT * FROM messages
 WHERE id = $1
+  AND created_at BETWEEN uuid_v7_created_min($1) AND uuid_v7_created_max($1)
 FOR UPDATE;
 
 -- name: CreateMessage :one
@@ -15,6 +17,16 @@ INSERT INTO messages (
 )
 RETURNING *;
 
+-- name: CreateMessagesBatch :many
+INSERT INTO messages (
+  id, thread_id, user_id, type, content, paths, created_at, updated_at
+)
+SELECT u.id, u.thread_id, u.user_id, u.type, COALESCE(u.content, ''), jsonb_to_text_array(u.paths::jsonb), NOW(), NOW()
+FROM unnest(
+  $1::uuid[], $2::uuid[], $3::uuid[], $4::"type"[], $5::text[], $6::text[]
+) AS u(id, thread_id, user_id, type, content, paths)
+RETURNING *;
+
 -- name: UpdateMessageContentAndPaths :one
 UPDATE messages
 SET
@@ -22,6 +34,7 @@ SET
   paths      = COALESCE($3, paths),
   updated_at = COALESCE($4, NOW())
 WHERE id = $1
+  AND created_at BETWEEN uuid_v7_created_min($1) AND uuid_v7_created_max($1)
 RETURNING *;
 
 -- name: SoftDeleteMessage :one
@@ -29,6 +42,25 @@ UPDATE messages
 SET deleted_at = COALESCE($2, NOW()),
     updated_at = NOW()
 WHERE id = $1 AND deleted_at IS NULL
+  AND created_at BETWEEN uuid_v7_created_min($1) AND uuid_v7_created_max($1)
+RETURNING *;
+
+-- name: UpdateThreadMessageContentAndPaths :one
+UPDATE messages
+SET
+  content    = COALESCE($3, content),
+  paths      = COALESCE($4, paths),
+  updated_at = COALESCE($5, NOW())
+WHERE id = $1 AND thread_id = $2
+  AND created_at BETWEEN uuid_v7_created_min($1) AND uuid_v7_created_max($1)
+RETURNING *;
+
+-- name: SoftDeleteThreadMessage :one
+UPDATE messages
+SET deleted_at = COALESCE($3, NOW()),
+    updated_at = NOW()
+WHERE id = $1 AND thread_id = $2 AND deleted_at IS NULL
+  AND created_at BETWEEN uuid_v7_created_min($1) AND uuid_v7_created_max($1)
 RETURNING *;
 
 -- name: RestoreMessage :one
@@ -36,11 +68,13 @@ UPDATE messages
 SET deleted_at = NULL,
     updated_at = NOW()
 WHERE id = $1
+  AND created_at BETWEEN uuid_v7_created_min($1) AND uuid_v7_created_max($1)
 RETURNING *;
 
 -- name: DeleteMessageHard :exec
 DELETE FROM messages
-WHERE id = $1;
+WHERE id = $1
+  AND created_at BETWEEN uuid_v7_created_min($1) AND uuid_v7_created_max($1);
 
 -- name: CountThreadMessages :one
 SELECT count(*) FROM messages
@@ -59,7 +93,7 @@ WHERE user_id = $1;
 SELECT * FROM messages
 WHERE thread_id = $1
   AND deleted_at IS NULL
-ORDER BY created_at DESC
+ORDER BY created_at DESC, id DESC
 LIMIT $2;
 
 -- name: ListThreadMessagesNotDeletedDescBefore :many
@@ -67,6 +101,7 @@ SELECT * FROM messages
 WHERE thread_id = $1
   AND deleted_at IS NULL
   AND (created_at, id) < ($2, $3)
+  AND created_at <= $2
 ORDER BY created_at DESC, id DESC
 LIMIT $4;
 
@@ -74,6 +109,7 @@ LIMIT $4;
 SELECT * FROM messages
 WHERE thread_id = $1
   AND id > $2
+  AND created_at >= uuid_v7_created_min($2)
 ORDER BY id ASC
 LIMIT $3;
 
@@ -81,6 +117,7 @@ LIMIT $3;
 SELECT * FROM messages
 WHERE thread_id = $1
   AND id < $2
+  AND created_at <= uuid_v7_created_max($2)
 ORDER BY id DESC
 LIMIT $3;
 
@@ -96,6 +133,7 @@ SELECT * FROM messages
 WHERE thread_id = $1
   AND type = $2
   AND (created_at, id) < ($3, $4)
+  AND created_at <= $3
 ORDER BY created_at DESC, id DESC
 LIMIT $5;
 
@@ -138,7 +176,7 @@ LIMIT $2;
 -- name: ListThreadMessagesByPathContains :many
 SELECT * FROM messages
 WHERE thread_id = $1
-  AND paths @> $2::jsonb
+  AND paths @> $2::text[]
 ORDER BY created_at DESC
 LIMIT $3;
 
@@ -0,0 +1,43 @@
+-- name: EnqueueOutboxEvent :exec
+INSERT INTO outbox (event_type, tag, payload)
+VALUES ($1, $2, $3::text::jsonb);
+
+-- name: EnqueueOutboxEvents :exec
+INSERT INTO outbox (event_type, tag, payload)
+SELECT u.event_type, u.tag, u.payload::jsonb
+FROM unnest($1::text[], $2::text[], $3::text[]) AS u(event_type, tag, payload);
+
+-- name: ClaimOutboxBatch :many
+UPDATE outbox
+SET locked_until = NOW() + make_interval(secs => $2)
+WHERE id IN (
+  SELECT id FROM outbox
+  WHERE dead_at IS NULL
+    AND (locked_until IS NULL OR locked_until < NOW())
+  ORDER BY id
+  LIMIT $1
+  FOR UPDATE SKIP LOCKED
+)
+RETURNING id, event_type, tag, payload::text AS body, attempts;
+
+-- name: DeleteOutboxEvents :exec
+DELETE FROM outbox
+WHERE id = ANY($1::bigint[]);
+
+-- name: MarkOutboxEventsFailed :many
+UPDATE outbox AS o
+SET attempts     = o.attempts + 1,
+    locked_until = NOW() + make_interval(secs => $3),
+    dead_at      = CASE WHEN o.attempts + 1 >= $4 THEN NOW() END,
+    last_error   = u.error
+FROM unnest($1::bigint[], $2::text[]) AS u(id, error)
+WHERE o.id = u.id
+RETURNING o.id, o.dead_at IS NOT NULL AS dead;
+
+-- name: CountOutboxEvents :one
+SELECT count(*) FROM outbox
+WHERE dead_at IS NULL;
+
+-- name: CountOutboxDeadEvents :one
+SELECT count(*) FROM outbox
+WHERE dead_at IS NOT NULL;
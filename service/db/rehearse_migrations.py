@@ -0,0 +1,179 @@
+"""Rehearsal of the partitioning migrations on a seeded scratch database.
+
+Drives golang-migrate (the `migrate` CLI, like `make migrateup`) and checks
+that no row of `messages` is lost or changed on the way up or down:
+
+1. migrate to `--base` (000005, the last unpartitioned schema), empty
+   `messages` and seed `--rows` rows spread over `--months` months (some
+   with a NULL created_at, ~10% soft-deleted, jsonb paths)
+2. migrate up to the latest version, compare the table fingerprint and run
+   db.check_plans
+3. migrate down to `--base` and compare again, then back up to the latest
+   version and compare once more
+
+The database ends at the latest version holding the seeded rows, so point it
+at a throwaway database only. `--out` writes the transcript (markdown).
+
+    python -m db.rehearse_migrations --dsn postgresql://.../messages_rehearsal \\
+        --out db/results/rehearsal.md
+"""
+
+import argparse
+import asyncio
+import datetime
+import re
+import subprocess
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import asyncpg
+
+from db import check_plans
+
+MIGRATIONS = Path(__file__).resolve().parent / "migrations"
+BASE_VERSION = 5
+
+_VERSION = re.compile(r"^(\d+)_.*\.up\.sql$")
+
+# `created_at` NULL pasa a COALESCE(created_at, updated_at) en 000006 y
+# `paths` cambia de jsonb a text[] en 000008: la huella compara lo que las
+# migraciones prometen conservar
+FINGERPRINT_SQL = """
+SELECT count(*) AS rows,
+       count(*) FILTER (WHERE deleted_at IS NOT NULL) AS deleted,
+       md5(string_agg(
+         concat_ws('|', id, thread_id, user_id, type, content, to_jsonb(paths),
+                   COALESCE(created_at, updated_at), updated_at, deleted_at),
+         ',' ORDER BY id
+       )) AS digest
+FROM messages
+"""
+
+SEED_SQL = """
+INSERT INTO messages
+  (id, thread_id, user_id, type, content, paths, created_at, updated_at,
+   deleted_at)
+SELECT gen_random_uuid(),
+       md5('thread' || g % $2)::uuid,
+       md5('user' || g % ($2 / 10 + 1))::uuid,
+       'text',
+       'rehearsal ' || g,
+       CASE WHEN g % 3 = 0 THEN NULL ELSE jsonb_build_array('/a/' || g) END,
+       CASE WHEN g % 50 = 0 THEN NULL
+            ELSE NOW() - g * ($3::int * interval '30 days' / $1) END,
+       NOW() - g * ($3::int * interval '30 days' / $1),
+       CASE WHEN g % 10 = 0 THEN NOW() END
+FROM generate_series(1, $1) AS g
+"""
+
+
+def latest_version(path: Path = MIGRATIONS) -> int:
+    matches = (_VERSION.match(p.name) for p in path.iterdir())
+    return max(int(m.group(1)) for m in matches if m)
+
+
+def _migrate(dsn: str, version: int) -> str:
+    """Run `migrate goto <version>` and return its output."""
+    out = subprocess.run(
+        ["migrate", "-path", str(MIGRATIONS), "-database", dsn, "goto", str(version)],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return (out.stdout + out.stderr).strip()
+
+
+async def _seed(dsn: str, rows: int, threads: int, months: int) -> None:
+    conn = await asyncpg.connect(dsn)
+    try:
+        async with conn.transaction():
+            await conn.execute("TRUNCATE messages")
+            await conn.execute(SEED_SQL, rows, threads, months)
+    finally:
+        await conn.close()
+
+
+async def _fingerprint(dsn: str) -> Dict[str, Any]:
+    conn = await asyncpg.connect(dsn)
+    try:
+        row = await conn.fetchrow(FINGERPRINT_SQL)
+        partitioned = await conn.fetchval(
+            "SELECT relkind = 'p' FROM pg_class WHERE oid = 'messages'::regclass"
+        )
+    finally:
+        await conn.close()
+    return {**dict(row), "partitioned": partitioned}
+
+
+async def rehearse(
+    dsn: str, rows: int, threads: int, months: int, base: int = BASE_VERSION
+) -> List[str]:
+    """Run the rehearsal; return the transcript lines (last one is PASS/FAIL)."""
+    head = latest_version()
+    lines = [
+        "# Migration rehearsal",
+        "",
+        f"- date: {datetime.datetime.now(datetime.timezone.utc).isoformat()}",
+        f"- versions: {base:06d} <-> {head:06d}",
+        f"- seed: {rows} rows, {threads} threads, {months} months",
+        "",
+    ]
+    failed = False
+    checked = False
+
+    def _step(title: str, output: Optional[str] = None) -> None:
+        lines.extend([f"## {title}", ""])
+        if output:
+            lines.extend(["```", output, "```", ""])
+
+    _step(f"migrate goto {base}", _migrate(dsn, base))
+    await _seed(dsn, rows, threads, months)
+    seeded = await _fingerprint(dsn)
+    _step("seeded")
+    lines.extend([f"- {k}: {v}" for k, v in seeded.items()] + [""])
+
+    for target in (head, base, head):
+        _step(f"migrate goto {target}", _migrate(dsn, target))
+        current = await _fingerprint(dsn)
+        same = all(current[k] == seeded[k] for k in ("rows", "deleted", "digest"))
+        failed |= not same
+        lines.append(f"- fingerprint: {'same as seeded' if same else 'CHANGED'}")
+        lines.extend([f"- {k}: {v}" for k, v in current.items()] + [""])
+        if target == head and not checked:
+            # Planes sobre el esquema final, una sola vez
+            checked = True
+            results = await check_plans.run(dsn, 50_000, 100)
+            output = "\n".join(
+                check_plans.format_result(name, r) for name, r in results.items()
+            )
+            _step("check_plans", output)
+            failed |= any(r["problems"] for r in results.values())
+
+    lines.append("FAIL" if failed else "PASS")
+    return lines
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--dsn", required=True, help="throwaway database: it is seeded")
+    ap.add_argument("--rows", type=int, default=200_000)
+    ap.add_argument("--threads", type=int, default=500)
+    ap.add_argument("--months", type=int, default=6)
+    ap.add_argument("--base", type=int, default=BASE_VERSION)
+    ap.add_argument("--out", help="write the transcript to this file")
+    args = ap.parse_args()
+    lines = asyncio.run(
+        rehearse(args.dsn, args.rows, args.threads, args.months, args.base)
+    )
+    text = "\n".join(lines) + "\n"
+    print(text, end="")
+    if args.out:
+        out = Path(args.out)
+        out.parent.mkdir(parents=True, exist_ok=True)
+        out.write_text(text, encoding="utf-8")
+    sys.exit(0 if lines[-1] == "PASS" else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,7 +5,7 @@
 import dataclasses
 import datetime
 import uuid
-from typing import Any, Optional
+from typing import Any, List, Optional
 
 import sqlalchemy
 
@@ -46,14 +46,37 @@ class CreateMessageParams:
     user_id: uuid.UUID
     type: Optional[models.Type]
     column_4: Optional[Any]
-    paths: Optional[Any]
+    paths: Optional[List[str]]
     column_6: Optional[Any]
     column_7: Optional[Any]
 
 
+CREATE_MESSAGES_BATCH = """-- name: create_messages_batch \\:many
+INSERT INTO messages (
+  id, thread_id, user_id, type, content, paths, created_at, updated_at
+)
+SELECT u.id, u.thread_id, u.user_id, u.type, COALESCE(u.content, ''), jsonb_to_text_array(u.paths\\:\\:jsonb), NOW(), NOW()
+FROM unnest(
+  :p1\\:\\:uuid[], :p2\\:\\:uuid[], :p3\\:\\:uuid[], :p4\\:\\:"type"[], :p5\\:\\:text[], :p6\\:\\:text[]
+) AS u(id, thread_id, user_id, type, content, paths)
+RETURNING id, thread_id, user_id, type, content, paths, created_at, updated_at, deleted_at
+"""
+
+
+@dataclasses.dataclass()
+class CreateMessagesBatchParams:
+    column_1: List[uuid.UUID]
+    column_2: List[uuid.UUID]
+    column_3: List[uuid.UUID]
+    column_4: List[models.Type]
+    column_5: List[str]
+    column_6: List[str]
+
+
 DELETE_MESSAGE_HARD = """-- name: delete_message_hard \\:exec
 DELETE FROM messages
 WHERE id = :p1
+  AND created_at BETWEEN uuid_v7_created_min(:p1) AND uuid_v7_created_max(:p1)
 """
 
 
@@ -85,12 +108,14 @@ LIMIT 1
 GET_MESSAGE_BY_ID = """-- name: get_message_by_id \\:one
 SELECT id, thread_id, user_id, type, content, paths, created_at, updated_at, deleted_at FROM messages
 WHERE id = :p1
+  AND created_at BETWEEN uuid_v7_created_min(:p1) AND uuid_v7_created_max(:p1)
 """
 
 
 GET_MESSAGE_BY_ID_FOR_UPDATE = """-- name: get_message_by_id_for_update \\:one
 SELECT id, thread_id, user_id, type, content, paths, created_at, updated_at, deleted_at FROM messages
 WHERE id = :p1
+  AND created_at BETWEEN uuid_v7_created_min(:p1) AND uuid_v7_created_max(:p1)
 FOR UPDATE
 """
 
@@ -107,7 +132,7 @@ LIMIT :p3
 LIST_THREAD_MESSAGES_BY_PATH_CONTAINS = """-- name: list_thread_messages_by_path_contains \\:many
 SELECT id, thread_id, user_id, type, content, paths, created_at, updated_at, deleted_at FROM messages
 WHERE thread_id = :p1
-  AND paths @> :p2\\:\\:jsonb
+  AND paths @> :p2\\:\\:text[]
 ORDER BY created_at DESC
 LIMIT :p3
 """
@@ -118,6 +143,7 @@ SELECT id, thread_id, user_id, type, content, paths, created_at, updated_at, del
 WHERE thread_id = :p1
   AND type = :p2
   AND (created_at, id) < (:p3, :p4)
+  AND created_at <= :p3
 ORDER BY created_at DESC, id DESC
 LIMIT :p5
 """
@@ -155,6 +181,7 @@ SELECT id, thread_id, user_id, type, content, paths, created_at, updated_at, del
 WHERE thread_id = :p1
   AND deleted_at IS NULL
   AND (created_at, id) < (:p2, :p3)
+  AND created_at <= :p2
 ORDER BY created_at DESC, id DESC
 LIMIT :p4
 """
@@ -164,7 +191,7 @@ LIST_THREAD_MESSAGES_NOT_DELETED_DESC_FIRST = """-- name: list_thread_messages_n
 SELECT id, thread_id, user_id, type, content, paths, created_at, updated_at, deleted_at FROM messages
 WHERE thread_id = :p1
   AND deleted_at IS NULL
-ORDER BY created_at DESC
+ORDER BY created_at DESC, id DESC
 LIMIT :p2
 """
 
@@ -173,6 +200,7 @@ LIST_THREAD_MESSAGES_SEEK_AFTER = """-- name: list_thread_messages_seek_after \\
 SELECT id, thread_id, user_id, type, content, paths, created_at, updated_at, deleted_at FROM messages
 WHERE thread_id = :p1
   AND id > :p2
+  AND created_at >= uuid_v7_created_min(:p2)
 ORDER BY id ASC
 LIMIT :p3
 """
@@ -182,6 +210,7 @@ LIST_THREAD_MESSAGES_SEEK_BEFORE = """-- name: list_thread_messages_seek_before
 SELECT id, thread_id, user_id, type, content, paths, created_at, updated_at, deleted_at FROM messages
 WHERE thread_id = :p1
   AND id < :p2
+  AND created_at <= uuid_v7_created_max(:p2)
 ORDER BY id DESC
 LIMIT :p3
 """
@@ -201,6 +230,7 @@ UPDATE messages
 SET deleted_at = NULL,
     updated_at = NOW()
 WHERE id = :p1
+  AND created_at BETWEEN uuid_v7_created_min(:p1) AND uuid_v7_created_max(:p1)
 RETURNING id, thread_id, user_id, type, content, paths, created_at, updated_at, deleted_at
 """
 
@@ -230,6 +260,17 @@ UPDATE messages
 SET deleted_at = COALESCE(:p2, NOW()),
     updated_at = NOW()
 WHERE id = :p1 AND deleted_at IS NULL
+  AND created_at BETWEEN uuid_v7_created_min(:p1) AND uuid_v7_created_max(:p1)
+RETURNING id, thread_id, user_id, type, content, paths, created_at, updated_at, deleted_at
+"""
+
+
+SOFT_DELETE_THREAD_MESSAGE = """-- name: soft_delete_thread_message \\:one
+UPDATE messages
+SET deleted_at = COALESCE(:p3, NOW()),
+    updated_at = NOW()
+WHERE id = :p1 AND thread_id = :p2 AND deleted_at IS NULL
+  AND created_at BETWEEN uuid_v7_created_min(:p1) AND uuid_v7_created_max(:p1)
 RETURNING id, thread_id, user_id, type, content, paths, created_at, updated_at, deleted_at
 """
 
@@ -241,5 +282,18 @@ SET
   paths      = COALESCE(:p3, paths),
   updated_at = COALESCE(:p4, NOW())
 WHERE id = :p1
+  AND created_at BETWEEN uuid_v7_created_min(:p1) AND uuid_v7_created_max(:p1)
+RETURNING id, thread_id, user_id, type, content, paths, created_at, updated_at, deleted_at
+"""
+
+
+UPDATE_THREAD_MESSAGE_CONTENT_AND_PATHS = """-- name: update_thread_message_content_and_paths \\:one
+UPDATE messages
+SET
+  content    = COALESCE(:p3, content),
+  paths      = COALESCE(:p4, paths),
+  updated_at = COALESCE(:p5, NOW())
+WHERE id = :p1 AND thread_id = :p2
+  AND created_at BETWEEN uuid_v7_created_min(:p1) AND uuid_v7_created_max(:p1)
 RETURNING id, thread_id, user_id, type, content, paths, created_at, updated_at, deleted_at
 """
@@ -5,7 +5,7 @@ import dataclasses
 import datetime
 import enum
 import uuid
-from typing import Any, Optional
+from typing import Any, List, Optional
 
 
 class Type(str, enum.Enum):
@@ -21,7 +21,20 @@ class Message:
     user_id: uuid.UUID
     type: Optional[Type]
     content: Optional[str]
-    paths: Optional[Any]
+    paths: Optional[List[str]]
     created_at: Optional[datetime.datetime]
     updated_at: Optional[datetime.datetime]
     deleted_at: Optional[datetime.datetime]
+
+
+@dataclasses.dataclass()
+class Outbox:
+    id: int
+    event_type: str
+    tag: str
+    payload: Any
+    attempts: int
+    created_at: datetime.datetime
+    locked_until: Optional[datetime.datetime]
+    dead_at: Optional[datetime.datetime]
+    last_error: Optional[str]
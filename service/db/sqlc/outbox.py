@@ -0,0 +1,95 @@
+# Code generated by sqlc. DO NOT EDIT.
+# versions:
+#   sqlc v1.29.0
+# source: outbox.sql
+import dataclasses
+from typing import Any, List, Optional
+
+import sqlalchemy
+
+CLAIM_OUTBOX_BATCH = """-- name: claim_outbox_batch \\:many
+UPDATE outbox
+SET locked_until = NOW() + make_interval(secs => :p2)
+WHERE id IN (
+  SELECT id FROM outbox
+  WHERE dead_at IS NULL
+    AND (locked_until IS NULL OR locked_until < NOW())
+  ORDER BY id
+  LIMIT :p1
+  FOR UPDATE SKIP LOCKED
+)
+RETURNING id, event_type, tag, payload\\:\\:text AS body, attempts
+"""
+
+
+@dataclasses.dataclass()
+class ClaimOutboxBatchRow:
+    id: int
+    event_type: str
+    tag: str
+    body: str
+    attempts: int
+
+
+COUNT_OUTBOX_DEAD_EVENTS = """-- name: count_outbox_dead_events \\:one
+SELECT count(*) FROM outbox
+WHERE dead_at IS NOT NULL
+"""
+
+
+COUNT_OUTBOX_EVENTS = """-- name: count_outbox_events \\:one
+SELECT count(*) FROM outbox
+WHERE dead_at IS NULL
+"""
+
+
+DELETE_OUTBOX_EVENTS = """-- name: delete_outbox_events \\:exec
+DELETE FROM outbox
+WHERE id = ANY(:p1\\:\\:bigint[])
+"""
+
+
+ENQUEUE_OUTBOX_EVENT = """-- name: enqueue_outbox_event \\:exec
+INSERT INTO outbox (event_type, tag, payload)
+VALUES (:p1, :p2, :p3\\:\\:text\\:\\:jsonb)
+"""
+
+
+ENQUEUE_OUTBOX_EVENTS = """-- name: enqueue_outbox_events \\:exec
+INSERT INTO outbox (event_type, tag, payload)
+SELECT u.event_type, u.tag, u.payload\\:\\:jsonb
+FROM unnest(:p1\\:\\:text[], :p2\\:\\:text[], :p3\\:\\:text[]) AS u(event_type, tag, payload)
+"""
+
+
+@dataclasses.dataclass()
+class EnqueueOutboxEventsParams:
+    column_1: List[str]
+    column_2: List[str]
+    column_3: List[str]
+
+
+MARK_OUTBOX_EVENTS_FAILED = """-- name: mark_outbox_events_failed \\:many
+UPDATE outbox AS o
+SET attempts     = o.attempts + 1,
+    locked_until = NOW() + make_interval(secs => :p3),
+    dead_at      = CASE WHEN o.attempts + 1 >= :p4 THEN NOW() END,
+    last_error   = u.error
+FROM unnest(:p1\\:\\:bigint[], :p2\\:\\:text[]) AS u(id, error)
+WHERE o.id = u.id
+RETURNING o.id, o.dead_at IS NOT NULL AS dead
+"""
+
+
+@dataclasses.dataclass()
+class MarkOutboxEventsFailedParams:
+    column_1: List[int]
+    column_2: List[str]
+    make_interval: Any
+    attempts: Any
+
+
+@dataclasses.dataclass()
+class MarkOutboxEventsFailedRow:
+    id: int
+    dead: Optional[bool]
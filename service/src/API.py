@@ -1,46 +1,215 @@
 import datetime
+import hashlib
 import logging
 import os
 import uuid
-from logging.handlers import RotatingFileHandler
-from typing import Any, List, Optional, Tuple
+from contextlib import asynccontextmanager
+from typing import Any, List, Mapping, Optional, Sequence, Tuple
 
-from fastapi import Depends, FastAPI, Header, HTTPException, Query, status
+from fastapi import (Depends, FastAPI, Header, HTTPException, Query, Response,
+                     status)
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel, Field
 
 import cache as cache_recent
 import Controller
+import metrics
+import outbox
+import partition_watch
+import profiler
+import redis_outbox
+import request_context
+import slow_queries
+import structured_logging
+from clients import rabbitmq
+from clients import redis as redis_client
+from db import connection as db_connection
 from db.sqlc import models as sqlc_models
+from group_commit import group_commit_stats
+from serialization import ORJSONBytesResponse, encode_messages_page
+from single_flight import SingleFlight
 
 # Configuración de logs del servicio
 DIR = os.path.normpath("/app/logs")
 NAME = "logsAPI.log"
 os.makedirs(DIR, exist_ok=True)
-app = FastAPI(title="Messages Service API")
+
+
+# Estado de arranque expuesto por /readyz
+STATE = {"ready": False}
+
+
+async def _warm_up() -> None:
+    # Cada paso es de mejor esfuerzo: si falla se registra y se reintenta
+    # de forma perezosa en el primer uso, igual que antes
+    try:
+        await db_connection.warm_up_pool()
+    except Exception as e:
+        logging.getLogger("API_logs").warning(
+            f"DB warm-up failed err={e.__class__.__name__}:{e}"
+        )
+        return
+    try:
+        await redis_client.ping()
+    except Exception as e:
+        logging.getLogger("API_logs").warning(
+            f"Redis warm-up failed err={e.__class__.__name__}:{e}"
+        )
+    # Conexión y canal al broker se abren una sola vez por proceso
+    await rabbitmq.start_publisher()
+    STATE["ready"] = True
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    await _warm_up()
+    await outbox.start_relay()
+    await redis_outbox.start_relay()
+    await partition_watch.start_watch()
+    await cache_recent.start_invalidation_listener()
+    cache_recent.set_refresher(_refresh_first_page)
+    try:
+        yield
+    finally:
+        STATE["ready"] = False
+        await cache_recent.stop_refreshes()
+        await cache_recent.stop_invalidation_listener()
+        await slow_queries.stop()
+        await partition_watch.stop_watch()
+        await redis_outbox.stop_relay()
+        await outbox.stop_relay()
+        await rabbitmq.close_publisher()
+        await redis_client.close_client()
+        await db_connection.close_pool()
+        structured_logging.stop_listener()
+
+
+app = FastAPI(title="Messages Service API", lifespan=lifespan)
 
 
 def get_logger(name: str) -> logging.Logger:
-    logger = logging.getLogger(name)
-    logger.setLevel(logging.INFO)
-    log_path = os.path.join(DIR, NAME)
-    handler = RotatingFileHandler(log_path, maxBytes=5_000_000, backupCount=3)
-    formatter = logging.Formatter("%(asctime)s %(levelname)s %(message)s")
-    handler.setFormatter(formatter)
-    logger.addHandler(handler)
-    logger.propagate = False
-    return logger
+    # Líneas JSON; la escritura a disco corre en un hilo aparte (QueueListener)
+    return structured_logging.setup_logger(name, os.path.join(DIR, NAME))
 
 
 def set_info(msg: str) -> None:
-    LOGS.info(msg)
-    for h in LOGS.handlers:
-        try:
-            h.flush()
-        except Exception:
-            pass
+    # Solo encola: nunca hace I/O en el event loop. Respeta el muestreo del request
+    if request_context.sampled():
+        LOGS.info(msg)
 
 
 LOGS = get_logger("API_logs")
+app.add_middleware(structured_logging.AccessLogMiddleware, logger_name="API_logs")
+if profiler.available():
+    # Solo se registra si está habilitado: desactivado no agrega costo
+    app.add_middleware(profiler.ProfilerMiddleware)
+# Tiempo de DB por request (access log) y por query / espera del pool (/metrics)
+db_connection.add_query_observer(request_context.observe_query)
+db_connection.add_query_observer(
+    lambda sql, seconds: metrics.observe_query(db_connection.query_name(sql), seconds)
+)
+db_connection.add_acquire_observer(request_context.observe_pool_wait)
+db_connection.add_acquire_observer(metrics.observe_pool_wait)
+slow_queries.install()
+
+
+def _service_metrics() -> List[metrics.Family]:
+    # Gauges y contadores que ya llevan los componentes, leídos al exportar
+    pool = db_connection.pool_stats()
+    families: List[metrics.Family] = [
+        ("db_pool_size", "gauge", "Open connections in the pool", [({}, pool["size"])]),
+        ("db_pool_in_use", "gauge", "Connections checked out", [({}, pool["in_use"])]),
+        (
+            "db_pool_max_size",
+            "gauge",
+            "Configured pool max_size",
+            [({}, pool["max_size"])],
+        ),
+    ]
+    l1 = cache_recent.l1_stats()
+    lookups = l1["hits"] + l1["misses"]
+    families += metrics.stats_families(
+        "cache_l1",
+        "In-process cache",
+        {**l1, "hit_ratio": l1["hits"] / lookups if lookups else 0.0},
+        counters=("hits", "misses", "evictions", "expirations", "invalidations"),
+    )
+    families += metrics.stats_families(
+        "cache_redis",
+        "Redis window reads",
+        cache_recent.redis_stats(),
+        counters=("hits", "misses"),
+    )
+    families += metrics.stats_families(
+        "cache_swr",
+        "Stale-while-revalidate",
+        cache_recent.swr_stats(),
+        counters=("stale_hits", "refreshes", "refresh_errors"),
+    )
+    families += metrics.stats_families(
+        "list_single_flight",
+        "First-page load coalescing",
+        _flights.stats(),
+        counters=("leaders", "coalesced"),
+    )
+    families += metrics.stats_families(
+        "broker_publisher",
+        "Persistent RabbitMQ publisher",
+        rabbitmq.publisher_stats(),
+        counters=("published", "failed", "reconnects"),
+    )
+    families += metrics.stats_families(
+        "group_commit",
+        "Create group commit",
+        group_commit_stats(),
+        counters=("batches", "rows"),
+    )
+    explain = slow_queries.slow_query_stats()
+    families += metrics.stats_families(
+        "db_slow_query",
+        "Slow query EXPLAIN capture",
+        {"plans": explain["plans"], "explain_errors": explain["explain_errors"]},
+        counters=("plans", "explain_errors"),
+    )
+    relay = outbox.relay_stats()
+    if relay:
+        families += metrics.stats_families(
+            "outbox_relay",
+            "Transactional outbox relay",
+            relay,
+            counters=("relayed", "failed", "dead_lettered", "batches"),
+        )
+    redis_relay = redis_outbox.relay_stats()
+    if redis_relay:
+        families += metrics.stats_families(
+            "redis_outbox_relay",
+            "Redis outbox relay",
+            redis_relay,
+            counters=("relayed", "failed", "dead_lettered"),
+        )
+    watch = partition_watch.watch_stats()
+    if watch:
+        families += metrics.stats_families(
+            "messages_partitions",
+            "Monthly partitions of messages",
+            watch,
+            counters=("checks", "check_errors"),
+        )
+    families.append(
+        (
+            "log_records_dropped_total",
+            "counter",
+            "Log records dropped (queue full)",
+            [({}, structured_logging.dropped(LOGS))],
+        )
+    )
+    return families
+
+
+metrics.register_collector("service", _service_metrics)
+
+# Máximo de mensajes aceptados por POST .../messages:batch
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "500"))
 
 
 # Modelos de entrada/salida
@@ -94,6 +263,69 @@ def to_message_out(row: dict[str, Any]) -> MessageOut:
     return MessageOut(**row)
 
 
+@app.get("/readyz", include_in_schema=False)
+async def readyz():
+    """Listo solo cuando el pool (y sus statements) está creado."""
+    if not STATE["ready"]:
+        try:
+            await db_connection.warm_up_pool()
+            STATE["ready"] = True
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e)
+            )
+    return {"status": "ok"}
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint() -> PlainTextResponse:
+    """Métricas en formato de texto de Prometheus."""
+    return PlainTextResponse(
+        metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+def _check_profiler(token: Optional[str]) -> None:
+    if not profiler.available():
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if not profiler.authorized(token):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
+
+
+@app.post("/debug/profile", include_in_schema=False)
+async def start_profile(
+    seconds: float = Query(10, gt=0, le=profiler.PROFILER_MAX_SECONDS),
+    x_profile_token: Optional[str] = Header(None, alias="X-Profile-Token"),
+):
+    """Inicia una ventana de perfilado de todo el proceso (admin)."""
+    _check_profiler(x_profile_token)
+    try:
+        session = await profiler.start_window(seconds)
+    except RuntimeError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    return {"file": session.path, "seconds": seconds}
+
+
+@app.get("/debug/profile", include_in_schema=False)
+async def profile_status(
+    x_profile_token: Optional[str] = Header(None, alias="X-Profile-Token"),
+):
+    _check_profiler(x_profile_token)
+    return profiler.window_status()
+
+
+@app.get("/debug/slow-queries", include_in_schema=False)
+async def slow_query_log(
+    x_debug_token: Optional[str] = Header(None, alias="X-Debug-Token"),
+):
+    """Últimas queries lentas y planes capturados (admin)."""
+    if not slow_queries.enabled():
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if not slow_queries.authorized(x_debug_token):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
+    return slow_queries.snapshot()
+
+
 @app.post(
     "/threads/{thread_id}/messages",
     status_code=status.HTTP_201_CREATED,
@@ -112,11 +344,41 @@ async def create_message(
         raise map_error_to_http(error)
     assert resultado is not None
     set_info(f"Create message thread={thread_id} user={user_id} type={payload.type}")
-    # Invalidar caché del hilo tras crear un mensaje
-    await cache_recent.invalidate_thread(str(thread_id))
+    # Write-through: agrega el mensaje a la página cacheada del hilo
+    await cache_recent.apply_created(str(thread_id), resultado)
     return to_message_out(resultado)
 
 
+@app.post(
+    "/threads/{thread_id}/messages:batch",
+    status_code=status.HTTP_201_CREATED,
+    response_model=List[MessageOut],
+    tags=["messages"],
+)
+async def create_messages_batch(
+    thread_id: uuid.UUID,
+    payload: List[MessageCreateIn],
+    user_id: uuid.UUID = Depends(get_user_id),
+):
+    if len(payload) == 0 or len(payload) > BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Batch must contain between 1 and {BATCH_MAX_ITEMS} messages",
+        )
+    resultado, error = await Controller.CreateMessagesBatch(
+        thread_id, user_id, [(m.content, m.type, m.paths) for m in payload]
+    )
+    if error is not None:
+        raise map_error_to_http(error)
+    assert resultado is not None
+    set_info(
+        f"Create messages batch thread={thread_id} user={user_id} items={len(resultado)}"
+    )
+    # Una sola invalidación de caché por lote
+    await cache_recent.invalidate_thread(str(thread_id))
+    return [to_message_out(r) for r in resultado]
+
+
 @app.put(
     "/threads/{thread_id}/messages/{message_id}",
     response_model=MessageOut,
@@ -135,8 +397,8 @@ async def update_message(
         raise map_error_to_http(error)
     assert resultado is not None
     set_info(f"Update message thread={thread_id} msg={message_id} user={user_id}")
-    # Invalidar caché tras actualizar
-    await cache_recent.invalidate_thread(str(thread_id))
+    # Write-through: reemplaza el mensaje en la página cacheada
+    await cache_recent.apply_updated(str(thread_id), resultado)
     return to_message_out(resultado)
 
 
@@ -154,56 +416,99 @@ async def delete_message(
     if error is not None:
         raise map_error_to_http(error)
     set_info(f"Delete message thread={thread_id} msg={message_id} user={user_id}")
-    # Invalidar caché tras eliminar
-    await cache_recent.invalidate_thread(str(thread_id))
+    # Write-through: quita el mensaje de la página cacheada
+    await cache_recent.apply_deleted(str(thread_id), str(message_id))
     return None
 
 
+def _parse_cursor(cur: str) -> Optional[Tuple[datetime.datetime, uuid.UUID]]:
+    """Cursor `"<created_at iso>|<id>"` → (created_at, id), o None si es inválido."""
+    try:
+        p = cur.split("|", 1)
+        if len(p) != 2:
+            return None
+        ts = datetime.datetime.fromisoformat(p[0])
+        mid = uuid.UUID(p[1])
+        return ts, mid
+    except Exception:
+        return None
+
+
+def _make_cursor(item: Mapping[str, Any]) -> Optional[str]:
+    ts = item.get("created_at")
+    mid = item.get("id")
+    if ts is None or mid is None:
+        return None
+    if isinstance(ts, datetime.datetime):
+        ts_str = ts.isoformat()
+    else:
+        ts_str = str(ts)
+    return f"{ts_str}|{mid}"
+
+
+# Misses concurrentes de la primera página comparten una sola consulta por
+# hilo, sea cual sea el limit pedido
+_flights = SingleFlight()
+
+
+async def _load_first_page(
+    thread_id: uuid.UUID,
+) -> Tuple[Optional[Sequence[Mapping[str, Any]]], Optional[Exception], Optional[int]]:
+    """Carga CACHE_MAX_ITEMS filas y rellena la ventana de Redis con todas.
+
+    Así las páginas con cursor siguientes caen dentro de la ventana y un
+    limit distinto no pisa la ventana de otro. El llamador recorta a su
+    limit. Devuelve también la generación del L1 tras rellenar (o None).
+    """
+    key = str(thread_id)
+    window = cache_recent.CACHE_MAX_ITEMS
+    token = await cache_recent.acquire_fill_lock(key)
+    if token is None:
+        # Otra réplica está rellenando el hilo: esperar su resultado
+        recent = await cache_recent.wait_for_fill(key, window)
+        if recent is not None:
+            return recent, None, None
+    try:
+        resultado, error = await Controller.ListMessages(thread_id, 1, str(window))
+        generation = None
+        if error is None and resultado is not None:
+            generation = await cache_recent.set_recent_messages(
+                key, resultado, complete=len(resultado) < window
+            )
+        return resultado, error, generation
+    finally:
+        if token:
+            await cache_recent.release_fill_lock(key, token)
+
+
+async def _refresh_first_page(thread_id: str, limit: int) -> None:
+    # Refresco stale-while-revalidate: misma carga (y single-flight) que un
+    # miss; la ventana se rellena entera, no solo el limit que la sirvió
+    tid = uuid.UUID(thread_id)
+    _, error, _ = await _flights.do(tid, lambda: _load_first_page(tid))
+    if error is not None:
+        raise error
+
+
 @app.get(
     "/threads/{thread_id}/messages",
-    response_model=MessagesPageOut,
+    # Sin response_model: el cuerpo se codifica directo desde las filas con
+    # orjson. El esquema sigue documentado en OpenAPI vía `responses`
+    response_model=None,
+    response_class=ORJSONBytesResponse,
+    responses={200: {"model": MessagesPageOut}},
     tags=["messages"],
 )
 async def list_messages(
     thread_id: uuid.UUID,
     limit: int = Query(50, ge=1, le=200, description="Number of messages"),
     cursor: Optional[str] = Query(None, description="Cursor for keyset pagination"),
+    if_none_match: Optional[str] = Header(None, alias="If-None-Match"),
 ):
     set_info(
         f"List messages thread={thread_id} limit={limit} cursor={'set' if cursor else 'none'}"
     )
 
-    def _parse_cursor(cur: str) -> Optional[Tuple[datetime.datetime, uuid.UUID]]:
-        try:
-            p = cur.split("|", 1)
-            if len(p) != 2:
-                return None
-            ts = datetime.datetime.fromisoformat(p[0])
-            mid = uuid.UUID(p[1])
-            return ts, mid
-        except Exception:
-            return None
-
-    def _make_cursor(item: dict[str, Any]) -> Optional[str]:
-        ts = item.get("created_at")
-        mid = item.get("id")
-        if ts is None or mid is None:
-            return None
-        if isinstance(ts, datetime.datetime):
-            ts_str = ts.isoformat()
-        else:
-            ts_str = str(ts)
-        return f"{ts_str}|{mid}"
-
-    if cursor is None and limit <= cache_recent.CACHE_MAX_ITEMS:
-        recent = await cache_recent.get_recent_messages(str(thread_id), limit)
-        if recent is not None:
-            set_info(f"Cache hit thread={thread_id} items={len(recent)} limit={limit}")
-            items = [to_message_out(r) for r in recent]
-            next_cur = _make_cursor(recent[-1]) if len(recent) > 0 else None
-            has_more = len(recent) == limit
-            return MessagesPageOut(items=items, next_cursor=next_cur, has_more=has_more)
-
     before = _parse_cursor(cursor) if cursor else None
     if before is None and cursor is not None:
         raise HTTPException(
@@ -211,20 +516,71 @@ async def list_messages(
         )
 
     if before is None:
-        resultado, error = await Controller.ListMessages(thread_id, 1, str(limit))
-    else:
-        ts, mid = before
-        resultado, error = await Controller.ListMessagesBefore(
-            thread_id, ts, mid, limit
+        # Camino rápido: cuerpo ya codificado, sin JSON ni Pydantic
+        body_hit = cache_recent.get_page_body(str(thread_id), limit)
+        if body_hit is not None:
+            request_context.note_cache("body")
+            set_info(f"Cache hit (body) thread={thread_id} limit={limit}")
+            return _page_response(*body_hit, if_none_match)
+    # Antes de leer: si el hilo se invalida mientras tanto, el cuerpo no se guarda
+    epoch = cache_recent.l1_epoch(str(thread_id))
+
+    resultado: Optional[Sequence[Mapping[str, Any]]] = None
+    if limit <= cache_recent.CACHE_MAX_ITEMS:
+        # Primera página o páginas con cursor dentro de la ventana cacheada
+        resultado = await cache_recent.get_recent_messages(
+            str(thread_id), limit, before
         )
-    if error is not None:
-        raise map_error_to_http(error)
-    assert resultado is not None
-
-    if before is None:
-        await cache_recent.set_recent_messages(str(thread_id), resultado)
+        if resultado is not None:
+            request_context.note_cache("hit")
+            set_info(
+                f"Cache hit thread={thread_id} items={len(resultado)} limit={limit}"
+            )
+
+    if resultado is None:
+        request_context.note_cache("miss")
+        if before is None and limit <= cache_recent.CACHE_MAX_ITEMS:
+            # Un solo load por hilo aunque lleguen muchos misses juntos
+            resultado, error, filled = await _flights.do(
+                thread_id, lambda: _load_first_page(thread_id)
+            )
+            if resultado is not None:
+                resultado = resultado[:limit]
+            if filled is not None:
+                # El relleno invalida el hilo en el L1, pero el cuerpo sale de
+                # esas mismas filas: vale con la generación que dejó el relleno
+                epoch = filled
+        elif before is None:
+            # Más filas de las que guarda la ventana: directo a la base
+            resultado, error = await Controller.ListMessages(thread_id, 1, str(limit))
+        else:
+            ts, mid = before
+            resultado, error = await Controller.ListMessagesBefore(
+                thread_id, ts, mid, limit
+            )
+        if error is not None:
+            raise map_error_to_http(error)
+        assert resultado is not None
 
-    items = [to_message_out(r) for r in resultado]
     next_cur = _make_cursor(resultado[-1]) if len(resultado) > 0 else None
     has_more = len(resultado) == limit
-    return MessagesPageOut(items=items, next_cursor=next_cur, has_more=has_more)
+    body = encode_messages_page(resultado, next_cur, has_more)
+    if before is not None:
+        return ORJSONBytesResponse(body)
+
+    etag = _etag(body)
+    cache_recent.put_page_body(str(thread_id), limit, body, etag, epoch)
+    return _page_response(body, etag, if_none_match)
+
+
+def _etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def _page_response(body: bytes, etag: str, if_none_match: Optional[str]) -> Response:
+    headers = {"ETag": etag}
+    if if_none_match is not None and etag in {
+        t.strip().removeprefix("W/") for t in if_none_match.split(",")
+    }:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return ORJSONBytesResponse(body, headers=headers)
@@ -1,17 +1,18 @@
-import asyncio
 import datetime
 import logging
 import os
 import uuid
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, List, Mapping, Optional, Tuple
 
-from clients.rabbitmq import SendEvent
+import group_commit
+import outbox
+from clients.rabbitmq import PublishEvent
 from db.sqlc import models as sqlc_models
-from db.sqlc.messages import (CREATE_MESSAGE, GET_MESSAGE_BY_ID_FOR_UPDATE,
+from db.sqlc.messages import (CREATE_MESSAGE,
                               LIST_THREAD_MESSAGES_NOT_DELETED_DESC_BEFORE,
                               LIST_THREAD_MESSAGES_NOT_DELETED_DESC_FIRST,
-                              SOFT_DELETE_MESSAGE,
-                              UPDATE_MESSAGE_CONTENT_AND_PATHS)
+                              SOFT_DELETE_THREAD_MESSAGE,
+                              UPDATE_THREAD_MESSAGE_CONTENT_AND_PATHS)
 
 CHUNK_DATE, CHUNK_CANT = 10, 50  # 10 días y 50 mensajes
 
@@ -25,8 +26,15 @@ def _as_uuid(value: Any) -> uuid.UUID:
 async def _send_event_async(
     event_type: str, data: Dict[str, Any]
 ) -> Optional[Exception]:
-    loop = asyncio.get_running_loop()
-    return await loop.run_in_executor(None, lambda: SendEvent(event_type, data))
+    # Publicador persistente: sin handshakes TCP/AMQP por evento
+    return await PublishEvent(event_type, data)
+
+
+async def _insert_message(conn: Any, sql: str, values: List[Any]) -> Dict[str, Any]:
+    row = await conn.fetchrow(sql, *values)
+    if row is None:
+        raise Exception("No row returned when creating message")
+    return dict(row)
 
 
 async def CreateMessage(
@@ -39,10 +47,11 @@ async def CreateMessage(
     resultado: Optional[Dict[str, Any]] = None
     error: Optional[Exception] = None
 
+    type_value = typeM.value if isinstance(typeM, sqlc_models.Type) else typeM
     params = {
         "p1": _as_uuid(thread),
         "p2": _as_uuid(user),
-        "p3": (typeM.value if isinstance(typeM, sqlc_models.Type) else typeM),
+        "p3": type_value,
         "p4": content,
         "p5": path,
         "p6": None,  # created_at -> NOW() por defecto
@@ -51,24 +60,100 @@ async def CreateMessage(
     sql, values = prepare(CREATE_MESSAGE, params)
 
     try:
-        pool = await get_pool()
-        async with pool.acquire() as conn:
-            row = await conn.fetchrow(sql, *values)
-            if row is None:
-                raise Exception("No row returned when creating message")
-            resultado = dict(row)
+        if group_commit.enabled():
+            # Se agrupa con otros inserts concurrentes en un solo INSERT
+            resultado = await group_commit.get_batcher().submit(
+                _as_uuid(thread), _as_uuid(user), type_value, content, path
+            )
+        else:
+            pool = await get_pool()
+            async with pool.acquire() as conn:
+                if outbox.enabled():
+                    # Mensaje y evento se confirman en la misma transacción
+                    async with conn.transaction():
+                        resultado = await _insert_message(conn, sql, values)
+                        await outbox.enqueue(
+                            conn,
+                            "CREATE",
+                            {"tag": "messages_service", "message": resultado},
+                        )
+                else:
+                    resultado = await _insert_message(conn, sql, values)
+
+        if outbox.enabled():
+            # El relay publica en segundo plano; el request no espera al broker
+            outbox.notify()
+        else:
+            evt_error = await _send_event_async(
+                "CREATE",
+                {
+                    "tag": "messages_service",
+                    "message": resultado,
+                },
+            )
+            if evt_error is not None:
+                logging.getLogger("API_logs").warning(
+                    f"Queue publish failed tag=messages_service err={evt_error}"
+                )
+    except Exception as e:
+        error = e
+
+    return resultado, error
+
 
-        evt_error = await _send_event_async(
-            "CREATE",
-            {
-                "tag": "messages_service",
-                "message": resultado,
-            },
+async def CreateMessagesBatch(
+    thread: uuid.UUID,
+    user: uuid.UUID,
+    items: List[Tuple[Optional[str], Optional[sqlc_models.Type], Optional[List[str]]]],
+) -> Tuple[Optional[List[Dict[str, Any]]], Optional[Exception]]:
+    # items: (content, type, paths) por mensaje, en el orden recibido
+    resultado: Optional[List[Dict[str, Any]]] = None
+    error: Optional[Exception] = None
+
+    sql, _ = prepare(CREATE_MESSAGE, {})
+    args = [
+        (
+            _as_uuid(thread),
+            _as_uuid(user),
+            (typeM.value if isinstance(typeM, sqlc_models.Type) else typeM),
+            content,
+            path,
+            None,  # created_at -> NOW() por defecto
+            None,  # updated_at -> NOW() por defecto
         )
-        if evt_error is not None:
-            logging.getLogger("API_logs").warning(
-                f"Queue publish failed tag=messages_service err={evt_error}"
+        for content, typeM, path in items
+    ]
+
+    try:
+        pool = await get_pool()
+        async with pool.acquire() as conn:
+            # executemany con RETURNING: un solo round trip y un solo commit
+            async with conn.transaction():
+                rows = await conn.fetchmany(sql, args)
+                if len(rows) != len(args):
+                    raise Exception("No row returned when creating messages")
+                resultado = [dict(r) for r in rows]
+                if outbox.enabled():
+                    await outbox.enqueue(
+                        conn,
+                        "CREATE_BATCH",
+                        {"tag": "messages_service", "messages": resultado},
+                    )
+
+        if outbox.enabled():
+            outbox.notify()
+        else:
+            evt_error = await _send_event_async(
+                "CREATE_BATCH",
+                {
+                    "tag": "messages_service",
+                    "messages": resultado,
+                },
             )
+            if evt_error is not None:
+                logging.getLogger("API_logs").warning(
+                    f"Queue publish failed tag=messages_service batch={len(resultado)} err={evt_error}"
+                )
     except Exception as e:
         error = e
 
@@ -90,22 +175,16 @@ async def UpdateMessage(
     try:
         pool = await get_pool()
         async with pool.acquire() as conn:
-            # 1) Validar pertenencia al thread (y bloquear fila para actualización)
-            sel_sql, sel_vals = prepare(
-                GET_MESSAGE_BY_ID_FOR_UPDATE, {"p1": _as_uuid(message)}
-            )
-            current = await conn.fetchrow(sel_sql, *sel_vals)
-            if current is None or current.get("thread_id") != _as_uuid(thread):
-                raise Exception("No row returned when updating message")
-
-            # 2) Actualizar contenido/paths usando query de sqlc
+            # Un solo UPDATE condicionado al thread: valida pertenencia y
+            # actualiza en el mismo statement (sin ventana de carrera)
             upd_sql, upd_vals = prepare(
-                UPDATE_MESSAGE_CONTENT_AND_PATHS,
+                UPDATE_THREAD_MESSAGE_CONTENT_AND_PATHS,
                 {
                     "p1": _as_uuid(message),
-                    "p2": content,
-                    "p3": path,
-                    "p4": None,  # updated_at -> NOW() por defecto
+                    "p2": _as_uuid(thread),
+                    "p3": content,
+                    "p4": path,
+                    "p5": None,  # updated_at -> NOW() por defecto
                 },
             )
             row = await conn.fetchrow(upd_sql, *upd_vals)
@@ -128,21 +207,10 @@ async def DeleteMessage(
     try:
         pool = await get_pool()
         async with pool.acquire() as conn:
-            # 1) Validar pertenencia al thread y que no esté borrado
-            sel_sql, sel_vals = prepare(
-                GET_MESSAGE_BY_ID_FOR_UPDATE, {"p1": _as_uuid(message)}
-            )
-            current = await conn.fetchrow(sel_sql, *sel_vals)
-            if (
-                current is None
-                or current.get("thread_id") != _as_uuid(thread)
-                or current.get("deleted_at") is not None
-            ):
-                raise Exception("No row returned when deleting message")
-
-            # 2) Ejecutar soft delete de sqlc
+            # Soft delete condicionado a thread y a que no esté borrado
             del_sql, del_vals = prepare(
-                SOFT_DELETE_MESSAGE, {"p1": _as_uuid(message), "p2": None}
+                SOFT_DELETE_THREAD_MESSAGE,
+                {"p1": _as_uuid(message), "p2": _as_uuid(thread), "p3": None},
             )
             row = await conn.fetchrow(del_sql, *del_vals)
             if row is None:
@@ -166,10 +234,10 @@ async def ListMessages(
     thread: uuid.UUID,
     typeM: Optional[int],
     filtro: Optional[str],
-) -> Tuple[Optional[List[Dict[str, Any]]], Optional[Exception]]:
+) -> Tuple[Optional[List[Mapping[str, Any]]], Optional[Exception]]:
     # Si typeM == 1 -> filtro por cantidad (n últimos)
     # Si typeM == -1 -> filtro por fecha (PENDIENTE)
-    resultado: Optional[List[Dict[str, Any]]] = None
+    resultado: Optional[List[Mapping[str, Any]]] = None
     error: Optional[Exception] = None
 
     limit = CHUNK_CANT
@@ -185,8 +253,8 @@ async def ListMessages(
     try:
         pool = await get_pool()
         async with pool.acquire() as conn:
-            rows = await conn.fetch(sql, *values)
-            resultado = [dict(r) for r in rows]
+            # Records tal cual: la API los codifica sin pasar por dict
+            resultado = await conn.fetch(sql, *values)
     except Exception as e:
         error = e
 
@@ -198,8 +266,8 @@ async def ListMessagesBefore(
     created_at: datetime.datetime,
     message_id: uuid.UUID,
     limit: int,
-) -> Tuple[Optional[List[Dict[str, Any]]], Optional[Exception]]:
-    resultado: Optional[List[Dict[str, Any]]] = None
+) -> Tuple[Optional[List[Mapping[str, Any]]], Optional[Exception]]:
+    resultado: Optional[List[Mapping[str, Any]]] = None
     error: Optional[Exception] = None
 
     params = {
@@ -213,8 +281,8 @@ async def ListMessagesBefore(
     try:
         pool = await get_pool()
         async with pool.acquire() as conn:
-            rows = await conn.fetch(sql, *values)
-            resultado = [dict(r) for r in rows]
+            # Records tal cual: la API los codifica sin pasar por dict
+            resultado = await conn.fetch(sql, *values)
     except Exception as e:
         error = e
 
@@ -1,9 +1,15 @@
+import asyncio
+import datetime
 import json
 import logging
 import os
-from typing import Any, Dict, List, Optional
+import time
+from typing import (Any, Awaitable, Callable, Dict, List, Mapping, Optional,
+                    Sequence, Set, Tuple)
 
+import metrics
 from clients.redis import cache_enabled, get_client
+from local_cache import LocalCache
 
 try:
     import orjson  # type: ignore
@@ -11,17 +17,78 @@ except Exception:  # pragma: no cover - opcional
     orjson = None  # type: ignore
 
 
+# TTL duro: pasado este tiempo la ventana desaparece de Redis y la lectura bloquea
 CACHE_TTL_SECONDS = int(os.getenv("CACHE_TTL_SECONDS", "120"))
+# TTL blando: pasado este tiempo la ventana se sirve igual (stale) y se
+# refresca en segundo plano. 0 = desactivado
+CACHE_SOFT_TTL_SECONDS = int(os.getenv("CACHE_SOFT_TTL_SECONDS", "30"))
 CACHE_MAX_ITEMS = int(os.getenv("CACHE_MAX_ITEMS", "200"))
 CACHE_TOUCH_ON_HIT = os.getenv("CACHE_TOUCH_ON_HIT", "true").lower() in {
     "1",
     "true",
     "yes",
 }
+# L1 en memoria por proceso delante de Redis. El TTL acota lo que puede durar
+# una entrada si se pierde un mensaje de invalidación (pub/sub no garantiza entrega)
+CACHE_L1_ENABLED = os.getenv("CACHE_L1_ENABLED", "true").lower() in {
+    "1",
+    "true",
+    "yes",
+}
+CACHE_L1_MAX_THREADS = int(os.getenv("CACHE_L1_MAX_THREADS", "1000"))
+CACHE_L1_TTL_SECONDS = float(os.getenv("CACHE_L1_TTL_SECONDS", "5"))
+CACHE_INVALIDATION_CHANNEL = os.getenv(
+    "CACHE_INVALIDATION_CHANNEL", "messages:cache:invalidate"
+)
+
+# Lock corto en Redis para que una sola réplica rellene un hilo tras un miss
+# (0 = desactivado; el single-flight dentro del proceso siempre está activo)
+CACHE_FILL_LOCK_MS = int(os.getenv("CACHE_FILL_LOCK_MS", "0"))
+CACHE_FILL_POLL_MS = int(os.getenv("CACHE_FILL_POLL_MS", "20"))
+
+Refresher = Callable[[str, int], Awaitable[Any]]
+_refresher: Optional[Refresher] = None
+_refreshing: Set[str] = set()
+_refresh_tasks: Set["asyncio.Task[Any]"] = set()
+_swr = {"stale_hits": 0, "refreshes": 0, "refresh_errors": 0}
+# Resultado de las lecturas que llegan a Redis (tras un miss del L1)
+_redis = {"hits": 0, "misses": 0}
+
+_l1 = LocalCache(CACHE_L1_MAX_THREADS, CACHE_L1_TTL_SECONDS if CACHE_L1_ENABLED else 0)
+_listener: Optional[asyncio.Task] = None
+
+
+def _key_index(thread_id: str) -> str:
+    # ZSET: score = created_at en µs, member = id (desempate por id, como la query)
+    return f"messages:thread:{thread_id}:recent:z"
 
 
-def _key_recent(thread_id: str) -> str:
-    return f"messages:thread:{thread_id}:recent"
+def _key_fill_lock(thread_id: str) -> str:
+    return f"messages:thread:{thread_id}:recent:lock"
+
+
+def _key_items(thread_id: str) -> str:
+    # HASH: id -> mensaje serializado, más el campo COMPLETE_FIELD
+    return f"messages:thread:{thread_id}:recent:h"
+
+
+# "1" si la ventana contiene todos los mensajes del hilo (no hay más antiguos)
+COMPLETE_FIELD = "_complete"
+# Epoch en ms hasta el que la ventana se considera fresca
+FRESH_FIELD = "_fresh_until"
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+_MICRO = datetime.timedelta(microseconds=1)
+
+
+def _score(ts: Any) -> int:
+    """created_at -> µs desde epoch (exacto; cabe en un double hasta ~2255)."""
+    if not isinstance(ts, datetime.datetime):
+        ts = datetime.datetime.fromisoformat(str(ts))
+    if ts.tzinfo is not None:
+        # Las columnas son `timestamp` sin zona: normalizar a UTC naive
+        ts = ts.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return (ts - _EPOCH) // _MICRO
 
 
 def _dumps(obj: Any) -> str:
@@ -37,24 +104,151 @@ def _loads(s: str) -> Any:
     return json.loads(s)
 
 
+# Scripts Lua: cada operación es atómica y cuesta un solo round-trip.
+# Devuelven arrays planos (sin cjson) para no depender de su codificación.
+
+# KEYS: index, items. ARGV: max_score, cursor_id, limit, ttl, complete_field,
+# fresh_field, now_ms -> false si no hay ventana; si no {complete, fresh_until, json...}
+_READ_LUA = """
+local meta = redis.call('HMGET', KEYS[2], ARGV[5], ARGV[6])
+local complete = meta[1]
+if not complete then return false end
+local fresh_until = meta[2] or '0'
+local limit = tonumber(ARGV[3])
+local offset = 0
+if ARGV[2] ~= '' then
+  -- Empates de created_at: saltar los ids >= cursor (vienen primero en orden DESC)
+  local ties = redis.call('ZRANGEBYSCORE', KEYS[1], ARGV[1], ARGV[1])
+  for _, m in ipairs(ties) do
+    if m >= ARGV[2] then offset = offset + 1 end
+  end
+end
+local ids = redis.call('ZREVRANGEBYSCORE', KEYS[1], ARGV[1], '-inf', 'LIMIT', offset, limit)
+local out = {complete, fresh_until}
+if #ids > 0 then
+  local vals = redis.call('HMGET', KEYS[2], unpack(ids))
+  for _, v in ipairs(vals) do
+    if not v then return false end
+    out[#out + 1] = v
+  end
+end
+-- Solo se prolonga una ventana fresca: una stale expira a su TTL duro
+local ttl = tonumber(ARGV[4])
+if ttl > 0 and tonumber(fresh_until) > tonumber(ARGV[7]) then
+  redis.call('EXPIRE', KEYS[1], ttl)
+  redis.call('EXPIRE', KEYS[2], ttl)
+end
+return out
+"""
+
+# KEYS: index, items. ARGV: score, id, json, max_items, complete_field
+_CREATED_LUA = """
+local complete = redis.call('HGET', KEYS[2], ARGV[5])
+if not complete then return 0 end
+local score = tonumber(ARGV[1])
+if complete ~= '1' then
+  -- Más antiguo que toda la ventana: no sabemos qué hay entre medio
+  local oldest = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+  if #oldest > 0 then
+    local s = tonumber(oldest[2])
+    if score < s or (score == s and ARGV[2] < oldest[1]) then return 0 end
+  end
+end
+redis.call('ZADD', KEYS[1], ARGV[1], ARGV[2])
+redis.call('HSET', KEYS[2], ARGV[2], ARGV[3])
+local ttl = redis.call('PTTL', KEYS[2])
+if ttl > 0 then redis.call('PEXPIRE', KEYS[1], ttl) end
+local extra = redis.call('ZCARD', KEYS[1]) - tonumber(ARGV[4])
+if extra > 0 then
+  local drop = redis.call('ZRANGE', KEYS[1], 0, extra - 1)
+  redis.call('ZREM', KEYS[1], unpack(drop))
+  redis.call('HDEL', KEYS[2], unpack(drop))
+  redis.call('HSET', KEYS[2], ARGV[5], '0')
+end
+return 1
+"""
+
+# KEYS: index, items. ARGV: id, json
+_UPDATED_LUA = """
+if not redis.call('ZSCORE', KEYS[1], ARGV[1]) then return 0 end
+redis.call('HSET', KEYS[2], ARGV[1], ARGV[2])
+return 1
+"""
+
+_scripts: Dict[str, Any] = {}
+
+
+def _script(client: Any, name: str, source: str) -> Any:
+    # register_script usa EVALSHA y recarga el script si Redis no lo tiene
+    key = f"{id(client)}:{name}"
+    script = _scripts.get(key)
+    if script is None:
+        script = client.register_script(source)
+        _scripts[key] = script
+    return script
+
+
+def _keys(thread_id: str) -> List[str]:
+    return [_key_index(thread_id), _key_items(thread_id)]
+
+
 async def get_recent_messages(
-    thread_id: str, limit: int
+    thread_id: str,
+    limit: int,
+    before: Optional[Tuple[datetime.datetime, Any]] = None,
 ) -> Optional[List[Dict[str, Any]]]:
+    """Página de `limit` mensajes (opcionalmente anteriores al cursor `before`).
+
+    Solo es un hit si la ventana cacheada alcanza para la página completa
+    o si contiene el hilo entero; si no, None y se consulta la DB.
+    """
     if not cache_enabled():
         return None
     client = get_client()
     if client is None:
         return None
+    if before is None:
+        max_score, cursor_id = "+inf", ""
+    else:
+        max_score, cursor_id = str(_score(before[0])), str(before[1])
+    page = (limit, max_score, cursor_id)
+    cached = _l1.get(thread_id, page)
+    if cached is not None:
+        return cached
+    generation = _l1.generation(thread_id)
+    ttl = CACHE_TTL_SECONDS if CACHE_TOUCH_ON_HIT else 0
+    now_ms = int(time.time() * 1000)
     try:
-        val = await client.get(_key_recent(thread_id))
-        if val is None:
+        started = time.perf_counter()
+        res = await _script(client, "read", _READ_LUA)(
+            keys=_keys(thread_id),
+            args=[
+                max_score,
+                cursor_id,
+                limit,
+                ttl,
+                COMPLETE_FIELD,
+                FRESH_FIELD,
+                now_ms,
+            ],
+        )
+        metrics.REDIS_LATENCY.observe(time.perf_counter() - started, "get")
+        if not res:
+            _redis["misses"] += 1
             return None
-        data = _loads(val)
-        if not isinstance(data, list):
+        complete, fresh_until, raw = res[0] == "1", int(res[1]), res[2:]
+        if len(raw) < limit and not complete:
+            # La ventana termina antes que la página
+            _redis["misses"] += 1
             return None
-        if CACHE_TOUCH_ON_HIT and CACHE_TTL_SECONDS > 0:
-            await client.expire(_key_recent(thread_id), CACHE_TTL_SECONDS)
-        return data[:limit]
+        _redis["hits"] += 1
+        items = [_loads(v) for v in raw]
+        if CACHE_SOFT_TTL_SECONDS > 0 and fresh_until <= now_ms:
+            # Stale-while-revalidate: se sirve igual y se refresca aparte
+            _swr["stale_hits"] += 1
+            _schedule_refresh(thread_id, limit)
+        _l1.put(thread_id, page, items, generation)
+        return items
     except Exception as e:
         # Log en WARN si falla redis al obtener
         logging.getLogger("API_logs").warning(
@@ -63,25 +257,163 @@ async def get_recent_messages(
         return None
 
 
-async def set_recent_messages(thread_id: str, items: List[Dict[str, Any]]) -> None:
+async def set_recent_messages(
+    thread_id: str, items: Sequence[Mapping[str, Any]], complete: bool = False
+) -> Optional[int]:
+    """Reemplaza la ventana con la primera página leída de la DB.
+
+    `complete` indica que la página trajo menos filas que el límite pedido,
+    es decir, que no hay mensajes más antiguos. Devuelve la generación del
+    hilo en el L1 tras el relleno (None si no se guardó): lo derivado de
+    `items` se puede guardar con ella aunque el relleno haya invalidado el hilo.
+    """
     if not cache_enabled():
-        return
+        return None
     client = get_client()
     if client is None:
-        return
+        return None
     try:
         trimmed = items[:CACHE_MAX_ITEMS]
-        payload = _dumps(trimmed)
+        complete = complete and len(trimmed) == len(items)
+        index = {str(i["id"]): _score(i["created_at"]) for i in trimmed}
+        # dict(): las filas pueden ser asyncpg.Record
+        values = {str(i["id"]): _dumps(dict(i)) for i in trimmed}
+        values[COMPLETE_FIELD] = "1" if complete else "0"
+        values[FRESH_FIELD] = str(
+            int((time.time() + CACHE_SOFT_TTL_SECONDS) * 1000)
+            if CACHE_SOFT_TTL_SECONDS > 0
+            else 2**62
+        )
+        index_key, items_key = _keys(thread_id)
+        pipe = client.pipeline(transaction=True)
+        pipe.delete(index_key, items_key)
+        if index:
+            pipe.zadd(index_key, index)
+        pipe.hset(items_key, mapping=values)
         if CACHE_TTL_SECONDS > 0:
-            await client.set(_key_recent(thread_id), payload, ex=CACHE_TTL_SECONDS)
-        else:
-            await client.set(_key_recent(thread_id), payload)
+            pipe.expire(index_key, CACHE_TTL_SECONDS)
+            pipe.expire(items_key, CACHE_TTL_SECONDS)
+        started = time.perf_counter()
+        await pipe.execute()
+        metrics.REDIS_LATENCY.observe(time.perf_counter() - started, "set")
+        _l1.evict(thread_id)
+        return _l1.generation(thread_id)
     except Exception as e:
         # mejor esfuerzo
         logging.getLogger("API_logs").warning(
             f"Cache set error thread={thread_id} items={len(items)} err={e.__class__.__name__}:{e}"
         )
+        return None
+
+
+def set_refresher(fn: Optional[Refresher]) -> None:
+    """Registra la carga desde la DB que usa el refresco en segundo plano.
+
+    `fn(thread_id, limit)` debe leer la primera página y llamar a
+    `set_recent_messages`; la API registra la misma carga que usa en un miss.
+    """
+    global _refresher
+    _refresher = fn
+
+
+def _schedule_refresh(thread_id: str, limit: int) -> None:
+    if _refresher is None or thread_id in _refreshing:
+        return
+    _refreshing.add(thread_id)
+    task = asyncio.get_running_loop().create_task(_refresh(thread_id, limit))
+    _refresh_tasks.add(task)
+    task.add_done_callback(_refresh_tasks.discard)
+
+
+async def _refresh(thread_id: str, limit: int) -> None:
+    try:
+        assert _refresher is not None
+        await _refresher(thread_id, limit)
+        _swr["refreshes"] += 1
+    except Exception as e:
+        _swr["refresh_errors"] += 1
+        logging.getLogger("API_logs").warning(
+            f"Cache refresh error thread={thread_id} err={e.__class__.__name__}:{e}"
+        )
+    finally:
+        _refreshing.discard(thread_id)
+
+
+async def stop_refreshes() -> None:
+    set_refresher(None)
+    tasks = list(_refresh_tasks)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def redis_stats() -> Dict[str, Any]:
+    total = _redis["hits"] + _redis["misses"]
+    return {**_redis, "hit_ratio": _redis["hits"] / total if total else 0.0}
+
+
+def swr_stats() -> Dict[str, Any]:
+    return {**_swr, "refreshing": len(_refreshing)}
+
+
+async def acquire_fill_lock(thread_id: str) -> Optional[str]:
+    """Token del lock de relleno, o None si otra réplica ya está rellenando.
+
+    Sin Redis o con el lock desactivado siempre se obtiene (token vacío).
+    """
+    if CACHE_FILL_LOCK_MS <= 0 or not cache_enabled():
+        return ""
+    client = get_client()
+    if client is None:
+        return ""
+    token = os.urandom(8).hex()
+    try:
+        ok = await client.set(
+            _key_fill_lock(thread_id), token, nx=True, px=CACHE_FILL_LOCK_MS
+        )
+    except Exception as e:
+        logging.getLogger("API_logs").warning(
+            f"Cache fill lock error thread={thread_id} err={e.__class__.__name__}:{e}"
+        )
+        return ""
+    return token if ok else None
+
+
+_RELEASE_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+  return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+async def release_fill_lock(thread_id: str, token: str) -> None:
+    if not token:
+        return
+    client = get_client()
+    if client is None:
         return
+    try:
+        # Solo lo borra quien lo tomó (puede haber expirado y tenerlo otro)
+        await _script(client, "release", _RELEASE_LUA)(
+            keys=[_key_fill_lock(thread_id)], args=[token]
+        )
+    except Exception as e:
+        logging.getLogger("API_logs").warning(
+            f"Cache fill unlock error thread={thread_id} err={e.__class__.__name__}:{e}"
+        )
+
+
+async def wait_for_fill(thread_id: str, limit: int) -> Optional[List[Dict[str, Any]]]:
+    """Espera (como mucho lo que dura el lock) a que otra réplica rellene."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + CACHE_FILL_LOCK_MS / 1000
+    while loop.time() < deadline:
+        await asyncio.sleep(CACHE_FILL_POLL_MS / 1000)
+        recent = await get_recent_messages(thread_id, limit)
+        if recent is not None:
+            return recent
+    return None
 
 
 async def invalidate_thread(thread_id: str) -> None:
@@ -91,9 +423,165 @@ async def invalidate_thread(thread_id: str) -> None:
     if client is None:
         return
     try:
-        await client.delete(_key_recent(thread_id))
+        await client.delete(*_keys(thread_id))
     except Exception as e:
         logging.getLogger("API_logs").warning(
             f"Cache invalidate error thread={thread_id} err={e.__class__.__name__}:{e}"
         )
+    await _broadcast(client, thread_id)
+
+
+async def _broadcast(client: Any, thread_id: str) -> None:
+    # Siempre después de escribir en Redis: una lectura concurrente que vio
+    # el dato viejo ya no puede instalarlo en el L1 (cambia la generación)
+    _l1.evict(thread_id)
+    if not CACHE_L1_ENABLED:
         return
+    try:
+        await client.publish(CACHE_INVALIDATION_CHANNEL, thread_id)
+    except Exception as e:
+        logging.getLogger("API_logs").warning(
+            f"Cache invalidation publish error thread={thread_id} err={e.__class__.__name__}:{e}"
+        )
+
+
+async def _listen() -> None:
+    # Desaloja del L1 los hilos que invalidan las demás réplicas
+    backoff = 0.5
+    while True:
+        client = get_client()
+        if client is None:
+            return
+        pubsub = client.pubsub()  # type: ignore[attr-defined]
+        try:
+            await pubsub.subscribe(CACHE_INVALIDATION_CHANNEL)
+            # Lo que se haya publicado sin estar suscrito se perdió
+            _l1.clear()
+            backoff = 0.5
+            while True:
+                msg = await pubsub.get_message(
+                    ignore_subscribe_messages=True, timeout=1.0
+                )
+                if msg is not None and msg.get("type") == "message":
+                    _l1.evict(str(msg["data"]))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.getLogger("API_logs").warning(
+                f"Cache invalidation listener error err={e.__class__.__name__}:{e}"
+            )
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30.0)
+        finally:
+            try:
+                await pubsub.aclose()
+            except Exception:
+                pass
+
+
+async def start_invalidation_listener() -> None:
+    global _listener
+    if CACHE_L1_ENABLED and _listener is None and get_client() is not None:
+        _listener = asyncio.get_running_loop().create_task(_listen())
+
+
+async def stop_invalidation_listener() -> None:
+    global _listener
+    task, _listener = _listener, None
+    if task is not None:
+        task.cancel()
+        try:
+            await task
+        except (asyncio.CancelledError, Exception):
+            pass
+
+
+# --- Cuerpos HTTP ya codificados de la primera página, en el L1 ---
+
+
+def l1_epoch(thread_id: str) -> int:
+    """Generación del hilo a capturar antes de leer los datos de una respuesta."""
+    return _l1.generation(thread_id)
+
+
+def get_page_body(thread_id: str, limit: int) -> Optional[Tuple[bytes, str]]:
+    # Sin Redis no hay invalidación entre réplicas ni write-through: no se cachea
+    if not cache_enabled():
+        return None
+    return _l1.get(thread_id, ("body", limit))
+
+
+def put_page_body(
+    thread_id: str, limit: int, body: bytes, etag: str, epoch: int
+) -> None:
+    if not cache_enabled():
+        return
+    _l1.put(thread_id, ("body", limit), (body, etag), epoch)
+
+
+def l1_stats() -> Dict[str, Any]:
+    return _l1.stats()
+
+
+# --- Write-through: aplicar la mutación sobre la ventana cacheada ---
+
+
+async def _apply(thread_id: str, name: str, op: Callable[[Any], Any]) -> None:
+    if not cache_enabled():
+        return
+    client = get_client()
+    if client is None:
+        return
+    try:
+        started = time.perf_counter()
+        await op(client)
+        metrics.REDIS_LATENCY.observe(time.perf_counter() - started, name)
+    except Exception as e:
+        logging.getLogger("API_logs").warning(
+            f"Cache {name} error thread={thread_id} err={e.__class__.__name__}:{e}"
+        )
+        # Sin garantía de consistencia: invalidación completa
+        await invalidate_thread(thread_id)
+        return
+    await _broadcast(client, thread_id)
+
+
+async def apply_created(thread_id: str, row: Dict[str, Any]) -> None:
+    async def _op(client: Any) -> None:
+        await _script(client, "created", _CREATED_LUA)(
+            keys=_keys(thread_id),
+            args=[
+                _score(row["created_at"]),
+                str(row["id"]),
+                _dumps(row),
+                CACHE_MAX_ITEMS,
+                COMPLETE_FIELD,
+            ],
+        )
+
+    await _apply(thread_id, "create", _op)
+
+
+async def apply_updated(thread_id: str, row: Dict[str, Any]) -> None:
+    if row.get("deleted_at") is not None:
+        await apply_deleted(thread_id, str(row["id"]))
+        return
+
+    async def _op(client: Any) -> None:
+        await _script(client, "updated", _UPDATED_LUA)(
+            keys=_keys(thread_id), args=[str(row["id"]), _dumps(row)]
+        )
+
+    await _apply(thread_id, "update", _op)
+
+
+async def apply_deleted(thread_id: str, message_id: str) -> None:
+    # Quitar un miembro deja la ventana contigua: solo encoge su rango
+    async def _op(client: Any) -> None:
+        index_key, items_key = _keys(thread_id)
+        pipe = client.pipeline(transaction=True)
+        pipe.zrem(index_key, message_id)
+        pipe.hdel(items_key, message_id)
+        await pipe.execute()
+
+    await _apply(thread_id, "delete", _op)
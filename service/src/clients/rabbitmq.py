@@ -1,9 +1,16 @@
+import asyncio
 import json
+import logging
 import os
 import time
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Optional, Set
 
-import pika
+import metrics
+
+try:
+    import aio_pika
+except Exception:  # pragma: no cover - aio-pika es opcional
+    aio_pika = None  # type: ignore
 
 try:
     # Opcional: usamos Redis como outbox en caso de caída del broker
@@ -25,10 +32,8 @@ def _queue_params() -> Dict[str, Any]:
         "host": os.getenv("QUEUE_HOST", "localhost"),
         "port": int(os.getenv("QUEUE_PORT", "8002")),
         # timeouts/bounds
-        "connection_attempts": int(os.getenv("QUEUE_CONN_ATTEMPTS", "1")),
         "retry_delay": float(os.getenv("QUEUE_RETRY_DELAY", "0.2")),
         "socket_timeout": float(os.getenv("QUEUE_SOCKET_TIMEOUT", "0.5")),
-        "blocked_connection_timeout": float(os.getenv("QUEUE_BLOCKED_TIMEOUT", "0.5")),
         "heartbeat": int(os.getenv("QUEUE_HEARTBEAT", "30")),
     }
 
@@ -68,75 +73,197 @@ async def _save_to_outbox_redis(event_type: str, data: Dict[str, Any]) -> None:
         return
 
 
-def SendEvent(event_type: str, data: Dict[str, Any]) -> Optional[Exception]:
-    """Publica un evento en RabbitMQ de forma best-effort.
+def _encode_event(event_type: str, data: Dict[str, Any]) -> bytes:
+    if event_type == "CREATE":
+        return json.dumps(data["message"], default=str).encode("utf-8")
+    if event_type == "CREATE_BATCH":
+        # Un solo evento con la lista completa de mensajes creados
+        return json.dumps(data["messages"], default=str).encode("utf-8")
+    raise ValueError("Unsupported event type")
+
+
+class AsyncPublisher:
+    """Publicador asyncio de larga vida sobre aio-pika.
+
+    - Conexión robusta (reconexión automática) y un canal con publisher confirms
+    - Cache de colas ya declaradas para no repetir `queue_declare`
+    - Contadores de latencia por publicación y de reconexiones
+    """
+
+    def __init__(self, params: Optional[Dict[str, Any]] = None) -> None:
+        self.params = params or _queue_params()
+        self.publish_timeout = float(os.getenv("QUEUE_PUBLISH_TIMEOUT", "1.0"))
+        # Espera mínima entre intentos de conexión inicial fallidos
+        self.reconnect_backoff = float(os.getenv("QUEUE_RECONNECT_BACKOFF", "2.0"))
+        self._connection: Any = None
+        self._channel: Any = None
+        self._declared: Set[str] = set()
+        self._lock = asyncio.Lock()
+        self._retry_at = 0.0
+        # métricas
+        self.published = 0
+        self.failed = 0
+        self.reconnects = 0
+        self.last_latency = 0.0
+        self.max_latency = 0.0
+        self.total_latency = 0.0
+
+    @property
+    def connected(self) -> bool:
+        return self._channel is not None and not self._channel.is_closed
+
+    def _on_reconnect(self, *args: Any) -> None:
+        # Tras reconectar, el broker puede haber perdido colas no durables
+        self.reconnects += 1
+        self._declared.clear()
+
+    async def connect(self) -> None:
+        if aio_pika is None:
+            raise Exception("aio-pika is not installed")
+        async with self._lock:
+            if self.connected:
+                return
+            if time.monotonic() < self._retry_at:
+                raise Exception("Broker unavailable, waiting before reconnect")
+            p = self.params
+            try:
+                if self._connection is None:
+                    self._connection = await aio_pika.connect_robust(
+                        host=p["host"],
+                        port=p["port"],
+                        login=p["user"],
+                        password=p["password"],
+                        timeout=p["socket_timeout"],
+                        heartbeat=p["heartbeat"],
+                        reconnect_interval=p["retry_delay"],
+                    )
+                    self._connection.reconnect_callbacks.add(self._on_reconnect)
+                self._channel = await self._connection.channel(publisher_confirms=True)
+                self._declared.clear()
+            except Exception:
+                self._retry_at = time.monotonic() + self.reconnect_backoff
+                await self._close_connection()
+                raise
+
+    async def _close_connection(self) -> None:
+        conn, self._connection, self._channel = self._connection, None, None
+        self._declared.clear()
+        if conn is not None:
+            try:
+                await conn.close()
+            except Exception:
+                pass
+
+    async def close(self) -> None:
+        async with self._lock:
+            await self._close_connection()
+
+    async def _ensure_queue(self, tag: str) -> None:
+        if tag in self._declared:
+            return
+        await self._channel.declare_queue(tag, durable=True)
+        self._declared.add(tag)
+
+    async def publish(
+        self, tag: str, body: bytes, event_type: Optional[str] = None
+    ) -> None:
+        """Publica `body` en la cola `tag` y espera el confirm del broker.
+
+        `event_type` va en la propiedad AMQP `type` (`CREATE`: un mensaje,
+        `CREATE_BATCH`: arreglo de mensajes) para que los consumidores de la
+        cola distingan los cuerpos.
+        """
+        start = time.perf_counter()
+        try:
+            if not self.connected:
+                await self.connect()
+            await self._ensure_queue(tag)
+            await self._channel.default_exchange.publish(
+                aio_pika.Message(
+                    body=body,
+                    content_type="application/json",
+                    type=event_type,
+                    delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+                ),
+                routing_key=tag,
+                timeout=self.publish_timeout,
+            )
+        except Exception:
+            self.failed += 1
+            raise
+        elapsed = time.perf_counter() - start
+        metrics.BROKER_PUBLISH.observe(elapsed, "confirm")
+        self.published += 1
+        self.last_latency = elapsed
+        self.total_latency += elapsed
+        if elapsed > self.max_latency:
+            self.max_latency = elapsed
+
+    def stats(self) -> Dict[str, Any]:
+        avg = self.total_latency / self.published if self.published else 0.0
+        return {
+            "connected": self.connected,
+            "published": self.published,
+            "failed": self.failed,
+            "reconnects": self.reconnects,
+            "declared_queues": len(self._declared),
+            "latency_last_ms": self.last_latency * 1000.0,
+            "latency_avg_ms": avg * 1000.0,
+            "latency_max_ms": self.max_latency * 1000.0,
+        }
+
+
+_publisher: Optional[AsyncPublisher] = None
 
-    - Nunca levanta una excepción: ante cualquier error devuelve la excepción y
-      deja que la API continúe para no impactar en el path crítico.
-    - Puede usar un outbox en Redis si está habilitado para reintentos offline.
+
+def get_publisher() -> AsyncPublisher:
+    global _publisher
+    if _publisher is None:
+        _publisher = AsyncPublisher()
+    return _publisher
+
+
+def publisher_stats() -> Dict[str, Any]:
+    return get_publisher().stats()
+
+
+async def start_publisher() -> None:
+    """Abre la conexión y el canal al iniciar la API (mejor esfuerzo)."""
+    if not _queue_enabled() or aio_pika is None:
+        return
+    try:
+        await get_publisher().connect()
+    except Exception as e:
+        logging.getLogger("API_logs").warning(
+            f"Queue connect failed on startup err={e.__class__.__name__}:{e}"
+        )
+
+
+async def close_publisher() -> None:
+    global _publisher
+    if _publisher is not None:
+        await _publisher.close()
+        _publisher = None
+
+
+async def PublishEvent(event_type: str, data: Dict[str, Any]) -> Optional[Exception]:
+    """Publica un evento sobre la conexión persistente, de forma best-effort.
+
+    - Nunca levanta: devuelve la excepción para no impactar en el path crítico.
+    - Si falla, deja el evento en el outbox de Redis (si está habilitado).
     - `data` debe contener 'tag' (cola) y 'message' (payload JSON-serializable).
     """
     if not _queue_enabled():
         return None
 
     error: Optional[Exception] = None
-    params = _queue_params()
-    connection = None
-    channel = None
-
     try:
-        credentials = pika.PlainCredentials(params["user"], params["password"])
-        connection = pika.BlockingConnection(
-            pika.ConnectionParameters(
-                host=params["host"],
-                port=params["port"],
-                credentials=credentials,
-                heartbeat=params["heartbeat"],
-                blocked_connection_timeout=params["blocked_connection_timeout"],
-                connection_attempts=params["connection_attempts"],
-                retry_delay=params["retry_delay"],
-                socket_timeout=params["socket_timeout"],
-            )
-        )
-        channel = connection.channel()
-        channel.queue_declare(queue=data["tag"], durable=True)
-
-        if event_type == "CREATE":
-            body = json.dumps(data["message"], default=str)
-            channel.basic_publish(
-                exchange="",
-                routing_key=data["tag"],
-                body=body,
-                properties=pika.BasicProperties(delivery_mode=2),
-            )
-        else:
-            error = Exception("Unsupported event type")
+        body = _encode_event(event_type, data)
+        await get_publisher().publish(data["tag"], body, event_type)
     except Exception as e:  # pragma: no cover - dependencias externas
         error = e
-    finally:
-        try:
-            if connection is not None:
-                connection.close()
-        except Exception:
-            pass
 
-    # Fallback a outbox si falló la publicación
     if error is not None:
-        try:
-            import asyncio
-
-            loop = None
-            try:
-                loop = asyncio.get_running_loop()
-            except RuntimeError:
-                loop = None
-            if loop and not loop.is_closed():
-                # Ejecutar async sin bloquear el hilo actual
-                loop.create_task(_save_to_outbox_redis(event_type, data))
-            else:
-                # Si estamos fuera de un loop, crear uno corto
-                asyncio.run(_save_to_outbox_redis(event_type, data))
-        except Exception:
-            pass
+        await _save_to_outbox_redis(event_type, data)
 
     return error
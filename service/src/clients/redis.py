@@ -71,6 +71,14 @@ def get_client() -> Optional["RedisType"]:
     return _client
 
 
+async def ping() -> bool:
+    """Abre la conexión con Redis y verifica que responda."""
+    client = get_client()
+    if client is None:
+        return False
+    return bool(await client.ping())  # type: ignore[attr-defined]
+
+
 async def close_client() -> None:
     global _client
     if _client is not None:
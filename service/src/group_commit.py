@@ -0,0 +1,177 @@
+import asyncio
+import logging
+import os
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+import outbox
+from db.connection import get_pool, json_dumps, prepare
+from db.sqlc.messages import CREATE_MESSAGES_BATCH
+from ids import uuid7
+
+# Coalescing de escrituras: agrupa los CreateMessage concurrentes que llegan
+# dentro de una ventana corta en un único INSERT multi-fila (un acquire del
+# pool y un commit/fsync de WAL por lote en vez de uno por mensaje).
+GROUP_COMMIT_ENABLED = os.getenv("GROUP_COMMIT_ENABLED", "false").lower() in {
+    "1",
+    "true",
+    "yes",
+}
+GROUP_COMMIT_WINDOW_MS = float(os.getenv("GROUP_COMMIT_WINDOW_MS", "2"))
+GROUP_COMMIT_MAX_ROWS = int(os.getenv("GROUP_COMMIT_MAX_ROWS", "64"))
+
+# Límites superiores de los buckets del histograma de tamaños de lote
+_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+_Row = Tuple[uuid.UUID, uuid.UUID, uuid.UUID, Optional[str], Optional[str], Any]
+
+
+class CreateBatcher:
+    """Agrupa inserts de mensajes y reparte cada fila a su request.
+
+    - Se vacía al cumplirse `window_ms` desde el primer pendiente o al
+      llegar a `max_rows`, lo que ocurra primero
+    - Los ids (UUIDv7) se generan aquí para emparejar las filas de RETURNING
+    """
+
+    def __init__(
+        self,
+        window_ms: float = GROUP_COMMIT_WINDOW_MS,
+        max_rows: int = GROUP_COMMIT_MAX_ROWS,
+    ) -> None:
+        self.window = max(0.0, window_ms) / 1000.0
+        self.max_rows = max(1, max_rows)
+        self._pending: List[Tuple[_Row, "asyncio.Future[Dict[str, Any]]"]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: set = set()
+        # métricas
+        self.batches = 0
+        self.rows = 0
+        self.max_batch = 0
+        self.last_batch = 0
+        self.size_buckets: Dict[int, int] = {b: 0 for b in _SIZE_BUCKETS}
+        self.size_overflow = 0
+
+    async def submit(
+        self,
+        thread: uuid.UUID,
+        user: uuid.UUID,
+        type_value: Optional[str],
+        content: Optional[str],
+        paths: Optional[List[str]],
+    ) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        fut: "asyncio.Future[Dict[str, Any]]" = loop.create_future()
+        row: _Row = (uuid7(), thread, user, type_value, content, paths)
+        self._pending.append((row, fut))
+        if len(self._pending) >= self.max_rows:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await fut
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        task = asyncio.get_running_loop().create_task(self._execute(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _execute(
+        self, batch: List[Tuple[_Row, "asyncio.Future[Dict[str, Any]]"]]
+    ) -> None:
+        self._record(len(batch))
+        rows = [r for r, _ in batch]
+        params = {
+            "p1": [r[0] for r in rows],
+            "p2": [r[1] for r in rows],
+            "p3": [r[2] for r in rows],
+            "p4": [r[3] for r in rows],
+            "p5": [r[4] for r in rows],
+            # Listas de largo variable no caben en un text[][]: viajan como JSON
+            # y jsonb_to_text_array las convierte
+            "p6": [None if r[5] is None else json_dumps(r[5]) for r in rows],
+        }
+        sql, values = prepare(CREATE_MESSAGES_BATCH, params)
+        try:
+            pool = await get_pool()
+            async with pool.acquire() as conn:
+                if outbox.enabled():
+                    async with conn.transaction():
+                        records = await conn.fetch(sql, *values)
+                        by_id = {rec["id"]: dict(rec) for rec in records}
+                        await outbox.enqueue_many(
+                            conn,
+                            [
+                                ("CREATE", {"tag": "messages_service", "message": m})
+                                for m in by_id.values()
+                            ],
+                        )
+                else:
+                    records = await conn.fetch(sql, *values)
+                    by_id = {rec["id"]: dict(rec) for rec in records}
+        except Exception as e:
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+
+        for row, fut in batch:
+            if fut.done():  # request cancelado mientras esperaba
+                continue
+            result = by_id.get(row[0])
+            if result is None:
+                fut.set_exception(Exception("No row returned when creating message"))
+            else:
+                fut.set_result(result)
+
+    def _record(self, size: int) -> None:
+        self.batches += 1
+        self.rows += size
+        self.last_batch = size
+        if size > self.max_batch:
+            self.max_batch = size
+        for b in _SIZE_BUCKETS:
+            if size <= b:
+                self.size_buckets[b] += 1
+                break
+        else:
+            self.size_overflow += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "window_ms": self.window * 1000.0,
+            "max_rows": self.max_rows,
+            "batches": self.batches,
+            "rows": self.rows,
+            "avg_batch": (self.rows / self.batches) if self.batches else 0.0,
+            "max_batch": self.max_batch,
+            "last_batch": self.last_batch,
+            "size_buckets": dict(self.size_buckets),
+            "size_overflow": self.size_overflow,
+        }
+
+
+_batcher: Optional[CreateBatcher] = None
+
+
+def enabled() -> bool:
+    return GROUP_COMMIT_ENABLED
+
+
+def get_batcher() -> CreateBatcher:
+    global _batcher
+    if _batcher is None:
+        _batcher = CreateBatcher()
+        logging.getLogger("API_logs").info(
+            f"Group commit enabled window_ms={GROUP_COMMIT_WINDOW_MS} max_rows={GROUP_COMMIT_MAX_ROWS}"
+        )
+    return _batcher
+
+
+def group_commit_stats() -> Dict[str, Any]:
+    return _batcher.stats() if _batcher is not None else {}
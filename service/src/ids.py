@@ -0,0 +1,39 @@
+import os
+import threading
+import time
+import uuid
+
+# UUIDv7 (RFC 9562) para los ids que genera la aplicación: 48 bits de
+# milisegundos Unix, versión 7, un contador de 12 bits (rand_a) y 62 bits
+# aleatorios. El contador arranca al azar en cada milisegundo y se
+# incrementa dentro del mismo, así los ids de un proceso son estrictamente
+# crecientes; si se agota, se avanza al milisegundo siguiente.
+
+_lock = threading.Lock()
+_last_ms = 0
+_seq = 0
+
+
+def uuid7() -> uuid.UUID:
+    global _last_ms, _seq
+    with _lock:
+        ms = time.time_ns() // 1_000_000
+        if ms > _last_ms:
+            # Bit alto en 0: deja margen para incrementar dentro del ms
+            _seq = int.from_bytes(os.urandom(2), "big") & 0x7FF
+        else:
+            ms = _last_ms
+            _seq += 1
+            if _seq > 0xFFF:
+                ms += 1
+                _seq = 0
+        _last_ms = ms
+        seq = _seq
+    rand_b = int.from_bytes(os.urandom(8), "big") & ((1 << 62) - 1)
+    value = (ms << 80) | (0x7 << 76) | (seq << 64) | (0b10 << 62) | rand_b
+    return uuid.UUID(int=value)
+
+
+def uuid7_time_ms(value: uuid.UUID) -> int:
+    """Milisegundos Unix codificados en un UUIDv7."""
+    return value.int >> 80
@@ -0,0 +1,92 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+
+class LocalCache:
+    """LRU en memoria, acotado y con TTL, con entradas agrupadas por hilo.
+
+    - Cada hilo guarda sus páginas (clave libre, p. ej. `(limit, cursor)`)
+    - `evict(thread)` descarta todas las páginas del hilo de una vez
+    - `generation(thread)` cambia con cada invalidación del hilo: `put`
+      descarta lo leído antes de una invalidación concurrente de ese hilo
+      para no reinstalar datos viejos; las de otros hilos no lo afectan
+    """
+
+    def __init__(self, max_threads: int, ttl: float) -> None:
+        self.max_threads = max(1, max_threads)
+        self.ttl = ttl
+        # Generación por hilo invalidado, acotada (LRU). Un hilo ausente vale
+        # `_floor`, que sube al descartar entradas: ninguna generación vuelve
+        # a un valor ya capturado
+        self.max_generations = max(1024, 4 * self.max_threads)
+        self._counter = 0
+        self._floor = 0
+        self._generations: "OrderedDict[str, int]" = OrderedDict()
+        self._data: "OrderedDict[str, Tuple[float, Dict[Hashable, Any]]]" = (
+            OrderedDict()
+        )
+        # métricas
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, thread: str, page: Hashable) -> Optional[Any]:
+        entry = self._data.get(thread)
+        if entry is not None and entry[0] <= time.monotonic():
+            del self._data[thread]
+            self.expirations += 1
+            entry = None
+        if entry is None or page not in entry[1]:
+            self.misses += 1
+            return None
+        self._data.move_to_end(thread)
+        self.hits += 1
+        return entry[1][page]
+
+    def generation(self, thread: str) -> int:
+        return self._generations.get(thread, self._floor)
+
+    def put(self, thread: str, page: Hashable, value: Any, generation: int) -> None:
+        if generation != self.generation(thread) or self.ttl <= 0:
+            return
+        entry = self._data.get(thread)
+        if entry is None:
+            # El TTL cuenta desde la primera página: todo el hilo expira junto
+            entry = (time.monotonic() + self.ttl, {})
+            self._data[thread] = entry
+            while len(self._data) > self.max_threads:
+                self._data.popitem(last=False)
+                self.evictions += 1
+        else:
+            self._data.move_to_end(thread)
+        entry[1][page] = value
+
+    def evict(self, thread: str) -> None:
+        self._counter += 1
+        self._generations[thread] = self._counter
+        self._generations.move_to_end(thread)
+        while len(self._generations) > self.max_generations:
+            _, oldest = self._generations.popitem(last=False)
+            self._floor = max(self._floor, oldest)
+        self.invalidations += 1
+        self._data.pop(thread, None)
+
+    def clear(self) -> None:
+        # Invalida todo lo capturado antes, de cualquier hilo
+        self._counter += 1
+        self._floor = self._counter
+        self._generations.clear()
+        self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
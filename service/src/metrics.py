@@ -0,0 +1,204 @@
+import bisect
+import math
+from typing import Any, Callable, Dict, Iterable, List, Sequence, Tuple
+
+# Métricas en proceso con exposición en formato de texto de Prometheus.
+# Sin dependencias ni colector externo: todo corre en el event loop, así que
+# no hace falta sincronización.
+
+# Buckets en segundos: de 0.5 ms a 10 s
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+Labels = Tuple[str, ...]
+Sample = Tuple[Dict[str, str], float]
+# Un colector devuelve (nombre, tipo, ayuda, muestras) al renderizar
+Family = Tuple[str, str, str, Iterable[Sample]]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _num(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [conteos por bucket (no acumulados) + overflow, suma]
+        self._series: Dict[Labels, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1][0] += value
+
+    def render(self) -> List[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total) in self._series.items():
+            acc = 0
+            for bound, n in zip(self.buckets + (math.inf,), counts):
+                acc += n
+                le = 'le="' + _num(bound) + '"'
+                out.append(
+                    f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {acc}"
+                )
+            lbl = _labels(self.labelnames, labels)
+            out.append(f"{self.name}_sum{lbl} {_num(total[0])}")
+            out.append(f"{self.name}_count{lbl} {acc}")
+        return out
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> List[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in self._values.items():
+            out.append(f"{self.name}{_labels(self.labelnames, labels)} {_num(value)}")
+        return out
+
+
+_metrics: Dict[str, Any] = {}
+_collectors: Dict[str, Callable[[], Iterable[Family]]] = {}
+
+
+def histogram(
+    name: str,
+    help: str,
+    labelnames: Sequence[str] = (),
+    buckets: Sequence[float] = DEFAULT_BUCKETS,
+) -> Histogram:
+    # Idempotente: reimportar un módulo no duplica la serie
+    metric = _metrics.get(name)
+    if metric is None:
+        metric = _metrics[name] = Histogram(name, help, labelnames, buckets)
+    return metric
+
+
+def counter(name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+    metric = _metrics.get(name)
+    if metric is None:
+        metric = _metrics[name] = Counter(name, help, labelnames)
+    return metric
+
+
+def register_collector(key: str, fn: Callable[[], Iterable[Family]]) -> None:
+    """Registra `fn()` -> familias (gauges/counters) leídas al renderizar.
+
+    Registrar otra vez la misma `key` reemplaza al colector anterior.
+    """
+    _collectors[key] = fn
+
+
+def render() -> str:
+    lines: List[str] = []
+    for metric in _metrics.values():
+        lines.extend(metric.render())
+    for fn in _collectors.values():
+        try:
+            families = list(fn())
+        except Exception:
+            continue
+        for name, kind, help, samples in families:
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(
+                    f"{name}{_labels(list(labels), list(labels.values()))} {_num(value)}"
+                )
+    return "\n".join(lines) + "\n"
+
+
+def stats_families(
+    prefix: str, help: str, stats: Dict[str, Any], counters: Iterable[str] = ()
+) -> List[Family]:
+    """Convierte un dict de `stats()` en familias: counters los indicados, gauges el resto."""
+    counters = set(counters)
+    families: List[Family] = []
+    for key, value in stats.items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        kind = "counter" if key in counters else "gauge"
+        name = f"{prefix}_{key}_total" if kind == "counter" else f"{prefix}_{key}"
+        families.append((name, kind, f"{help} ({key})", [({}, float(value))]))
+    return families
+
+
+# --- Métricas compartidas por los módulos del servicio ---
+
+HTTP_LATENCY = histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ("method", "route", "status"),
+)
+POOL_ACQUIRE = histogram(
+    "db_pool_acquire_seconds", "Time waiting for a connection from the asyncpg pool"
+)
+DB_QUERY = histogram(
+    "db_query_duration_seconds",
+    "Statement execution time by sqlc query name",
+    ("query",),
+)
+REDIS_LATENCY = histogram(
+    "cache_redis_duration_seconds", "Redis round trip time by cache operation", ("op",)
+)
+BROKER_PUBLISH = histogram(
+    "broker_publish_duration_seconds",
+    "RabbitMQ publish latency (until confirm)",
+    ("mode",),
+)
+
+
+def observe_pool_wait(seconds: float) -> None:
+    POOL_ACQUIRE.observe(seconds)
+
+
+def observe_query(query: str, seconds: float) -> None:
+    # `query` es el nombre de sqlc (db.connection.query_name): este módulo no
+    # importa db/ para que los scripts de src/ (p. ej. el CLI del outbox)
+    # corran sin él en el path
+    DB_QUERY.observe(seconds, query)
@@ -0,0 +1,231 @@
+import asyncio
+import json
+import logging
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from clients.rabbitmq import get_publisher
+from db.connection import get_pool, prepare
+from db.sqlc.outbox import (CLAIM_OUTBOX_BATCH, DELETE_OUTBOX_EVENTS,
+                            ENQUEUE_OUTBOX_EVENT, ENQUEUE_OUTBOX_EVENTS,
+                            MARK_OUTBOX_EVENTS_FAILED)
+
+# Outbox transaccional: el evento se escribe en la misma transacción que el
+# mensaje y un relay en segundo plano lo publica en RabbitMQ.
+OUTBOX_ENABLED = os.getenv("OUTBOX_ENABLED", "false").lower() in {
+    "1",
+    "true",
+    "yes",
+}
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "100"))
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "0.5"))
+# Lease del lote reclamado: si la réplica muere publicando, otra lo retoma al
+# vencer. Debe cubrir holgadamente el timeout de publicación con confirms.
+OUTBOX_LEASE_SECONDS = float(os.getenv("OUTBOX_LEASE_SECONDS", "30"))
+# Fallidos esperan OUTBOX_RETRY_SECONDS; al llegar a OUTBOX_MAX_ATTEMPTS
+# quedan en dead letter (`dead_at`) y el relay deja de tomarlos
+OUTBOX_RETRY_SECONDS = float(os.getenv("OUTBOX_RETRY_SECONDS", "5"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "10"))
+
+Event = Tuple[str, str, str]  # (event_type, tag, body JSON)
+
+
+def enabled() -> bool:
+    return OUTBOX_ENABLED
+
+
+def encode_body(event_type: str, data: Dict[str, Any]) -> str:
+    # Mismo cuerpo que publica clients.rabbitmq para cada tipo de evento
+    payload = data["messages"] if event_type == "CREATE_BATCH" else data["message"]
+    return json.dumps(payload, default=str)
+
+
+async def enqueue(conn: Any, event_type: str, data: Dict[str, Any]) -> None:
+    """Inserta un evento; debe llamarse dentro de la transacción del mensaje."""
+    sql, values = prepare(
+        ENQUEUE_OUTBOX_EVENT,
+        {"p1": event_type, "p2": data["tag"], "p3": encode_body(event_type, data)},
+    )
+    await conn.execute(sql, *values)
+
+
+async def enqueue_many(conn: Any, events: List[Tuple[str, Dict[str, Any]]]) -> None:
+    if not events:
+        return
+    sql, values = prepare(
+        ENQUEUE_OUTBOX_EVENTS,
+        {
+            "p1": [evt for evt, _ in events],
+            "p2": [data["tag"] for _, data in events],
+            "p3": [encode_body(evt, data) for evt, data in events],
+        },
+    )
+    await conn.execute(sql, *values)
+
+
+class OutboxRelay:
+    """Drena la tabla `outbox` en lotes y publica con confirms.
+
+    - El lote se reclama con un lease (`locked_until`) en una sentencia
+      autocommit; `FOR UPDATE SKIP LOCKED` solo dura ese UPDATE, así varias
+      réplicas drenan en paralelo sin retener locks ni conexión mientras
+      publican
+    - Las publicaciones del lote se envían juntas sobre el canal persistente
+    - Exitosos se borran; fallidos incrementan `attempts`, se reintentan tras
+      `retry_seconds` y al llegar a `max_attempts` pasan a dead letter
+    """
+
+    def __init__(
+        self,
+        batch_size: int = OUTBOX_BATCH_SIZE,
+        poll_interval: float = OUTBOX_POLL_INTERVAL,
+        lease_seconds: float = OUTBOX_LEASE_SECONDS,
+        retry_seconds: float = OUTBOX_RETRY_SECONDS,
+        max_attempts: int = OUTBOX_MAX_ATTEMPTS,
+    ) -> None:
+        self.batch_size = max(1, batch_size)
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.retry_seconds = retry_seconds
+        self.max_attempts = max(1, max_attempts)
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        # métricas
+        self.relayed = 0
+        self.failed = 0
+        self.dead_lettered = 0
+        self.batches = 0
+        self.last_batch = 0
+
+    def notify(self) -> None:
+        # Despierta al relay apenas se confirma una transacción con eventos
+        self._wakeup.set()
+
+    async def drain_once(self) -> int:
+        pool = await get_pool()
+        publisher = get_publisher()
+        sql, values = prepare(
+            CLAIM_OUTBOX_BATCH, {"p1": self.batch_size, "p2": self.lease_seconds}
+        )
+        async with pool.acquire() as conn:
+            rows = await conn.fetch(sql, *values)
+        if not rows:
+            return 0
+        # UPDATE ... RETURNING no garantiza orden; publicar en orden de id
+        rows = sorted(rows, key=lambda r: r["id"])
+        # Sin conexión ni transacción tomadas mientras se espera al broker
+        results = await asyncio.gather(
+            *[
+                publisher.publish(r["tag"], r["body"].encode("utf-8"), r["event_type"])
+                for r in rows
+            ],
+            return_exceptions=True,
+        )
+        ok = [r["id"] for r, res in zip(rows, results) if res is None]
+        failed = [(r["id"], res) for r, res in zip(rows, results) if res is not None]
+        dead: List[int] = []
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                if ok:
+                    del_sql, del_vals = prepare(DELETE_OUTBOX_EVENTS, {"p1": ok})
+                    await conn.execute(del_sql, *del_vals)
+                if failed:
+                    mark_sql, mark_vals = prepare(
+                        MARK_OUTBOX_EVENTS_FAILED,
+                        {
+                            "p1": [i for i, _ in failed],
+                            "p2": [f"{e.__class__.__name__}:{e}" for _, e in failed],
+                            "p3": self.retry_seconds,
+                            "p4": self.max_attempts,
+                        },
+                    )
+                    marked = await conn.fetch(mark_sql, *mark_vals)
+                    dead = [r["id"] for r in marked if r["dead"]]
+        self.batches += 1
+        self.last_batch = len(rows)
+        self.relayed += len(ok)
+        self.failed += len(failed)
+        self.dead_lettered += len(dead)
+        if dead:
+            logging.getLogger("API_logs").error(
+                f"Outbox relay dead-lettered count={len(dead)} ids={dead}"
+            )
+        if failed:
+            logging.getLogger("API_logs").warning(
+                f"Outbox relay publish failed count={len(failed)} err={failed[0][1]}"
+            )
+            # No insistir en caliente si el broker está caído
+            return 0
+        return len(rows)
+
+    async def run(self) -> None:
+        while True:
+            try:
+                n = await self.drain_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.getLogger("API_logs").warning(
+                    f"Outbox relay error err={e.__class__.__name__}:{e}"
+                )
+                n = 0
+            if n >= self.batch_size:
+                continue  # hay más pendientes, seguir drenando
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "relayed": self.relayed,
+            "failed": self.failed,
+            "dead_lettered": self.dead_lettered,
+            "batches": self.batches,
+            "last_batch": self.last_batch,
+        }
+
+
+_relay: Optional[OutboxRelay] = None
+
+
+def get_relay() -> OutboxRelay:
+    global _relay
+    if _relay is None:
+        _relay = OutboxRelay()
+    return _relay
+
+
+def notify() -> None:
+    if _relay is not None:
+        _relay.notify()
+
+
+async def start_relay() -> None:
+    if enabled():
+        get_relay().start()
+
+
+async def stop_relay() -> None:
+    global _relay
+    if _relay is not None:
+        await _relay.stop()
+        _relay = None
+
+
+def relay_stats() -> Dict[str, Any]:
+    return _relay.stats() if _relay is not None else {}
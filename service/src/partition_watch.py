@@ -0,0 +1,119 @@
+import asyncio
+import datetime
+import logging
+import os
+from typing import Any, Dict, Optional
+
+from db import partitions
+from db.connection import get_pool
+
+# Vigila cuántos meses por delante cubren las particiones de `messages`.
+# No hay partición DEFAULT, así que si el CronJob de db.partitions deja de
+# correr los inserts fallan al llegar al primer mes sin partición; esto lo
+# avisa antes en /metrics y en el log.
+PARTITIONS_CHECK_INTERVAL = float(os.getenv("PARTITIONS_CHECK_INTERVAL", "3600"))
+# Menos meses que esto por delante se reporta como `low` y se loguea en error
+PARTITIONS_MIN_MONTHS_AHEAD = int(os.getenv("PARTITIONS_MIN_MONTHS_AHEAD", "1"))
+
+
+class PartitionWatch:
+    """Consulta periódicamente las particiones adjuntas a `messages`.
+
+    - `months_ahead` es el gauge de margen (ver `partitions.months_ahead`)
+    - `low` vale 1 cuando el margen es menor a `min_months_ahead`
+    - No afecta /readyz: sacar todas las réplicas del Service no arregla
+      nada y los inserts siguen funcionando mientras quede margen
+    """
+
+    def __init__(
+        self,
+        interval: float = PARTITIONS_CHECK_INTERVAL,
+        min_months_ahead: int = PARTITIONS_MIN_MONTHS_AHEAD,
+    ) -> None:
+        self.interval = max(1.0, interval)
+        self.min_months_ahead = min_months_ahead
+        self._task: Optional[asyncio.Task] = None
+        # métricas
+        self.months_ahead: Optional[int] = None
+        self.checks = 0
+        self.check_errors = 0
+
+    async def check_once(self) -> Optional[int]:
+        pool = await get_pool()
+        async with pool.acquire() as conn:
+            existing = await partitions.attached_partitions(conn)
+        self.months_ahead = partitions.months_ahead(datetime.date.today(), existing)
+        self.checks += 1
+        if self.low():
+            logging.getLogger("API_logs").error(
+                f"messages partitions cover months_ahead={self.months_ahead} "
+                f"(min {self.min_months_ahead}); run python -m db.partitions"
+            )
+        return self.months_ahead
+
+    def low(self) -> bool:
+        return (
+            self.months_ahead is not None and self.months_ahead < self.min_months_ahead
+        )
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await self.check_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.check_errors += 1
+                logging.getLogger("API_logs").warning(
+                    f"Partition check error err={e.__class__.__name__}:{e}"
+                )
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        stats: Dict[str, Any] = {
+            "min_months_ahead": self.min_months_ahead,
+            "low": int(self.low()),
+            "checks": self.checks,
+            "check_errors": self.check_errors,
+        }
+        if self.months_ahead is not None:
+            stats["months_ahead"] = self.months_ahead
+        return stats
+
+
+_watch: Optional[PartitionWatch] = None
+
+
+def get_watch() -> PartitionWatch:
+    global _watch
+    if _watch is None:
+        _watch = PartitionWatch()
+    return _watch
+
+
+async def start_watch() -> None:
+    get_watch().start()
+
+
+async def stop_watch() -> None:
+    global _watch
+    if _watch is not None:
+        await _watch.stop()
+        _watch = None
+
+
+def watch_stats() -> Dict[str, Any]:
+    return _watch.stats() if _watch is not None else {}
@@ -0,0 +1,180 @@
+import asyncio
+import collections
+import datetime
+import hmac
+import os
+import signal
+from types import FrameType
+from typing import Any, Dict, List, Optional
+
+# Profiler estadístico opt-in: SIGPROF cada PROFILER_INTERVAL_MS de CPU toma
+# el stack de Python del hilo principal (donde corre el event loop) y lo
+# acumula en formato "collapsed" (a;b;c N), compatible con flamegraph.pl y
+# speedscope. Desactivado no registra middleware ni handler: costo cero.
+PROFILER_ENABLED = os.getenv("PROFILER_ENABLED", "false").lower() in {
+    "1",
+    "true",
+    "yes",
+}
+PROFILER_INTERVAL_MS = float(os.getenv("PROFILER_INTERVAL_MS", "5"))
+PROFILER_DIR = os.getenv("PROFILER_DIR", "/tmp/profiles")
+# El header y la ruta admin lo exigen; sin token ninguno se acepta
+PROFILER_TOKEN = os.getenv("PROFILER_TOKEN", "")
+PROFILER_MAX_SECONDS = float(os.getenv("PROFILER_MAX_SECONDS", "300"))
+PROFILE_HEADER = "x-profile"
+
+_MAX_DEPTH = 128
+
+
+def available() -> bool:
+    return PROFILER_ENABLED and hasattr(signal, "setitimer")
+
+
+def authorized(token: Optional[str]) -> bool:
+    if not PROFILER_TOKEN or token is None:
+        return False
+    return hmac.compare_digest(token.encode(), PROFILER_TOKEN.encode())
+
+
+def _collapse(frame: Optional[FrameType]) -> str:
+    parts: List[str] = []
+    while frame is not None and len(parts) < _MAX_DEPTH:
+        code = frame.f_code
+        parts.append(
+            f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+        )
+        frame = frame.f_back
+    parts.reverse()
+    return ";".join(parts)
+
+
+class Session:
+    """Muestras de un request (filtradas por su tarea) o de una ventana global."""
+
+    def __init__(self, label: str, task: Optional["asyncio.Task[Any]"] = None) -> None:
+        self.label = label
+        self.task = task
+        self.samples: "collections.Counter[str]" = collections.Counter()
+        ts = datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+        self.path = os.path.join(PROFILER_DIR, f"{ts}-{label}.folded")
+
+    @property
+    def total(self) -> int:
+        return sum(self.samples.values())
+
+    def write(self) -> str:
+        os.makedirs(PROFILER_DIR, exist_ok=True)
+        with open(self.path, "w", encoding="utf-8") as f:
+            for stack, n in self.samples.most_common():
+                f.write(f"{stack} {n}\n")
+        return self.path
+
+
+class Sampler:
+    """Un único temporizador SIGPROF compartido por todas las sesiones activas."""
+
+    def __init__(self, interval: float) -> None:
+        self.interval = interval
+        self.sessions: List[Session] = []
+        self.window: Optional[Session] = None
+        self._previous: Any = None
+
+    def _handler(self, signum: int, frame: Optional[FrameType]) -> None:
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        stack: Optional[str] = None
+        for session in self.sessions:
+            if session.task is not None and session.task is not task:
+                continue
+            if stack is None:
+                stack = _collapse(frame)
+            session.samples[stack] += 1
+
+    def start(self, session: Session) -> None:
+        if not self.sessions:
+            # signal.signal solo funciona en el hilo principal
+            self._previous = signal.signal(signal.SIGPROF, self._handler)
+            signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+        self.sessions.append(session)
+
+    def stop(self, session: Session) -> None:
+        if session in self.sessions:
+            self.sessions.remove(session)
+        if not self.sessions:
+            signal.setitimer(signal.ITIMER_PROF, 0, 0)
+            signal.signal(signal.SIGPROF, self._previous or signal.SIG_DFL)
+
+
+_sampler = Sampler(PROFILER_INTERVAL_MS / 1000)
+
+
+async def _finish(session: Session) -> str:
+    _sampler.stop(session)
+    # Escritura a disco fuera del event loop
+    return await asyncio.to_thread(session.write)
+
+
+def window_status() -> Dict[str, Any]:
+    window = _sampler.window
+    if window is None:
+        return {"active": False}
+    return {"active": True, "file": window.path, "samples": window.total}
+
+
+async def start_window(seconds: float) -> Session:
+    """Perfila todo el proceso durante `seconds` y escribe el archivo al final."""
+    if _sampler.window is not None:
+        raise RuntimeError("A profiling window is already running")
+    session = Session("window")
+    _sampler.start(session)
+    _sampler.window = session
+
+    async def _stop_later() -> None:
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            _sampler.window = None
+            await _finish(session)
+
+    asyncio.get_running_loop().create_task(_stop_later())
+    return session
+
+
+class ProfilerMiddleware:
+    """Perfila los requests que traen `X-Profile` con el token configurado.
+
+    La respuesta indica el archivo en `X-Profile-File`.
+    """
+
+    def __init__(self, app: Any) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        value = None
+        for name, raw in scope.get("headers") or ():
+            if name == PROFILE_HEADER.encode():
+                value = raw.decode("latin-1")
+                break
+        if value is None or not authorized(value):
+            await self.app(scope, receive, send)
+            return
+
+        session = Session("request", asyncio.current_task())
+
+        async def _send(message: Dict[str, Any]) -> None:
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers") or [])
+                headers.append((b"x-profile-file", session.path.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        _sampler.start(session)
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            await _finish(session)
@@ -0,0 +1,282 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import socket
+from typing import Any, Dict, List, Optional, Tuple
+
+from clients import rabbitmq
+from clients.redis import close_client, get_client
+
+# Drena el outbox de Redis (`QUEUE_OUTBOX_REDIS_KEY`) que llena
+# clients.rabbitmq._save_to_outbox_redis cuando el broker no responde.
+# Entrega al menos una vez: cada evento pasa por la lista de procesamiento
+# del consumidor (`<key>:processing:<id>`) y solo se elimina de ella tras el
+# confirm del broker. Los eventos que no se pueden decodificar pasan a la
+# lista de dead letter (`<key>:dead`) con su payload crudo.
+OUTBOX_RELAY_BATCH_SIZE = int(os.getenv("QUEUE_OUTBOX_RELAY_BATCH_SIZE", "100"))
+OUTBOX_RELAY_INTERVAL = float(os.getenv("QUEUE_OUTBOX_RELAY_INTERVAL", "1.0"))
+OUTBOX_RELAY_MAX_BACKOFF = float(os.getenv("QUEUE_OUTBOX_RELAY_MAX_BACKOFF", "30"))
+# Un consumidor sin heartbeat durante este tiempo se considera muerto
+OUTBOX_RELAY_HEARTBEAT_TTL = int(os.getenv("QUEUE_OUTBOX_RELAY_HEARTBEAT_TTL", "60"))
+
+
+def _outbox_key() -> str:
+    return os.getenv("QUEUE_OUTBOX_REDIS_KEY", "outbox:rabbitmq:messages")
+
+
+def _consumer_id() -> str:
+    # En Kubernetes el hostname es el nombre del pod
+    return os.getenv("QUEUE_OUTBOX_CONSUMER_ID") or socket.gethostname()
+
+
+class RedisOutboxRelay:
+    """Republica eventos del outbox de Redis sobre el canal persistente.
+
+    - Toma lotes con LMOVE hacia su propia `<key>:processing:<consumer>`
+      (un pipeline por lote, que también renueva su heartbeat)
+    - Publica el lote en paralelo y borra de processing los confirmados
+    - Los fallidos vuelven a la cabeza de la lista y se reintenta con backoff
+    - Los malformados pasan a `<key>:dead` y se loguean con su payload
+    - Al arrancar recupera solo su processing; las de consumidores muertos
+      (sin heartbeat) las recupera `recover_orphans` desde el CLI
+    """
+
+    def __init__(
+        self,
+        key: Optional[str] = None,
+        batch_size: int = OUTBOX_RELAY_BATCH_SIZE,
+        interval: float = OUTBOX_RELAY_INTERVAL,
+        max_backoff: float = OUTBOX_RELAY_MAX_BACKOFF,
+        consumer: Optional[str] = None,
+        heartbeat_ttl: int = OUTBOX_RELAY_HEARTBEAT_TTL,
+    ) -> None:
+        self.key = key or _outbox_key()
+        self.consumer = consumer or _consumer_id()
+        self.processing_key = f"{self.key}:processing:{self.consumer}"
+        self.heartbeat_key = f"{self.key}:consumer:{self.consumer}"
+        self.dead_key = f"{self.key}:dead"
+        self.heartbeat_ttl = max(1, heartbeat_ttl)
+        self.batch_size = max(1, batch_size)
+        self.interval = interval
+        self.max_backoff = max_backoff
+        self._backoff = 0.0
+        self._task: Optional[asyncio.Task] = None
+        # métricas
+        self.backlog = 0
+        self.relayed = 0
+        self.failed = 0
+        self.dead_lettered = 0
+
+    async def _requeue(self, client: Any, processing_key: str) -> int:
+        moved = 0
+        while await client.lmove(processing_key, self.key, "RIGHT", "LEFT"):
+            moved += 1
+        return moved
+
+    async def recover(self) -> int:
+        """Devuelve a la cola los eventos que quedaron en el processing propio."""
+        client = get_client()
+        if client is None:
+            return 0
+        return await self._requeue(client, self.processing_key)
+
+    async def recover_orphans(self) -> int:
+        """Devuelve a la cola el processing de los consumidores sin heartbeat.
+
+        Incluye `<key>:processing` (sin sufijo) de versiones anteriores.
+        """
+        client = get_client()
+        if client is None:
+            return 0
+        prefix = f"{self.key}:processing"
+        moved = 0
+        async for raw_key in client.scan_iter(match=f"{prefix}*"):
+            key = raw_key.decode() if isinstance(raw_key, bytes) else raw_key
+            if key == self.processing_key:
+                continue
+            if key != prefix:
+                if not key.startswith(prefix + ":"):
+                    continue
+                consumer = key[len(prefix) + 1 :]
+                if await client.exists(f"{self.key}:consumer:{consumer}"):
+                    continue  # consumidor vivo: sus eventos siguen en vuelo
+            moved += await self._requeue(client, key)
+        return moved
+
+    async def _pop_batch(self, client: Any) -> List[str]:
+        pipe = client.pipeline(transaction=False)
+        pipe.set(self.heartbeat_key, "1", ex=self.heartbeat_ttl)
+        for _ in range(self.batch_size):
+            pipe.lmove(self.key, self.processing_key, "LEFT", "RIGHT")
+        return [raw for raw in (await pipe.execute())[1:] if raw is not None]
+
+    async def _publish(self, raw: str) -> None:
+        evt = json.loads(raw)
+        data = evt["data"]
+        body = rabbitmq._encode_event(evt["event_type"], data)
+        await rabbitmq.get_publisher().publish(data["tag"], body, evt["event_type"])
+
+    async def drain_once(self) -> int:
+        client = get_client()
+        if client is None:
+            return 0
+        batch = await self._pop_batch(client)
+        if batch:
+            results = await asyncio.gather(
+                *[self._publish(raw) for raw in batch], return_exceptions=True
+            )
+            pipe = client.pipeline(transaction=True)
+            failed: List[str] = []
+            dead: List[Tuple[str, BaseException]] = []
+            for raw, res in zip(batch, results):
+                pipe.lrem(self.processing_key, 1, raw)
+                if res is None:
+                    self.relayed += 1
+                elif isinstance(res, (ValueError, KeyError, TypeError)):
+                    # Evento malformado: reintentarlo no sirve, queda en dead
+                    # letter para inspeccionarlo o reinyectarlo a mano
+                    dead.append((raw, res))
+                else:
+                    failed.append(raw)
+            if failed:
+                # Vuelven a la cabeza conservando el orden original
+                pipe.lpush(self.key, *reversed(failed))
+                self.failed += len(failed)
+            if dead:
+                pipe.rpush(self.dead_key, *[raw for raw, _ in dead])
+                self.dead_lettered += len(dead)
+            await pipe.execute()
+            for raw, err in dead:
+                logging.getLogger("API_logs").error(
+                    f"Redis outbox relay dead-lettered key={self.dead_key} "
+                    f"err={err.__class__.__name__}:{err} payload={raw!r}"
+                )
+            if failed:
+                self._backoff = min(
+                    self.max_backoff, max(self.interval, self._backoff * 2)
+                )
+                logging.getLogger("API_logs").warning(
+                    f"Redis outbox relay publish failed count={len(failed)} retry_in={self._backoff:.1f}s"
+                )
+            else:
+                self._backoff = 0.0
+        self.backlog = int(await client.llen(self.key)) + int(
+            await client.llen(self.processing_key)
+        )
+        return len(batch) if self._backoff == 0.0 else 0
+
+    async def run(self) -> None:
+        await self.recover()
+        while True:
+            try:
+                n = await self.drain_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.getLogger("API_logs").warning(
+                    f"Redis outbox relay error err={e.__class__.__name__}:{e}"
+                )
+                n = 0
+            if n >= self.batch_size:
+                continue
+            await asyncio.sleep(self._backoff or self.interval)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
+        client = get_client()
+        if client is not None:
+            try:
+                # Apagado limpio: lo que quedó en processing vuelve a la cola
+                await self._requeue(client, self.processing_key)
+                await client.delete(self.heartbeat_key)
+            except Exception:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backlog": self.backlog,
+            "relayed": self.relayed,
+            "failed": self.failed,
+            "dead_lettered": self.dead_lettered,
+            "backoff_s": self._backoff,
+        }
+
+
+_relay: Optional[RedisOutboxRelay] = None
+
+
+def get_relay() -> RedisOutboxRelay:
+    global _relay
+    if _relay is None:
+        _relay = RedisOutboxRelay()
+    return _relay
+
+
+async def start_relay() -> None:
+    if rabbitmq._outbox_enabled() and get_client() is not None:
+        get_relay().start()
+
+
+async def stop_relay() -> None:
+    global _relay
+    if _relay is not None:
+        await _relay.stop()
+        _relay = None
+
+
+def relay_stats() -> Dict[str, Any]:
+    return _relay.stats() if _relay is not None else {}
+
+
+async def _main(args: argparse.Namespace) -> None:
+    if get_client() is None:
+        raise SystemExit("Redis is not configured (set REDIS_URL or REDIS_HOST)")
+    relay = RedisOutboxRelay(batch_size=args.batch_size, interval=args.interval)
+    try:
+        if args.recover_orphans:
+            print(json.dumps({"recovered_orphans": await relay.recover_orphans()}))
+        if args.once:
+            recovered = await relay.recover()
+            while await relay.drain_once() > 0:
+                pass
+            print(json.dumps({"recovered": recovered, **relay.stats()}))
+        else:
+            await relay.run()
+    finally:
+        await rabbitmq.close_publisher()
+        await close_client()
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description="Drain the Redis RabbitMQ outbox")
+    p.add_argument("--batch-size", type=int, default=OUTBOX_RELAY_BATCH_SIZE)
+    p.add_argument("--interval", type=float, default=OUTBOX_RELAY_INTERVAL)
+    p.add_argument(
+        "--once", action="store_true", help="drain until empty (or failure) and exit"
+    )
+    p.add_argument(
+        "--recover-orphans",
+        action="store_true",
+        help="requeue the processing lists of consumers without a heartbeat",
+    )
+    args = p.parse_args()
+    try:
+        asyncio.run(_main(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import contextvars
+import random
+from typing import Optional
+
+# Datos por request que el access log (y las métricas) leen al terminar.
+# Se propagan por contextvars, así que llegan también a las tareas que el
+# request crea (p. ej. el flush del group commit).
+
+
+class RequestStats:
+    __slots__ = ("cache", "db_seconds", "db_queries", "pool_wait_seconds", "sampled")
+
+    def __init__(self, sampled: bool = True) -> None:
+        self.cache: Optional[str] = None  # "body" | "hit" | "miss"
+        self.db_seconds = 0.0
+        self.db_queries = 0
+        self.pool_wait_seconds = 0.0
+        # Si el request se registra aunque termine bien (muestreo)
+        self.sampled = sampled
+
+
+_current: "contextvars.ContextVar[Optional[RequestStats]]" = contextvars.ContextVar(
+    "request_stats", default=None
+)
+
+
+def begin(sample_rate: float = 1.0) -> "contextvars.Token[Optional[RequestStats]]":
+    sampled = sample_rate >= 1.0 or random.random() < sample_rate
+    return _current.set(RequestStats(sampled))
+
+
+def end(token: "contextvars.Token[Optional[RequestStats]]") -> Optional[RequestStats]:
+    stats = _current.get()
+    _current.reset(token)
+    return stats
+
+
+def current() -> Optional[RequestStats]:
+    return _current.get()
+
+
+def note_cache(result: str) -> None:
+    stats = _current.get()
+    if stats is not None:
+        stats.cache = result
+
+
+def observe_query(sql: str, seconds: float) -> None:
+    # Observador de db.connection: acumula el tiempo de DB del request
+    stats = _current.get()
+    if stats is not None:
+        stats.db_seconds += seconds
+        stats.db_queries += 1
+
+
+def observe_pool_wait(seconds: float) -> None:
+    stats = _current.get()
+    if stats is not None:
+        stats.pool_wait_seconds += seconds
+
+
+def sampled() -> bool:
+    stats = _current.get()
+    return stats is None or stats.sampled
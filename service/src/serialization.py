@@ -0,0 +1,68 @@
+import datetime
+import json
+import uuid
+from typing import Any, Mapping, Optional, Sequence
+
+from starlette.responses import JSONResponse
+
+try:
+    import orjson  # type: ignore
+except Exception:  # pragma: no cover - opcional
+    orjson = None  # type: ignore
+
+
+# Campos públicos de un mensaje (los de API.MessageOut, sin deleted_at)
+MESSAGE_FIELDS = (
+    "id",
+    "thread_id",
+    "user_id",
+    "type",
+    "content",
+    "paths",
+    "created_at",
+    "updated_at",
+)
+
+
+def _default(obj: Any) -> Any:
+    # orjson solo lo llama para lo que no codifica: el UUID de asyncpg
+    # (asyncpg.pgproto.pgproto.UUID, subclase de uuid.UUID) no es nativo
+    if isinstance(obj, (datetime.datetime, datetime.date)):
+        return obj.isoformat()
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    if hasattr(obj, "value"):
+        return obj.value
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(obj: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default)
+    return json.dumps(obj, separators=(",", ":"), default=_default).encode("utf-8")
+
+
+def encode_messages_page(
+    rows: Sequence[Mapping[str, Any]], next_cursor: Optional[str], has_more: bool
+) -> bytes:
+    """Filas (asyncpg.Record o dict) -> cuerpo JSON de MessagesPageOut.
+
+    Un solo recorrido: proyecta los campos públicos y codifica, sin pasar
+    por modelos de Pydantic ni por jsonable_encoder.
+    """
+    return dumps(
+        {
+            "items": [{f: r.get(f) for f in MESSAGE_FIELDS} for r in rows],
+            "next_cursor": next_cursor,
+            "has_more": has_more,
+        }
+    )
+
+
+class ORJSONBytesResponse(JSONResponse):
+    """Respuesta JSON que acepta bytes ya codificados o un objeto a codificar."""
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return dumps(content)
@@ -0,0 +1,203 @@
+import asyncio
+import collections
+import contextvars
+import datetime
+import hashlib
+import hmac
+import logging
+import os
+import re
+import time
+from typing import Any, Deque, Dict, Optional, Set, Tuple
+
+import metrics
+import request_context
+from db import connection as db_connection
+
+# Log de queries lentas: todo statement del pool que supere SLOW_QUERY_MS
+# queda en un buffer circular (y en el log JSON) con nombre de sqlc, hash de
+# la forma de los parámetros, duración y espera del pool del request. La
+# primera vez que un (query, forma) cruza el umbral se puede capturar su
+# plan en una conexión aparte: EXPLAIN (ANALYZE, BUFFERS) para los SELECT y
+# EXPLAIN sin ANALYZE para INSERT/UPDATE/DELETE, que nunca se reejecutan.
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))  # 0 desactiva
+SLOW_QUERY_EXPLAIN = os.getenv("SLOW_QUERY_EXPLAIN", "false").lower() in {
+    "1",
+    "true",
+    "yes",
+}
+SLOW_QUERY_BUFFER = int(os.getenv("SLOW_QUERY_BUFFER", "100"))
+SLOW_QUERY_PLANS = int(os.getenv("SLOW_QUERY_PLANS", "20"))
+# /debug/slow-queries lo exige en X-Debug-Token; sin token el endpoint
+# rechaza todo (los planes pueden incluir ids literales de los parámetros)
+SLOW_QUERY_TOKEN = os.getenv("SLOW_QUERY_TOKEN", "")
+# Tope del EXPLAIN ANALYZE, que vuelve a ejecutar el SELECT
+SLOW_QUERY_EXPLAIN_TIMEOUT_MS = int(os.getenv("SLOW_QUERY_EXPLAIN_TIMEOUT_MS", "10000"))
+
+_MAX_EXPLAINED = 1024
+
+# Comentarios iniciales (la línea "-- name: ..." de sqlc) y primera palabra
+_LEADING_COMMENTS = re.compile(r"^(?:\s*--[^\n]*\n|\s*/\*.*?\*/)*\s*", re.S)
+# DML dentro de un CTE: `WITH x AS (DELETE ...) SELECT ...` también escribe
+_DML = re.compile(
+    r"\b(?:INSERT\s+INTO|DELETE\s+FROM|MERGE\s+INTO"
+    r"|UPDATE\s+\S+\s+(?:AS\s+\S+\s+)?SET)\b",
+    re.I,
+)
+
+_records: Deque[Dict[str, Any]] = collections.deque(maxlen=max(1, SLOW_QUERY_BUFFER))
+_plans: Deque[Dict[str, Any]] = collections.deque(maxlen=max(1, SLOW_QUERY_PLANS))
+_explained: Set[Tuple[str, str]] = set()
+_explain_task: Optional["asyncio.Task[None]"] = None
+_stats = {"slow_queries": 0, "plans": 0, "explain_errors": 0}
+
+SLOW_QUERIES = metrics.counter(
+    "db_slow_queries_total", "Statements slower than SLOW_QUERY_MS", ("query",)
+)
+
+
+def enabled() -> bool:
+    return SLOW_QUERY_MS > 0
+
+
+def authorized(token: Optional[str]) -> bool:
+    if not SLOW_QUERY_TOKEN or token is None:
+        return False
+    return hmac.compare_digest(token.encode(), SLOW_QUERY_TOKEN.encode())
+
+
+def _type_name(value: Any) -> str:
+    if isinstance(value, (list, tuple)):
+        inner = _type_name(value[0]) if value else ""
+        return f"{type(value).__name__}[{inner}]"
+    return type(value).__name__
+
+
+def param_shape(args: Tuple[Any, ...]) -> str:
+    """Hash corto de los tipos de los parámetros (nunca de sus valores)."""
+    shape = ",".join(_type_name(a) for a in args)
+    return hashlib.blake2b(shape.encode("utf-8"), digest_size=6).hexdigest()
+
+
+def observe(sql: str, args: Tuple[Any, ...], seconds: float) -> None:
+    """Observador de db.connection para statements por encima del umbral."""
+    if sql.lstrip().upper().startswith("EXPLAIN"):
+        return
+    name = db_connection.query_name(sql)
+    shape = param_shape(args)
+    stats = request_context.current()
+    record = {
+        "ts": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "query": name,
+        "param_shape": shape,
+        "duration_ms": round(seconds * 1000, 3),
+        "pool_wait_ms": (
+            round(stats.pool_wait_seconds * 1000, 3) if stats is not None else None
+        ),
+    }
+    _records.append(record)
+    _stats["slow_queries"] += 1
+    SLOW_QUERIES.inc(name)
+    logging.getLogger("API_logs").warning(
+        "slow_query", extra={"fields": {"event": "slow_query", **record}}
+    )
+    if SLOW_QUERY_EXPLAIN:
+        _maybe_explain(sql, args, name, shape)
+
+
+def read_only(sql: str) -> bool:
+    """True si el statement es un SELECT que EXPLAIN ANALYZE puede reejecutar."""
+    body = _LEADING_COMMENTS.sub("", sql, count=1)
+    keyword = body.split(None, 1)[0].upper() if body.strip() else ""
+    if keyword == "SELECT":
+        return True
+    return keyword == "WITH" and _DML.search(body) is None
+
+
+def _maybe_explain(sql: str, args: Tuple[Any, ...], name: str, shape: str) -> None:
+    global _explain_task
+    key = (name, shape)
+    # Un EXPLAIN a la vez: si hay uno en curso se reintenta en la próxima
+    if key in _explained or (_explain_task is not None and not _explain_task.done()):
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    if len(_explained) >= _MAX_EXPLAINED:
+        _explained.clear()
+    _explained.add(key)
+    # Contexto vacío: el EXPLAIN no suma al tiempo de DB del request
+    _explain_task = loop.create_task(
+        _explain(sql, args, name, shape), context=contextvars.Context()
+    )
+
+
+async def _explain(sql: str, args: Tuple[Any, ...], name: str, shape: str) -> None:
+    started = time.perf_counter()
+    # ANALYZE ejecuta el statement: solo para SELECT. Un INSERT/UPDATE/DELETE
+    # se explica sin ejecutarlo (plan estimado), así no dispara triggers,
+    # secuencias ni locks de fila aunque la transacción se revierta
+    analyze = read_only(sql)
+    prefix = "EXPLAIN (ANALYZE, BUFFERS) " if analyze else "EXPLAIN "
+    try:
+        # Conexión aparte: no compite con los requests por el pool
+        conn = await db_connection.connect_side(
+            server_settings={"statement_timeout": str(SLOW_QUERY_EXPLAIN_TIMEOUT_MS)}
+        )
+        try:
+            # Igual dentro de una transacción que se revierte, por si un
+            # SELECT llama a funciones con efectos
+            tr = conn.transaction()
+            await tr.start()
+            try:
+                rows = await conn.fetch(prefix + sql, *args)
+            finally:
+                await tr.rollback()
+        finally:
+            await conn.close()
+    except Exception as e:
+        _stats["explain_errors"] += 1
+        logging.getLogger("API_logs").warning(
+            f"EXPLAIN failed query={name} err={e.__class__.__name__}:{e}"
+        )
+        return
+    _plans.append(
+        {
+            "ts": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "query": name,
+            "param_shape": shape,
+            "analyze": analyze,
+            "explain_ms": round((time.perf_counter() - started) * 1000, 3),
+            "plan": "\n".join(r[0] for r in rows),
+        }
+    )
+    _stats["plans"] += 1
+
+
+def install() -> None:
+    if enabled():
+        db_connection.add_slow_query_observer(observe, SLOW_QUERY_MS / 1000)
+
+
+async def stop() -> None:
+    task = _explain_task
+    if task is not None and not task.done():
+        task.cancel()
+        try:
+            await task
+        except (asyncio.CancelledError, Exception):
+            pass
+
+
+def snapshot() -> Dict[str, Any]:
+    return {
+        "threshold_ms": SLOW_QUERY_MS,
+        "explain": SLOW_QUERY_EXPLAIN,
+        "records": list(reversed(_records)),
+        "plans": list(reversed(_plans)),
+    }
+
+
+def slow_query_stats() -> Dict[str, int]:
+    return dict(_stats)
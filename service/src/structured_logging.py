@@ -0,0 +1,147 @@
+import datetime
+import logging
+import logging.handlers
+import os
+import queue
+import time
+from typing import Any, Dict, Optional
+
+import metrics
+import request_context
+from serialization import dumps
+
+# Los requests exitosos se registran con esta probabilidad (1.0 = todos).
+# Errores (>= 400) y requests lentos se registran siempre.
+LOG_SUCCESS_SAMPLE_RATE = float(os.getenv("LOG_SUCCESS_SAMPLE_RATE", "1.0"))
+LOG_SLOW_REQUEST_MS = float(os.getenv("LOG_SLOW_REQUEST_MS", "500"))
+# Cola acotada hacia el hilo escritor: si se llena se descarta, nunca se bloquea
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Una línea JSON por registro; los campos de `extra={"fields": ...}` van arriba."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload: Dict[str, Any] = {
+            "ts": datetime.datetime.fromtimestamp(
+                record.created, datetime.timezone.utc
+            ).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "msg": record.getMessage(),
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            payload.update(fields)
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        return dumps(payload).decode("utf-8")
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler que descarta (y cuenta) cuando la cola está llena."""
+
+    def __init__(self, q: "queue.Queue[Any]") -> None:
+        super().__init__(q)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup_logger(name: str, path: str) -> logging.Logger:
+    """Logger cuyo I/O a disco ocurre en un hilo aparte (QueueListener).
+
+    Idempotente: reconfigurar detiene el listener anterior.
+    """
+    global _listener
+    stop_listener()
+    logger = logging.getLogger(name)
+    logger.setLevel(logging.INFO)
+    for h in list(logger.handlers):
+        logger.removeHandler(h)
+    # Resuelto al llamar (no al importar) para poder reemplazarlo en tests
+    file_handler = logging.handlers.RotatingFileHandler(
+        path, maxBytes=5_000_000, backupCount=3
+    )
+    file_handler.setFormatter(JsonFormatter())
+    q: "queue.Queue[Any]" = queue.Queue(max(1, LOG_QUEUE_SIZE))
+    logger.addHandler(DroppingQueueHandler(q))
+    logger.propagate = False
+    _listener = logging.handlers.QueueListener(q, file_handler)
+    _listener.start()
+    return logger
+
+
+def stop_listener() -> None:
+    """Vacía la cola al disco y detiene el hilo escritor."""
+    global _listener
+    listener, _listener = _listener, None
+    if listener is not None:
+        listener.stop()
+
+
+def dropped(logger: logging.Logger) -> int:
+    return sum(getattr(h, "dropped", 0) for h in logger.handlers)
+
+
+class AccessLogMiddleware:
+    """Middleware ASGI: una línea JSON por request con ruta, status y tiempos.
+
+    También alimenta el histograma de latencia HTTP (un solo cronómetro).
+    """
+
+    def __init__(self, app: Any, logger_name: str) -> None:
+        self.app = app
+        self.logger = logging.getLogger(logger_name)
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        token = request_context.begin(LOG_SUCCESS_SAMPLE_RATE)
+        status = 500
+
+        async def _send(message: Dict[str, Any]) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            stats = request_context.end(token)
+            elapsed = time.perf_counter() - started
+            elapsed_ms = elapsed * 1000
+            route = scope.get("route")
+            template = getattr(route, "path_format", None)
+            # Rutas sin match agrupadas: el path crudo dispararía la cardinalidad
+            metrics.HTTP_LATENCY.observe(
+                elapsed, scope.get("method") or "", template or "unmatched", str(status)
+            )
+            if (
+                status >= 400
+                or elapsed_ms >= LOG_SLOW_REQUEST_MS
+                or (stats is not None and stats.sampled)
+            ):
+                fields = {
+                    "event": "access",
+                    "method": scope.get("method"),
+                    "route": template or scope.get("path"),
+                    "status": status,
+                    "latency_ms": round(elapsed_ms, 3),
+                    "cache": stats.cache if stats else None,
+                    "db_ms": round(stats.db_seconds * 1000, 3) if stats else 0.0,
+                    "db_queries": stats.db_queries if stats else 0,
+                    "pool_wait_ms": (
+                        round(stats.pool_wait_seconds * 1000, 3) if stats else 0.0
+                    ),
+                }
+                level = logging.WARNING if status >= 500 else logging.INFO
+                self.logger.log(level, "access", extra={"fields": fields})
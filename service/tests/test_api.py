@@ -1,5 +1,7 @@
+import asyncio
 import datetime
 import importlib
+import json
 import logging
 import logging.handlers as lh
 import os
@@ -120,17 +122,22 @@ def test_create_message_invalid_user_header_returns_400(api_module, monkeypatch)
     assert not called["value"]
 
 
-def test_create_message_invalidates_cache(api_module, monkeypatch):
+def test_create_message_writes_through_cache(api_module, monkeypatch):
 
     async def _create(thread, user, content, typeM, path):
         return _fake_message_row(thread, user), None
 
     captured = {}
 
-    async def _invalidate(thread_id):
+    async def _apply(thread_id, row):
         captured["thread"] = thread_id
+        captured["row"] = row
+
+    async def _invalidate(thread_id):
+        raise AssertionError("create should patch the cache, not invalidate it")
 
     monkeypatch.setattr(api_module.Controller, "CreateMessage", _create)
+    monkeypatch.setattr(api_module.cache_recent, "apply_created", _apply)
     monkeypatch.setattr(api_module.cache_recent, "invalidate_thread", _invalidate)
 
     client = TestClient(api_module.app)
@@ -143,6 +150,7 @@ def test_create_message_invalidates_cache(api_module, monkeypatch):
     )
     assert r.status_code == 201
     assert captured["thread"] == str(t)
+    assert captured["row"]["content"] == "hola"
 
 
 def test_update_message_success(api_module, monkeypatch):
@@ -170,7 +178,7 @@ def test_update_message_success(api_module, monkeypatch):
     assert body["content"] == "nuevo"
 
 
-def test_update_message_invalidates_cache(api_module, monkeypatch):
+def test_update_message_writes_through_cache(api_module, monkeypatch):
 
     async def _update(thread, message, user, content, typeM, path):
         return (
@@ -180,11 +188,12 @@ def test_update_message_invalidates_cache(api_module, monkeypatch):
 
     captured = {}
 
-    async def _invalidate(thread_id):
+    async def _apply(thread_id, row):
         captured["thread"] = thread_id
+        captured["row"] = row
 
     monkeypatch.setattr(api_module.Controller, "UpdateMessage", _update)
-    monkeypatch.setattr(api_module.cache_recent, "invalidate_thread", _invalidate)
+    monkeypatch.setattr(api_module.cache_recent, "apply_updated", _apply)
 
     client = TestClient(api_module.app)
     t = uuid.uuid4()
@@ -197,6 +206,7 @@ def test_update_message_invalidates_cache(api_module, monkeypatch):
     )
     assert r.status_code == 200
     assert captured["thread"] == str(t)
+    assert captured["row"]["content"] == "nuevo"
 
 
 def test_update_message_not_found_maps_404(api_module, monkeypatch):
@@ -234,18 +244,19 @@ def test_delete_message_success_204(api_module, monkeypatch):
     assert r.text == ""
 
 
-def test_delete_message_invalidates_cache(api_module, monkeypatch):
+def test_delete_message_writes_through_cache(api_module, monkeypatch):
 
     async def _delete(thread, message, user):
         return {"ok": True}, None
 
     captured = {}
 
-    async def _invalidate(thread_id):
+    async def _apply(thread_id, message_id):
         captured["thread"] = thread_id
+        captured["message"] = message_id
 
     monkeypatch.setattr(api_module.Controller, "DeleteMessage", _delete)
-    monkeypatch.setattr(api_module.cache_recent, "invalidate_thread", _invalidate)
+    monkeypatch.setattr(api_module.cache_recent, "apply_deleted", _apply)
 
     client = TestClient(api_module.app)
     t = uuid.uuid4()
@@ -254,6 +265,7 @@ def test_delete_message_invalidates_cache(api_module, monkeypatch):
     r = client.delete(f"/threads/{t}/messages/{m}", headers={"X-User-Id": str(u)})
     assert r.status_code == 204
     assert captured["thread"] == str(t)
+    assert captured["message"] == str(m)
 
 
 def test_delete_message_not_found_maps_404(api_module, monkeypatch):
@@ -338,9 +350,10 @@ def test_list_messages_cache_hit_shortcircuits_controller(api_module, monkeypatc
     thread_id = uuid.uuid4()
     cached = [_fake_message_row(uuid.uuid4(), uuid.uuid4())]
 
-    async def _get_recent(thread, limit):
+    async def _get_recent(thread, limit, before=None):
         assert thread == str(thread_id)
         assert limit == 5
+        assert before is None
         return cached
 
     async def _set_recent(*args, **kwargs):
@@ -366,16 +379,18 @@ def test_list_messages_sets_cache_after_db_fetch(api_module, monkeypatch):
     out = [_fake_message_row(uuid.uuid4(), uuid.uuid4())]
     set_args = {}
 
-    async def _get_recent(thread, limit):
+    async def _get_recent(thread, limit, before=None):
         return None
 
-    async def _set_recent(thread, items):
+    async def _set_recent(thread, items, complete=False):
         set_args["thread"] = thread
         set_args["items"] = items
+        set_args["complete"] = complete
 
     async def _list(thread, typeM, filtro):
         assert typeM == 1
-        assert filtro == "25"
+        # La ventana se rellena entera, no solo el limit pedido
+        assert filtro == str(api_module.cache_recent.CACHE_MAX_ITEMS)
         return out, None
 
     monkeypatch.setattr(api_module.cache_recent, "get_recent_messages", _get_recent)
@@ -388,3 +403,331 @@ def test_list_messages_sets_cache_after_db_fetch(api_module, monkeypatch):
     assert r.status_code == 200
     assert set_args["thread"] == str(t)
     assert set_args["items"][0]["id"] == out[0]["id"]
+    # 1 fila con CACHE_MAX_ITEMS pedidas: la ventana cubre el hilo entero
+    assert set_args["complete"] is True
+
+
+def test_fill_loads_the_whole_window_once_for_every_limit(api_module, monkeypatch):
+    window = 30
+    monkeypatch.setattr(api_module.cache_recent, "CACHE_MAX_ITEMS", window)
+    thread, user = uuid.uuid4(), uuid.uuid4()
+    rows = [_fake_message_row(thread, user) for _ in range(window)]
+    calls = {"list": 0}
+    filled = {}
+
+    async def _get_recent(thread_id, limit, before=None):
+        return None
+
+    async def _set_recent(thread_id, items, complete=False):
+        filled.update(items=list(items), complete=complete)
+
+    async def _list(thread_id, typeM, filtro):
+        calls["list"] += 1
+        assert filtro == str(window)
+        await asyncio.sleep(0.01)
+        return rows, None
+
+    monkeypatch.setattr(api_module.cache_recent, "get_recent_messages", _get_recent)
+    monkeypatch.setattr(api_module.cache_recent, "set_recent_messages", _set_recent)
+    monkeypatch.setattr(api_module.Controller, "ListMessages", _list)
+
+    async def _run():
+        return await asyncio.gather(
+            *[
+                api_module.list_messages(
+                    thread, limit=limit, cursor=None, if_none_match=None
+                )
+                for limit in (5, 10, 5, 20)
+            ]
+        )
+
+    pages = [json.loads(p.body) for p in asyncio.run(_run())]
+    # Un solo load por hilo, aunque los limits difieran
+    assert calls["list"] == 1
+    assert [len(p["items"]) for p in pages] == [5, 10, 5, 20]
+    assert all(p["has_more"] for p in pages)
+    assert pages[1]["items"][-1]["id"] == str(rows[9]["id"])
+    # La ventana de Redis guarda todas las filas cargadas
+    assert len(filled["items"]) == window
+    assert filled["complete"] is False
+
+
+def test_concurrent_list_misses_share_one_db_load(api_module, monkeypatch):
+
+    out = [_fake_message_row(uuid.uuid4(), uuid.uuid4())]
+    calls = {"list": 0, "set": 0}
+
+    async def _get_recent(thread, limit, before=None):
+        return None
+
+    async def _set_recent(thread, items, complete=False):
+        calls["set"] += 1
+
+    async def _list(thread, typeM, filtro):
+        calls["list"] += 1
+        await asyncio.sleep(0.01)
+        return out, None
+
+    monkeypatch.setattr(api_module.cache_recent, "get_recent_messages", _get_recent)
+    monkeypatch.setattr(api_module.cache_recent, "set_recent_messages", _set_recent)
+    monkeypatch.setattr(api_module.Controller, "ListMessages", _list)
+
+    t = uuid.uuid4()
+
+    async def _run():
+        return await asyncio.gather(
+            *[
+                api_module.list_messages(t, limit=20, cursor=None, if_none_match=None)
+                for _ in range(10)
+            ]
+        )
+
+    pages = asyncio.run(_run())
+    assert calls == {"list": 1, "set": 1}
+    assert all(json.loads(p.body)["items"][0]["id"] == str(out[0]["id"]) for p in pages)
+    assert api_module._flights.stats()["coalesced"] == 9
+
+
+def test_list_messages_serves_cached_body_with_etag(api_module, monkeypatch):
+
+    from local_cache import LocalCache
+
+    out = [_fake_message_row(uuid.uuid4(), uuid.uuid4())]
+    calls = {"list": 0}
+
+    async def _get_recent(thread, limit, before=None):
+        return None
+
+    async def _set_recent(thread, items, complete=False):
+        return None
+
+    async def _list(thread, typeM, filtro):
+        calls["list"] += 1
+        return out, None
+
+    monkeypatch.setattr(api_module.cache_recent, "cache_enabled", lambda: True)
+    monkeypatch.setattr(api_module.cache_recent, "_l1", LocalCache(10, 60))
+    monkeypatch.setattr(api_module.cache_recent, "get_recent_messages", _get_recent)
+    monkeypatch.setattr(api_module.cache_recent, "set_recent_messages", _set_recent)
+    monkeypatch.setattr(api_module.Controller, "ListMessages", _list)
+
+    client = TestClient(api_module.app)
+    t = uuid.uuid4()
+    first = client.get(f"/threads/{t}/messages?limit=10")
+    second = client.get(f"/threads/{t}/messages?limit=10")
+    assert calls["list"] == 1
+    assert second.content == first.content
+    assert second.headers["etag"] == first.headers["etag"]
+    assert second.headers["content-type"] == "application/json"
+
+    r = client.get(
+        f"/threads/{t}/messages?limit=10",
+        headers={"If-None-Match": first.headers["etag"]},
+    )
+    assert r.status_code == 304
+    assert r.content == b""
+
+
+def test_cached_body_survives_fill_and_writes_to_other_threads(api_module, monkeypatch):
+    from local_cache import LocalCache
+
+    out = [_fake_message_row(uuid.uuid4(), uuid.uuid4())]
+    l1 = LocalCache(10, 60)
+    calls = {"list": 0}
+
+    async def _get_recent(thread, limit, before=None):
+        return None
+
+    async def _set_recent(thread, items, complete=False):
+        # Como el real: el relleno invalida el hilo en el L1
+        l1.evict(thread)
+        return l1.generation(thread)
+
+    async def _list(thread, typeM, filtro):
+        calls["list"] += 1
+        # Escritura en otro hilo mientras se carga la página
+        l1.evict(str(uuid.uuid4()))
+        return out, None
+
+    monkeypatch.setattr(api_module.cache_recent, "cache_enabled", lambda: True)
+    monkeypatch.setattr(api_module.cache_recent, "_l1", l1)
+    monkeypatch.setattr(api_module.cache_recent, "get_recent_messages", _get_recent)
+    monkeypatch.setattr(api_module.cache_recent, "set_recent_messages", _set_recent)
+    monkeypatch.setattr(api_module.Controller, "ListMessages", _list)
+
+    client = TestClient(api_module.app)
+    t = uuid.uuid4()
+    first = client.get(f"/threads/{t}/messages?limit=10")
+    second = client.get(f"/threads/{t}/messages?limit=10")
+    assert calls["list"] == 1
+    assert second.content == first.content
+
+    # Una escritura en el mismo hilo sí descarta el cuerpo
+    l1.evict(str(t))
+    client.get(f"/threads/{t}/messages?limit=10")
+    assert calls["list"] == 2
+
+
+def test_page_encoder_matches_pydantic_schema(api_module):
+
+    from serialization import encode_messages_page
+
+    rows = [_fake_message_row(uuid.uuid4(), uuid.uuid4()) for _ in range(3)]
+    rows[0]["type"] = "text"
+    rows[0]["created_at"] = datetime.datetime(2025, 1, 1, 12, 0, 0, 123456)
+    page = api_module.MessagesPageOut(
+        items=[api_module.to_message_out(r) for r in rows],
+        next_cursor="c",
+        has_more=True,
+    )
+    assert json.loads(encode_messages_page(rows, "c", True)) == json.loads(
+        page.model_dump_json()
+    )
+
+
+def test_page_encoder_accepts_asyncpg_uuids(api_module):
+    from asyncpg.pgproto import pgproto
+
+    from serialization import encode_messages_page
+
+    # Los Records de asyncpg traen pgproto.UUID, que orjson no codifica solo
+    thread, user = uuid.uuid4(), uuid.uuid4()
+    row = _fake_message_row(thread, user)
+    row.update(
+        id=pgproto.UUID(str(row["id"])),
+        thread_id=pgproto.UUID(str(thread)),
+        user_id=pgproto.UUID(str(user)),
+    )
+    item = json.loads(encode_messages_page([row], None, False))["items"][0]
+    assert item["id"] == str(row["id"])
+    assert item["thread_id"] == str(thread)
+    assert item["user_id"] == str(user)
+
+
+def test_create_messages_batch_invalidates_cache_once(api_module, monkeypatch):
+
+    async def _batch(thread, user, items):
+        return [
+            _fake_message_row(thread, user) | {"content": content}
+            for content, _, _ in items
+        ], None
+
+    calls = []
+
+    async def _invalidate(thread_id):
+        calls.append(thread_id)
+
+    monkeypatch.setattr(api_module.Controller, "CreateMessagesBatch", _batch)
+    monkeypatch.setattr(api_module.cache_recent, "invalidate_thread", _invalidate)
+
+    client = TestClient(api_module.app)
+    t = uuid.uuid4()
+    u = uuid.uuid4()
+    r = client.post(
+        f"/threads/{t}/messages:batch",
+        headers={"X-User-Id": str(u)},
+        json=[{"content": "a"}, {"content": "b", "type": "text"}, {"content": "c"}],
+    )
+    assert r.status_code == 201
+    assert [m["content"] for m in r.json()] == ["a", "b", "c"]
+    assert calls == [str(t)]
+
+
+def test_create_messages_batch_empty_returns_400(api_module, monkeypatch):
+
+    async def _batch(*args, **kwargs):
+        raise AssertionError("Controller should not run on empty batch")
+
+    monkeypatch.setattr(api_module.Controller, "CreateMessagesBatch", _batch)
+
+    client = TestClient(api_module.app)
+    r = client.post(
+        f"/threads/{uuid.uuid4()}/messages:batch",
+        headers={"X-User-Id": str(uuid.uuid4())},
+        json=[],
+    )
+    assert r.status_code == 400
+
+
+def test_lifespan_warms_up_and_drains_on_shutdown(api_module, monkeypatch):
+
+    calls = []
+
+    def _rec(name):
+        async def _fn(*args, **kwargs):
+            calls.append(name)
+            return True
+
+        return _fn
+
+    monkeypatch.setattr(api_module.db_connection, "warm_up_pool", _rec("pool"))
+    monkeypatch.setattr(api_module.db_connection, "close_pool", _rec("close_pool"))
+    monkeypatch.setattr(api_module.redis_client, "ping", _rec("redis"))
+    monkeypatch.setattr(api_module.redis_client, "close_client", _rec("close_redis"))
+    monkeypatch.setattr(api_module.rabbitmq, "start_publisher", _rec("broker"))
+    monkeypatch.setattr(api_module.rabbitmq, "close_publisher", _rec("close_broker"))
+    monkeypatch.setattr(api_module.partition_watch, "start_watch", _rec("partitions"))
+
+    with TestClient(api_module.app) as client:
+        assert calls == ["pool", "redis", "broker", "partitions"]
+        assert client.get("/readyz").status_code == 200
+    assert calls[-3:] == ["close_broker", "close_redis", "close_pool"]
+    assert api_module.STATE["ready"] is False
+
+
+def test_readyz_unavailable_until_pool_is_up(api_module, monkeypatch):
+
+    async def _fail():
+        raise ConnectionError("db down")
+
+    monkeypatch.setattr(api_module.db_connection, "warm_up_pool", _fail)
+
+    client = TestClient(api_module.app)
+    r = client.get("/readyz")
+    assert r.status_code == 503
+
+
+def test_metrics_endpoint_exports_route_latency_and_pool(api_module, monkeypatch):
+
+    async def _list(thread, typeM, filtro):
+        return [], None
+
+    monkeypatch.setattr(api_module.Controller, "ListMessages", _list)
+
+    client = TestClient(api_module.app)
+    client.get(f"/threads/{uuid.uuid4()}/messages?limit=5")
+    r = client.get("/metrics")
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/plain")
+    assert (
+        'http_request_duration_seconds_count{method="GET",'
+        'route="/threads/{thread_id}/messages",status="200"}'
+    ) in r.text
+    assert "db_pool_in_use 0" in r.text
+    assert "# TYPE cache_l1_hits_total counter" in r.text
+
+
+def test_debug_endpoints_deny_without_a_configured_token(api_module, monkeypatch):
+    import profiler
+    import slow_queries
+
+    monkeypatch.setattr(slow_queries, "SLOW_QUERY_MS", 200.0)
+    monkeypatch.setattr(profiler, "PROFILER_ENABLED", True)
+    client = TestClient(api_module.app)
+
+    # Sin token configurado nadie entra, traiga el header que traiga
+    monkeypatch.setattr(slow_queries, "SLOW_QUERY_TOKEN", "")
+    monkeypatch.setattr(profiler, "PROFILER_TOKEN", "")
+    assert client.get("/debug/slow-queries").status_code == 403
+    r = client.get("/debug/slow-queries", headers={"X-Debug-Token": ""})
+    assert r.status_code == 403
+    assert client.get("/debug/profile").status_code == 403
+
+    monkeypatch.setattr(slow_queries, "SLOW_QUERY_TOKEN", "s3cret")
+    monkeypatch.setattr(profiler, "PROFILER_TOKEN", "p-token")
+    r = client.get("/debug/slow-queries", headers={"X-Debug-Token": "nope"})
+    assert r.status_code == 403
+    r = client.get("/debug/slow-queries", headers={"X-Debug-Token": "s3cret"})
+    assert r.status_code == 200
+    r = client.get("/debug/profile", headers={"X-Profile-Token": "p-token"})
+    assert r.status_code == 200
@@ -0,0 +1,218 @@
+import asyncio
+import datetime
+import sys
+import uuid
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+SRC = ROOT / "src"
+for p in (ROOT, SRC):
+    if str(p) not in sys.path:
+        sys.path.insert(0, str(p))
+
+import cache  # noqa: E402
+from local_cache import LocalCache  # noqa: E402
+
+BASE = datetime.datetime(2025, 1, 1, 12, 0, 0)
+FRESH = str(2**62)
+
+
+def _row(seconds, content="hola"):
+    return {
+        "id": uuid.uuid4(),
+        "thread_id": uuid.uuid4(),
+        "user_id": uuid.uuid4(),
+        "type": None,
+        "content": content,
+        "paths": [],
+        "created_at": BASE + datetime.timedelta(seconds=seconds),
+        "updated_at": None,
+        "deleted_at": None,
+    }
+
+
+class _FakeClient:
+    """Registra las llamadas; el script de lectura devuelve `read_result`."""
+
+    def __init__(self, read_result=None):
+        self.read_result = read_result
+        self.script_calls = []
+        self.pipelined = []
+        self.published = []
+
+    async def publish(self, channel, message):
+        self.published.append((channel, message))
+
+    def register_script(self, source):
+        client = self
+
+        async def _run(keys, args):
+            client.script_calls.append((keys, args))
+            return client.read_result
+
+        return _run
+
+    def pipeline(self, transaction=True):
+        client = self
+
+        class _Pipe:
+            def __getattr__(self, name):
+                def _queue(*args, **kwargs):
+                    client.pipelined.append((name, args, kwargs))
+
+                return _queue
+
+            async def execute(self):
+                return []
+
+        return _Pipe()
+
+
+def _use_client(monkeypatch, client):
+    monkeypatch.setattr(cache, "cache_enabled", lambda: True)
+    monkeypatch.setattr(cache, "get_client", lambda: client)
+    monkeypatch.setattr(cache, "_scripts", {})
+    monkeypatch.setattr(cache, "_l1", LocalCache(10, 60))
+
+
+def test_score_is_exact_microseconds_and_ignores_timezone():
+    ts = datetime.datetime(2025, 1, 1, 12, 0, 0, 123456)
+    aware = ts.replace(tzinfo=datetime.timezone.utc).astimezone(
+        datetime.timezone(datetime.timedelta(hours=-3))
+    )
+    assert cache._score(ts) == cache._score(aware) == cache._score(ts.isoformat())
+    assert cache._score(ts) - cache._score(ts - datetime.timedelta(microseconds=1)) == 1
+
+
+def test_cursor_page_passes_seek_bounds_and_serves_partial_complete_window(
+    monkeypatch,
+):
+    row = _row(1)
+    client = _FakeClient(["1", FRESH, cache._dumps(row)])
+    _use_client(monkeypatch, client)
+    before = (BASE + datetime.timedelta(seconds=5), uuid.uuid4())
+
+    items = asyncio.run(cache.get_recent_messages("t", 10, before))
+    assert [i["id"] for i in items] == [str(row["id"])]
+    keys, args = client.script_calls[0]
+    assert keys == [cache._key_index("t"), cache._key_items("t")]
+    assert args[:3] == [str(cache._score(before[0])), str(before[1]), 10]
+
+
+def test_short_incomplete_window_is_a_miss(monkeypatch):
+    _use_client(monkeypatch, _FakeClient(["0", FRESH, cache._dumps(_row(1))]))
+    assert asyncio.run(cache.get_recent_messages("t", 10)) is None
+
+
+def test_set_recent_messages_indexes_by_created_at(monkeypatch):
+    client = _FakeClient()
+    _use_client(monkeypatch, client)
+    a, b = _row(2), _row(1)
+
+    asyncio.run(cache.set_recent_messages("t", [a, b], complete=True))
+    ops = {name: (args, kwargs) for name, args, kwargs in client.pipelined}
+    assert ops["delete"][0] == (cache._key_index("t"), cache._key_items("t"))
+    scores = ops["zadd"][0][1]
+    assert scores[str(a["id"])] > scores[str(b["id"])]
+    mapping = ops["hset"][1]["mapping"]
+    assert mapping[cache.COMPLETE_FIELD] == "1"
+    assert cache._loads(mapping[str(a["id"])])["id"] == str(a["id"])
+
+
+def test_l1_serves_repeat_reads_until_invalidated(monkeypatch):
+    client = _FakeClient(["1", FRESH, cache._dumps(_row(1))])
+    _use_client(monkeypatch, client)
+
+    async def _run():
+        first = await cache.get_recent_messages("t", 10)
+        assert await cache.get_recent_messages("t", 10) is first
+        assert len(client.script_calls) == 1
+        await cache.invalidate_thread("t")
+        await cache.get_recent_messages("t", 10)
+        assert len(client.script_calls) == 2
+
+    asyncio.run(_run())
+    assert client.published == [(cache.CACHE_INVALIDATION_CHANNEL, "t")]
+    stats = cache.l1_stats()
+    assert (stats["hits"], stats["misses"], stats["invalidations"]) == (1, 2, 1)
+
+
+def test_local_cache_lru_ttl_and_generation_guard(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("local_cache.time.monotonic", lambda: now[0])
+    l1 = LocalCache(max_threads=2, ttl=5)
+
+    for t in ("a", "b", "c"):
+        l1.put(t, 1, t, l1.generation(t))
+    assert l1.get("a", 1) is None  # desalojado por LRU
+    assert l1.get("c", 1) == "c"
+
+    stale = l1.generation("b")
+    l1.evict("b")
+    l1.put("b", 1, "viejo", stale)
+    assert l1.get("b", 1) is None
+
+    now[0] += 6
+    assert l1.get("c", 1) is None
+    assert l1.stats()["evictions"] == 1
+    assert l1.stats()["expirations"] == 1
+
+
+def test_write_to_one_thread_keeps_fills_of_others():
+    l1 = LocalCache(max_threads=10, ttl=60)
+    gen_a, gen_b = l1.generation("a"), l1.generation("b")
+    # Escritura en "a" mientras se cargaban ambos hilos
+    l1.evict("a")
+    l1.put("a", 1, "viejo", gen_a)
+    l1.put("b", 1, "fresco", gen_b)
+    assert l1.get("a", 1) is None
+    assert l1.get("b", 1) == "fresco"
+
+    # clear() invalida lo capturado antes en cualquier hilo
+    gen_b = l1.generation("b")
+    l1.clear()
+    l1.put("b", 1, "viejo", gen_b)
+    assert l1.get("b", 1) is None
+
+
+def test_pruned_generations_never_repeat():
+    l1 = LocalCache(max_threads=1, ttl=60)
+    l1.max_generations = 2
+    captured = l1.generation("a")
+    l1.evict("a")
+    l1.evict("b")
+    l1.evict("c")  # descarta la generación de "a"
+    l1.put("a", 1, "viejo", captured)
+    assert l1.get("a", 1) is None
+
+
+def test_page_body_survives_writes_to_other_threads(monkeypatch):
+    _use_client(monkeypatch, _FakeClient([]))
+    epoch = cache.l1_epoch("b")
+
+    asyncio.run(cache._broadcast(cache.get_client(), "a"))
+    cache.put_page_body("b", 50, b"{}", "etag", epoch)
+    assert cache.get_page_body("b", 50) == (b"{}", "etag")
+
+
+def test_stale_window_is_served_and_refreshed_once(monkeypatch):
+    row = _row(1)
+    _use_client(monkeypatch, _FakeClient(["1", "0", cache._dumps(row)]))
+    refreshed = []
+
+    async def _refresher(thread_id, limit):
+        refreshed.append((thread_id, limit))
+
+    monkeypatch.setattr(cache, "_refresher", _refresher)
+    monkeypatch.setattr(cache, "CACHE_SOFT_TTL_SECONDS", 30)
+    monkeypatch.setattr(cache, "CACHE_L1_ENABLED", False)
+    monkeypatch.setattr(cache, "_l1", LocalCache(10, 0))
+
+    async def _run():
+        pages = [await cache.get_recent_messages("t", 10) for _ in range(3)]
+        await asyncio.gather(*cache._refresh_tasks)
+        return pages
+
+    pages = asyncio.run(_run())
+    assert all(p[0]["id"] == str(row["id"]) for p in pages)
+    assert refreshed == [("t", 10)]
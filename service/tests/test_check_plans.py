@@ -0,0 +1,126 @@
+import datetime
+import sys
+import uuid
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+SRC = ROOT / "src"
+for p in (ROOT, SRC):
+    if str(p) not in sys.path:
+        sys.path.insert(0, str(p))
+
+from db import check_plans, index_report  # noqa: E402
+from db.sqlc import messages as sqlc_messages  # noqa: E402
+
+
+def _scan(index, node_type="Index Scan"):
+    return {"Node Type": node_type, "Index Name": index, "Relation Name": "messages"}
+
+
+def test_keyset_index_scan_under_limit_passes():
+    plan = [
+        {"Plan": {"Node Type": "Limit", "Plans": [_scan(check_plans.KEYSET_INDEX)]}}
+    ]
+    assert check_plans.check_plan(plan) == []
+
+
+def test_old_index_with_sort_is_reported():
+    old = _scan("idx_messages_thread_not_deleted_created")
+    plan = {
+        "Plan": {"Node Type": "Limit", "Plans": [{"Node Type": "Sort", "Plans": [old]}]}
+    }
+    problems = check_plans.check_plan(plan)
+    assert len(problems) == 2
+    assert "idx_messages_thread_not_deleted_created" in problems[0]
+
+
+def test_partition_indexes_in_ordered_append_pass_merge_append_fails():
+    children = ["messages_p202511_thread_id_created_at_id_idx"]
+    scans = [_scan(children[0]), _scan("messages_p202510_thread_id_created_at_id_idx")]
+    appended = [
+        {
+            "Plan": {
+                "Node Type": "Limit",
+                "Plans": [{"Node Type": "Append", "Plans": scans}],
+            }
+        }
+    ]
+    indexes = [check_plans.KEYSET_INDEX] + children
+    assert check_plans.check_plan(appended, indexes) == []
+
+    merged = [{"Plan": {"Node Type": "Merge Append", "Plans": scans}}]
+    assert check_plans.check_plan(merged, indexes) == [
+        "plan merges every partition (Merge Append)"
+    ]
+
+
+def test_bitmap_scan_does_not_count_as_ordered():
+    bitmap = _scan(check_plans.KEYSET_INDEX, "Bitmap Index Scan")
+    plan = [{"Plan": {"Node Type": "Bitmap Heap Scan", "Plans": [bitmap]}}]
+    assert check_plans.check_plan(plan)
+
+
+def test_listing_queries_order_like_the_index():
+    for sql in (
+        sqlc_messages.LIST_THREAD_MESSAGES_NOT_DELETED_DESC_FIRST,
+        sqlc_messages.LIST_THREAD_MESSAGES_NOT_DELETED_DESC_BEFORE,
+    ):
+        assert "ORDER BY created_at DESC, id DESC" in sql
+        assert "deleted_at IS NULL" in sql
+
+
+def _cases():
+    return check_plans._cases(uuid.uuid4(), uuid.uuid4(), datetime.datetime.now())
+
+
+def test_every_query_that_reads_messages_has_a_case():
+    cases = _cases()
+    for name, sql in index_report.sqlc_queries().items():
+        if "INSERT INTO" in sql:
+            assert name.lower() not in cases
+        else:
+            assert name.lower() in cases, name
+    # Las queries que llama el servicio no pueden quedar solo informadas
+    for name in index_report.service_queries():
+        if name.lower() in cases:
+            assert cases[name.lower()][0] != check_plans.REPORT, name
+
+
+def test_by_id_cases_use_a_v7_id_inside_the_cursor_month():
+    before = datetime.datetime(2025, 3, 15, 12, 0, 0)
+    cases = check_plans._cases(uuid.uuid4(), uuid.uuid4(), before)
+    expect, _, values = cases["get_message_by_id"]
+    assert expect == check_plans.PRUNED
+    (message_id,) = values
+    assert message_id.version == 7
+    assert message_id.int >> 80 == int(
+        before.replace(tzinfo=datetime.timezone.utc).timestamp() * 1000
+    )
+
+
+def test_pruned_plan_allows_the_two_months_around_the_id():
+    def _update(relations):
+        scans = [{"Node Type": "Index Scan", "Relation Name": r} for r in relations]
+        return [{"Plan": {"Node Type": "ModifyTable", "Plans": scans}}]
+
+    around = ["messages_p202502", "messages_p202503"]
+    assert check_plans.check_pruned(_update(around)) == []
+    every = [f"messages_p2025{m:02d}" for m in range(1, 7)]
+    assert check_plans.check_pruned(_update(every)) == [
+        "scans 6 partitions (expected <= 2)"
+    ]
+    # Sin particionar no hay nada que podar
+    assert check_plans.check_pruned(_update(["messages"])) == []
+
+
+def test_report_queries_show_sorts_without_failing():
+    sort = {"Node Type": "Sort", "Plans": [_scan("messages_p202503_pkey")]}
+    plan = [{"Plan": {"Node Type": "Limit", "Plans": [sort]}}]
+    result = check_plans.evaluate(check_plans.REPORT, plan, [check_plans.KEYSET_INDEX])
+    assert result["problems"] == []
+    assert result["sort_nodes"] == ["Sort"]
+    line = check_plans.format_result("search_thread_messages_fts", result)
+    assert line.startswith("search_thread_messages_fts [report]: info: Sort")
+
+    failed = check_plans.evaluate(check_plans.ORDERED, plan, [check_plans.KEYSET_INDEX])
+    assert "FAIL" in check_plans.format_result("x", failed)
@@ -0,0 +1,129 @@
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+import asyncpg  # noqa: E402
+from asyncpg import connresource  # noqa: E402
+
+from db import connection  # noqa: E402
+from db.sqlc import messages as sqlc_messages  # noqa: E402
+
+
+def test_all_sqlc_queries_are_precompiled():
+    names = [n for n in vars(sqlc_messages) if n.isupper()]
+    for name in names:
+        sql = getattr(sqlc_messages, name)
+        assert sql in connection.COMPILED
+        compiled = connection.COMPILED[sql]
+        assert ":p" not in compiled.sql
+        assert "\\:" not in compiled.sql
+
+
+def test_prepare_keeps_first_appearance_order():
+    sql, values = connection.prepare(
+        sqlc_messages.UPDATE_THREAD_MESSAGE_CONTENT_AND_PATHS,
+        {"p1": "id", "p2": "thread", "p3": "content", "p4": ["/a"], "p5": None},
+    )
+    assert "content    = COALESCE($1, content)" in sql
+    assert values == ["content", ["/a"], None, "id", "thread"]
+
+
+def test_prepare_caches_ad_hoc_sql():
+    raw = "SELECT :p2, :p1, :p2\\:\\:text"
+    sql, values = connection.prepare(raw, {"p1": 1, "p2": 2})
+    assert sql == "SELECT $1, $2, $1::text"
+    assert values == [2, 1]
+    assert raw in connection.COMPILED
+
+
+def test_json_codecs_use_module_functions():
+    class _Conn:
+        def __init__(self):
+            self.codecs = {}
+
+        async def set_type_codec(self, name, encoder, decoder, schema):
+            self.codecs[name] = (encoder, decoder)
+
+    conn = _Conn()
+    asyncio.run(connection.AsyncDatabase()._init_conn(conn))
+    assert conn.codecs["json"] == (connection.json_dumps, connection.json_loads)
+    assert conn.codecs["jsonb"] == (connection.json_dumps, connection.json_loads)
+    value = {"paths": ["/a/ñ.png"], "n": 1}
+    text = connection.json_dumps(value)
+    assert isinstance(text, str)
+    assert json.loads(text) == value
+    assert connection.json_loads(text) == value
+
+
+def test_queries_survive_pool_release(monkeypatch):
+    # Ciclo acquire -> release -> acquire de asyncpg sobre la misma conexión:
+    # release incrementa _pool_release_ctr e invalida todo ConnectionResource
+    # (p. ej. un PreparedStatement) creado en un checkout anterior
+    class _Stmt(connresource.ConnectionResource):
+        @connresource.guarded
+        async def fetch(self, *args):
+            return []
+
+    async def _prepare(self, query, **kwargs):
+        return _Stmt(self)
+
+    async def _fetch(self, query, *args, **kwargs):
+        return []
+
+    async def _noop(self, *args, **kwargs):
+        return None
+
+    monkeypatch.setattr(asyncpg.Connection, "prepare", _prepare)
+    monkeypatch.setattr(asyncpg.Connection, "fetch", _fetch)
+    monkeypatch.setattr(asyncpg.Connection, "set_type_codec", _noop)
+
+    conn = connection.TimedConnection.__new__(connection.TimedConnection)
+    conn._protocol = None
+    conn._pool_release_ctr = 0
+    conn._listeners = {}
+    conn._log_listeners = set()
+    conn.is_closed = lambda: False
+    sql, values = connection.prepare(
+        sqlc_messages.LIST_THREAD_MESSAGES_NOT_DELETED_DESC_FIRST,
+        {"p1": "thread", "p2": 50},
+    )
+
+    async def _run():
+        await connection.AsyncDatabase()._init_conn(conn)
+        for _ in range(3):
+            assert await conn.fetch(sql, *values) == []
+            conn._on_release()
+
+    asyncio.run(_run())
+    assert conn._pool_release_ctr == 3
+
+
+def test_pool_connections_cache_hot_statements(monkeypatch):
+    # Cada conexión del pool sale con los statements calientes en su cache
+    prepared = []
+
+    async def _prepare(self, query, **kwargs):
+        prepared.append((query, kwargs))
+
+    async def _noop(self, *args, **kwargs):
+        return None
+
+    monkeypatch.setattr(asyncpg.Connection, "_prepare", _prepare)
+    monkeypatch.setattr(asyncpg.Connection, "set_type_codec", _noop)
+
+    conn = connection.TimedConnection.__new__(connection.TimedConnection)
+    asyncio.run(connection.AsyncDatabase()._init_pool_conn(conn))
+    assert prepared == [
+        (connection.COMPILED[sql].sql, {"use_cache": True})
+        for sql in (
+            sqlc_messages.CREATE_MESSAGE,
+            sqlc_messages.LIST_THREAD_MESSAGES_NOT_DELETED_DESC_FIRST,
+            sqlc_messages.LIST_THREAD_MESSAGES_NOT_DELETED_DESC_BEFORE,
+        )
+    ]
+    assert all("$1" in sql and ":p1" not in sql for sql, _ in prepared)
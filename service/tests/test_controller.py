@@ -0,0 +1,76 @@
+import asyncio
+import sys
+import uuid
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+SRC = ROOT / "src"
+for p in (ROOT, SRC):
+    if str(p) not in sys.path:
+        sys.path.insert(0, str(p))
+
+import Controller  # noqa: E402
+
+
+class _FakeConn:
+    def __init__(self, row):
+        self.row = row
+        self.calls = []
+
+    async def fetchrow(self, sql, *values):
+        self.calls.append((sql, values))
+        return self.row
+
+
+class _FakePool:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def acquire(self):
+        conn = self.conn
+
+        class _Ctx:
+            async def __aenter__(self):
+                return conn
+
+            async def __aexit__(self, *exc):
+                return False
+
+        return _Ctx()
+
+
+def _use_conn(monkeypatch, row):
+    conn = _FakeConn(row)
+
+    async def _get_pool():
+        return _FakePool(conn)
+
+    monkeypatch.setattr(Controller, "get_pool", _get_pool)
+    return conn
+
+
+def test_update_message_is_single_thread_scoped_statement(monkeypatch):
+    thread, message = uuid.uuid4(), uuid.uuid4()
+    conn = _use_conn(monkeypatch, {"id": message, "thread_id": thread})
+
+    row, err = asyncio.run(
+        Controller.UpdateMessage(thread, message, uuid.uuid4(), "x", None, None)
+    )
+    assert err is None
+    assert row["id"] == message
+    assert len(conn.calls) == 1
+    sql, values = conn.calls[0]
+    assert "AND thread_id = $" in sql
+    assert message in values and thread in values
+
+
+def test_delete_message_in_other_thread_is_not_found(monkeypatch):
+    conn = _use_conn(monkeypatch, None)
+
+    row, err = asyncio.run(
+        Controller.DeleteMessage(uuid.uuid4(), uuid.uuid4(), uuid.uuid4())
+    )
+    assert row is None
+    assert "no row returned" in str(err).lower()
+    assert len(conn.calls) == 1
+    assert "deleted_at IS NULL" in conn.calls[0][0]
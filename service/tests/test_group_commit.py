@@ -0,0 +1,93 @@
+import asyncio
+import sys
+import uuid
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+SRC = ROOT / "src"
+for p in (ROOT, SRC):
+    if str(p) not in sys.path:
+        sys.path.insert(0, str(p))
+
+import group_commit  # noqa: E402
+
+
+class _FakeConn:
+    def __init__(self, calls):
+        self.calls = calls
+
+    async def fetch(self, sql, ids, threads, users, types, contents, paths):
+        self.calls.append(len(ids))
+        return [
+            {"id": i, "thread_id": t, "user_id": u, "content": c}
+            for i, t, u, c in zip(ids, threads, users, contents)
+        ]
+
+
+class _FakePool:
+    def __init__(self):
+        self.calls = []
+
+    def acquire(self):
+        pool = self
+
+        class _Ctx:
+            async def __aenter__(self):
+                return _FakeConn(pool.calls)
+
+            async def __aexit__(self, *exc):
+                return False
+
+        return _Ctx()
+
+
+def test_concurrent_creates_share_one_insert(monkeypatch):
+    pool = _FakePool()
+
+    async def _get_pool():
+        return pool
+
+    monkeypatch.setattr(group_commit, "get_pool", _get_pool)
+    batcher = group_commit.CreateBatcher(window_ms=5, max_rows=64)
+    thread = uuid.uuid4()
+
+    async def _run():
+        return await asyncio.gather(
+            *[
+                batcher.submit(thread, uuid.uuid4(), None, f"m{i}", None)
+                for i in range(10)
+            ]
+        )
+
+    results = asyncio.run(_run())
+    assert pool.calls == [10]
+    assert [r["content"] for r in results] == [f"m{i}" for i in range(10)]
+    stats = batcher.stats()
+    assert stats["batches"] == 1
+    assert stats["max_batch"] == 10
+
+
+def test_max_rows_flushes_without_waiting_window(monkeypatch):
+    pool = _FakePool()
+
+    async def _get_pool():
+        return pool
+
+    monkeypatch.setattr(group_commit, "get_pool", _get_pool)
+    batcher = group_commit.CreateBatcher(window_ms=10_000, max_rows=4)
+    thread = uuid.uuid4()
+
+    async def _run():
+        return await asyncio.wait_for(
+            asyncio.gather(
+                *[
+                    batcher.submit(thread, uuid.uuid4(), "text", "x", ["/a"])
+                    for _ in range(8)
+                ]
+            ),
+            timeout=2,
+        )
+
+    results = asyncio.run(_run())
+    assert len(results) == 8
+    assert pool.calls == [4, 4]
@@ -0,0 +1,28 @@
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+SRC = ROOT / "src"
+for p in (ROOT, SRC):
+    if str(p) not in sys.path:
+        sys.path.insert(0, str(p))
+
+import ids  # noqa: E402
+
+
+def test_uuid7_layout_and_timestamp():
+    before = time.time_ns() // 1_000_000
+    value = ids.uuid7()
+    after = time.time_ns() // 1_000_000
+    assert value.version == 7
+    assert value.variant == "specified in RFC 4122"
+    assert before <= ids.uuid7_time_ms(value) <= after
+
+
+def test_uuid7_is_strictly_increasing_within_a_millisecond(monkeypatch):
+    monkeypatch.setattr(ids.time, "time_ns", lambda: 1_700_000_000_000 * 1_000_000)
+    values = [ids.uuid7() for _ in range(5000)]
+    assert values == sorted(values) and len(set(values)) == len(values)
+    # 5000 > 2048 ids por ms: el contador desborda y avanza el timestamp
+    assert ids.uuid7_time_ms(values[-1]) > 1_700_000_000_000
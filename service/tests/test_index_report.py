@@ -0,0 +1,35 @@
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+SRC = ROOT / "src"
+for p in (ROOT, SRC):
+    if str(p) not in sys.path:
+        sys.path.insert(0, str(p))
+
+from db import index_report  # noqa: E402
+
+
+def test_service_queries_reads_sqlc_imports_from_src():
+    used = index_report.service_queries(SRC)
+    assert {
+        "CREATE_MESSAGE",
+        "CREATE_MESSAGES_BATCH",
+        "LIST_THREAD_MESSAGES_NOT_DELETED_DESC_FIRST",
+        "LIST_THREAD_MESSAGES_NOT_DELETED_DESC_BEFORE",
+        "SOFT_DELETE_THREAD_MESSAGE",
+        "UPDATE_THREAD_MESSAGE_CONTENT_AND_PATHS",
+    } <= used
+    assert "FIND_MESSAGES_BY_CONTENT_LOWER_PREFIX" not in used
+
+
+def test_classify():
+    service = {"LIST_THREAD_MESSAGES_NOT_DELETED_DESC_FIRST"}
+    index = {"primary": False, "idx_scan": 0}
+    assert (
+        index_report.classify(index, ["FIND_MESSAGES_BY_CONTENT_LOWER_PREFIX"], service)
+        == "unused"
+    )
+    assert index_report.classify({**index, "idx_scan": 7}, [], service) == "dead"
+    assert index_report.classify(index, service, service) == "used"
+    assert index_report.classify({**index, "primary": True}, [], service) == "primary"
@@ -0,0 +1,45 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+SRC = ROOT / "src"
+for p in (ROOT, SRC):
+    if str(p) not in sys.path:
+        sys.path.insert(0, str(p))
+
+import metrics  # noqa: E402
+
+
+def test_histogram_renders_cumulative_buckets():
+    h = metrics.Histogram("t_seconds", "test", ("query",), buckets=(0.01, 0.1))
+    for v in (0.005, 0.05, 0.05, 3.0):
+        h.observe(v, "list_thread_messages")
+    lines = h.render()
+    assert 't_seconds_bucket{query="list_thread_messages",le="0.01"} 1' in lines
+    assert 't_seconds_bucket{query="list_thread_messages",le="0.1"} 3' in lines
+    assert 't_seconds_bucket{query="list_thread_messages",le="+Inf"} 4' in lines
+    assert 't_seconds_count{query="list_thread_messages"} 4' in lines
+    assert 't_seconds_sum{query="list_thread_messages"} 3.105' in lines
+
+
+def test_query_observer_labels_by_sqlc_name():
+    from db.connection import query_name
+
+    sql = "-- name: ListSomething :many\nSELECT 1"
+    metrics.observe_query(query_name(sql), 0.002)
+    metrics.observe_query(query_name("SELECT 1"), 0.002)
+    text = metrics.render()
+    assert 'db_query_duration_seconds_count{query="ListSomething"}' in text
+    assert 'db_query_duration_seconds_count{query="raw"}' in text
+
+
+def test_src_scripts_import_without_db_on_path():
+    # El CLI del outbox corre desde src/ (`make outbox-drain`) sin db/ en el path
+    env = {k: v for k, v in os.environ.items() if k != "PYTHONPATH"}
+    code = "import sys, redis_outbox, metrics; assert 'db' not in sys.modules"
+    r = subprocess.run(
+        [sys.executable, "-c", code], cwd=SRC, env=env, capture_output=True
+    )
+    assert r.returncode == 0, r.stderr.decode()
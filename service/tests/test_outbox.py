@@ -0,0 +1,185 @@
+import asyncio
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+SRC = ROOT / "src"
+for p in (ROOT, SRC):
+    if str(p) not in sys.path:
+        sys.path.insert(0, str(p))
+
+import outbox  # noqa: E402
+
+
+class _FakeConn:
+    """Emula la tabla `outbox` con lease y dead letter."""
+
+    def __init__(self, rows):
+        self.rows = {r["id"]: dict(r, attempts=0, dead=False) for r in rows}
+        self.executed = []
+        self.acquired = 0
+        self.in_tx = False
+
+    def transaction(self):
+        conn = self
+
+        class _Tx:
+            async def __aenter__(self):
+                conn.in_tx = True
+                return self
+
+            async def __aexit__(self, *exc):
+                conn.in_tx = False
+                return False
+
+        return _Tx()
+
+    async def fetch(self, sql, *values):
+        name = _query_name(sql)
+        if name == "claim_outbox_batch":
+            assert "SKIP LOCKED" in sql
+            # El reclamo es una sentencia autocommit, fuera de transacción
+            assert not self.in_tx
+            # prepare() numera los parámetros por orden de aparición
+            _lease, limit = values
+            pending = [r for r in self.rows.values() if not r["dead"]]
+            return pending[:limit]
+        assert name == "mark_outbox_events_failed"
+        self.executed.append((sql, values))
+        _retry, max_attempts, ids, errors = values
+        assert len(ids) == len(errors)
+        out = []
+        for i in ids:
+            row = self.rows[i]
+            row["attempts"] += 1
+            row["dead"] = row["attempts"] >= max_attempts
+            out.append({"id": i, "dead": row["dead"]})
+        return out
+
+    async def execute(self, sql, *values):
+        assert self.in_tx
+        self.executed.append((sql, values))
+        if _query_name(sql) == "delete_outbox_events":
+            for i in values[0]:
+                self.rows.pop(i, None)
+
+
+class _FakePool:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def acquire(self):
+        conn = self.conn
+
+        class _Ctx:
+            async def __aenter__(self):
+                conn.acquired += 1
+                return conn
+
+            async def __aexit__(self, *exc):
+                conn.acquired -= 1
+                return False
+
+        return _Ctx()
+
+
+class _FakePublisher:
+    def __init__(self, fail_bodies=(), conn=None):
+        self.fail_bodies = set(fail_bodies)
+        self.sent = []
+        self.conn = conn
+
+    async def publish(self, tag, body, event_type=None):
+        # Publicar nunca debe ocurrir con una conexión del pool tomada
+        if self.conn is not None:
+            assert self.conn.acquired == 0
+        if body in self.fail_bodies:
+            raise ConnectionError("broker down")
+        self.sent.append((tag, body))
+
+
+def _query_name(sql):
+    # "-- name: delete_outbox_events :exec" -> "delete_outbox_events"
+    return sql.split("\n", 1)[0].split()[2]
+
+
+def _rows():
+    return [
+        {"id": 1, "event_type": "CREATE", "tag": "q", "body": '{"a":1}'},
+        {"id": 2, "event_type": "CREATE", "tag": "q", "body": '{"a":2}'},
+        {"id": 3, "event_type": "CREATE", "tag": "q", "body": '{"a":3}'},
+    ]
+
+
+def _setup(monkeypatch, publisher):
+    conn = _FakeConn(_rows())
+    publisher.conn = conn
+
+    async def _get_pool():
+        return _FakePool(conn)
+
+    monkeypatch.setattr(outbox, "get_pool", _get_pool)
+    monkeypatch.setattr(outbox, "get_publisher", lambda: publisher)
+    return conn
+
+
+def test_drain_once_publishes_and_deletes_batch(monkeypatch):
+    publisher = _FakePublisher()
+    conn = _setup(monkeypatch, publisher)
+    relay = outbox.OutboxRelay(batch_size=10)
+
+    n = asyncio.run(relay.drain_once())
+    assert n == 3
+    assert [b for _, b in publisher.sent] == [b'{"a":1}', b'{"a":2}', b'{"a":3}']
+    assert len(conn.executed) == 1
+    sql, values = conn.executed[0]
+    assert _query_name(sql) == "delete_outbox_events"
+    assert values == ([1, 2, 3],)
+    assert relay.stats()["relayed"] == 3
+
+
+def test_drain_once_marks_failed_events(monkeypatch):
+    publisher = _FakePublisher(fail_bodies={b'{"a":2}'})
+    conn = _setup(monkeypatch, publisher)
+    relay = outbox.OutboxRelay(batch_size=10)
+
+    asyncio.run(relay.drain_once())
+    statements = {_query_name(sql): v for sql, v in conn.executed}
+    assert statements["delete_outbox_events"] == ([1, 3],)
+    retry, max_attempts, ids, errors = statements["mark_outbox_events_failed"]
+    assert ids == [2]
+    assert errors == ["ConnectionError:broker down"]
+    assert (retry, max_attempts) == (relay.retry_seconds, relay.max_attempts)
+    assert relay.stats()["failed"] == 1
+
+
+def test_poison_event_is_dead_lettered_after_max_attempts(monkeypatch):
+    publisher = _FakePublisher(fail_bodies={b'{"a":2}'})
+    conn = _setup(monkeypatch, publisher)
+    relay = outbox.OutboxRelay(batch_size=10, max_attempts=3)
+
+    async def _drain(times):
+        for _ in range(times):
+            await relay.drain_once()
+
+    asyncio.run(_drain(3))
+    # 1 y 3 se publicaron en el primer lote; 2 agotó sus intentos
+    assert list(conn.rows) == [2]
+    assert conn.rows[2]["dead"] and conn.rows[2]["attempts"] == 3
+    stats = relay.stats()
+    assert stats["failed"] == 3
+    assert stats["dead_lettered"] == 1
+
+    # En dead letter ya no se reclama ni se vuelve a publicar
+    publisher.sent.clear()
+    assert asyncio.run(relay.drain_once()) == 0
+    assert publisher.sent == []
+    assert conn.rows[2]["attempts"] == 3
+
+
+def test_relay_stats_is_empty_until_the_relay_exists(monkeypatch):
+    monkeypatch.setattr(outbox, "_relay", None)
+    assert outbox.relay_stats() == {}
+    relay = outbox.get_relay()
+    relay.relayed = 4
+    assert outbox.relay_stats()["relayed"] == 4
@@ -0,0 +1,85 @@
+import asyncio
+import datetime
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+SRC = ROOT / "src"
+for p in (ROOT, SRC):
+    if str(p) not in sys.path:
+        sys.path.insert(0, str(p))
+
+import partition_watch  # noqa: E402
+from db import partitions  # noqa: E402
+
+
+class _FakeConn:
+    """Catálogo con las particiones adjuntas a `messages`."""
+
+    def __init__(self, names):
+        self.names = names
+
+    async def fetch(self, sql, *values):
+        assert "pg_inherits" in sql and values == ("messages",)
+        return [{"relname": name} for name in self.names]
+
+
+class _FakePool:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def acquire(self):
+        conn = self.conn
+
+        class _Ctx:
+            async def __aenter__(self):
+                return conn
+
+            async def __aexit__(self, *exc):
+                return False
+
+        return _Ctx()
+
+
+def _setup(monkeypatch, months):
+    current = partitions.month_start(datetime.date.today())
+    names = [
+        partitions.partition_for(partitions.add_months(current, n)).name for n in months
+    ]
+    pool = _FakePool(_FakeConn(names + ["messages_unpartitioned"]))
+
+    async def _get_pool():
+        return pool
+
+    monkeypatch.setattr(partition_watch, "get_pool", _get_pool)
+    return partition_watch.PartitionWatch(min_months_ahead=2)
+
+
+def test_headroom_is_reported_without_error_when_enough(monkeypatch, caplog):
+    watch = _setup(monkeypatch, range(-1, 4))
+
+    with caplog.at_level("ERROR", logger="API_logs"):
+        assert asyncio.run(watch.check_once()) == 3
+    assert not caplog.records
+    assert watch.stats() == {
+        "min_months_ahead": 2,
+        "low": 0,
+        "checks": 1,
+        "check_errors": 0,
+        "months_ahead": 3,
+    }
+
+
+def test_low_headroom_is_flagged_and_logged(monkeypatch, caplog):
+    # El CronJob dejó de correr: solo queda el mes siguiente
+    watch = _setup(monkeypatch, range(-3, 2))
+
+    with caplog.at_level("ERROR", logger="API_logs"):
+        assert asyncio.run(watch.check_once()) == 1
+    assert watch.stats()["low"] == 1
+    assert "months_ahead=1" in caplog.records[0].getMessage()
+
+
+def test_watch_stats_is_empty_until_the_watch_exists(monkeypatch):
+    monkeypatch.setattr(partition_watch, "_watch", None)
+    assert partition_watch.watch_stats() == {}
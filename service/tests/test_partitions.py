@@ -0,0 +1,61 @@
+import datetime
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+SRC = ROOT / "src"
+for p in (ROOT, SRC):
+    if str(p) not in sys.path:
+        sys.path.insert(0, str(p))
+
+from db import partitions  # noqa: E402
+from db.sqlc import messages as sqlc_messages  # noqa: E402
+
+TODAY = datetime.date(2025, 11, 20)
+
+
+def test_plan_creates_missing_months_across_year_end():
+    create, detach = partitions.plan(TODAY, ["messages_p202511"], months_ahead=3)
+    assert [p.name for p in create] == [
+        "messages_p202512",
+        "messages_p202601",
+        "messages_p202602",
+    ]
+    assert create[1].start == datetime.date(2026, 1, 1)
+    assert create[1].end == datetime.date(2026, 2, 1)
+    assert detach == []
+
+
+def test_plan_detaches_only_partitions_outside_retention():
+    existing = ["messages_p202508", "messages_p202509", "messages_p202511", "other"]
+    _, detach = partitions.plan(TODAY, existing, months_ahead=0, retain_months=3)
+    assert detach == ["messages_p202508"]
+
+
+def test_create_sql_bounds():
+    sql = partitions.create_sql(partitions.partition_for(datetime.date(2025, 12, 9)))
+    assert 'PARTITION OF "messages"' in sql
+    assert "FROM ('2025-12-01') TO ('2026-01-01')" in sql
+
+
+def test_id_lookups_carry_a_created_at_bound_for_pruning():
+    for name in (
+        "GET_MESSAGE_BY_ID",
+        "UPDATE_THREAD_MESSAGE_CONTENT_AND_PATHS",
+        "SOFT_DELETE_THREAD_MESSAGE",
+        "DELETE_MESSAGE_HARD",
+    ):
+        sql = getattr(sqlc_messages, name)
+        assert "uuid_v7_created_min(:p1) AND uuid_v7_created_max(:p1)" in sql, name
+    assert (
+        "created_at <= :p2"
+        in sqlc_messages.LIST_THREAD_MESSAGES_NOT_DELETED_DESC_BEFORE
+    )
+
+
+def test_months_ahead_counts_from_the_current_month():
+    existing = ["messages_p202510", "messages_p202511", "messages_p202602", "other"]
+    assert partitions.months_ahead(TODAY, existing) == 3
+    assert partitions.months_ahead(TODAY, ["messages_p202511"]) == 0
+    assert partitions.months_ahead(TODAY, ["messages_p202510"]) == -1
+    assert partitions.months_ahead(TODAY, ["messages_unpartitioned"]) is None
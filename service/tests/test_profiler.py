@@ -0,0 +1,69 @@
+import asyncio
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+SRC = ROOT / "src"
+for p in (ROOT, SRC):
+    if str(p) not in sys.path:
+        sys.path.insert(0, str(p))
+
+import profiler  # noqa: E402
+
+
+def _inner():
+    return sys._getframe()
+
+
+def _outer():
+    return _inner()
+
+
+def test_collapse_is_root_first():
+    stack = profiler._collapse(_outer())
+    frames = stack.split(";")
+    assert frames[-1].startswith("_inner (test_profiler.py:")
+    assert frames[-2].startswith("_outer (test_profiler.py:")
+
+
+def test_request_session_only_counts_its_task(monkeypatch, tmp_path):
+    monkeypatch.setattr(profiler, "PROFILER_DIR", str(tmp_path))
+    sampler = profiler.Sampler(1.0)
+
+    async def _run():
+        mine = profiler.Session("request", asyncio.current_task())
+        other = profiler.Session("request", object())
+        sampler.sessions.extend([mine, other])
+        sampler._handler(0, _outer())
+        sampler._handler(0, _outer())
+        return mine, other
+
+    mine, other = asyncio.run(_run())
+    assert (mine.total, other.total) == (2, 0)
+    path = Path(mine.write())
+    lines = path.read_text().splitlines()
+    assert path.parent == tmp_path and path.suffix == ".folded"
+    assert sum(int(line.rsplit(" ", 1)[1]) for line in lines) == 2
+    assert all("_inner (test_profiler.py:" in line for line in lines)
+
+
+def test_window_rejects_overlap_and_writes_file(monkeypatch, tmp_path):
+    if not hasattr(profiler.signal, "setitimer"):
+        return
+    monkeypatch.setattr(profiler, "PROFILER_DIR", str(tmp_path))
+
+    async def _run():
+        session = await profiler.start_window(0.05)
+        assert profiler.window_status()["active"]
+        try:
+            await profiler.start_window(1)
+        except RuntimeError:
+            pass
+        else:
+            raise AssertionError("expected RuntimeError")
+        await asyncio.sleep(0.2)
+        return session
+
+    session = asyncio.run(_run())
+    assert profiler.window_status() == {"active": False}
+    assert Path(session.path).exists()
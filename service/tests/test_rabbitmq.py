@@ -0,0 +1,95 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+SRC = ROOT / "src"
+for p in (ROOT, SRC):
+    if str(p) not in sys.path:
+        sys.path.insert(0, str(p))
+
+from clients import rabbitmq  # noqa: E402
+
+
+class _FakeExchange:
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.published = []
+
+    async def publish(self, message, routing_key, timeout=None):
+        if self.fail:
+            raise ConnectionError("broker down")
+        self.published.append((routing_key, message.body, message.type))
+
+
+class _FakeChannel:
+    def __init__(self, fail: bool = False):
+        self.is_closed = False
+        self.default_exchange = _FakeExchange(fail)
+        self.declared = []
+
+    async def declare_queue(self, name, durable=False):
+        self.declared.append(name)
+
+
+@pytest.fixture()
+def publisher(monkeypatch):
+    monkeypatch.setenv("QUEUE_ENABLED", "true")
+    pub = rabbitmq.AsyncPublisher()
+    monkeypatch.setattr(rabbitmq, "_publisher", pub)
+    return pub
+
+
+def test_publish_event_reuses_channel_and_declared_queue(publisher):
+    channel = _FakeChannel()
+    publisher._channel = channel
+    data = {"tag": "messages_service", "message": {"id": "1"}}
+
+    async def _run():
+        for _ in range(3):
+            assert await rabbitmq.PublishEvent("CREATE", data) is None
+
+    asyncio.run(_run())
+    assert channel.declared == ["messages_service"]
+    assert len(channel.default_exchange.published) == 3
+    assert {t for _, _, t in channel.default_exchange.published} == {"CREATE"}
+    stats = publisher.stats()
+    assert stats["published"] == 3
+    assert stats["failed"] == 0
+    assert stats["reconnects"] == 0
+
+
+def test_publish_event_failure_goes_to_outbox(publisher, monkeypatch):
+    publisher._channel = _FakeChannel(fail=True)
+    saved = []
+
+    async def _save(event_type, data):
+        saved.append((event_type, data))
+
+    monkeypatch.setattr(rabbitmq, "_save_to_outbox_redis", _save)
+    data = {"tag": "messages_service", "message": {"id": "1"}}
+
+    err = asyncio.run(rabbitmq.PublishEvent("CREATE", data))
+    assert isinstance(err, ConnectionError)
+    assert saved == [("CREATE", data)]
+    assert publisher.stats()["failed"] == 1
+
+
+def test_reconnect_callback_counts_and_clears_declared(publisher):
+    publisher._declared.add("messages_service")
+    publisher._on_reconnect(object())
+    assert publisher.reconnects == 1
+    assert publisher._declared == set()
+
+
+def test_batch_event_is_typed_for_consumers(publisher):
+    channel = _FakeChannel()
+    publisher._channel = channel
+    data = {"tag": "messages_service", "messages": [{"id": "1"}, {"id": "2"}]}
+
+    assert asyncio.run(rabbitmq.PublishEvent("CREATE_BATCH", data)) is None
+    [(tag, body, event_type)] = channel.default_exchange.published
+    assert (tag, event_type) == ("messages_service", "CREATE_BATCH")
+    assert body == b'[{"id": "1"}, {"id": "2"}]'
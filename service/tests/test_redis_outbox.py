@@ -0,0 +1,202 @@
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+SRC = ROOT / "src"
+for p in (ROOT, SRC):
+    if str(p) not in sys.path:
+        sys.path.insert(0, str(p))
+
+import redis_outbox  # noqa: E402
+
+
+class _FakeRedis:
+    """Listas en memoria con el subconjunto de comandos que usa el relay."""
+
+    def __init__(self):
+        self.lists = {}
+        self.strings = {}
+
+    def _l(self, key):
+        return self.lists.setdefault(key, [])
+
+    async def lmove(self, src, dst, wherefrom, whereto):
+        items = self._l(src)
+        if not items:
+            return None
+        raw = items.pop(0 if wherefrom == "LEFT" else -1)
+        if whereto == "LEFT":
+            self._l(dst).insert(0, raw)
+        else:
+            self._l(dst).append(raw)
+        return raw
+
+    async def lrem(self, key, count, raw):
+        items = self._l(key)
+        if raw in items:
+            items.remove(raw)
+        return 1
+
+    async def lpush(self, key, *values):
+        for v in values:
+            self._l(key).insert(0, v)
+
+    async def rpush(self, key, *values):
+        self._l(key).extend(values)
+
+    async def llen(self, key):
+        return len(self._l(key))
+
+    async def set(self, key, value, ex=None):
+        self.strings[key] = value
+        return True
+
+    async def exists(self, key):
+        return int(key in self.strings)
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.strings.pop(key, None)
+            self.lists.pop(key, None)
+
+    async def scan_iter(self, match):
+        prefix = match.rstrip("*")
+        for key in list(self.lists):
+            if key.startswith(prefix):
+                yield key
+
+    def pipeline(self, transaction=True):
+        redis = self
+
+        class _Pipe:
+            def __init__(self):
+                self.calls = []
+
+            def __getattr__(self, name):
+                def _queue(*args, **kwargs):
+                    self.calls.append(getattr(redis, name)(*args, **kwargs))
+
+                return _queue
+
+            async def execute(self):
+                return [await c for c in self.calls]
+
+        return _Pipe()
+
+
+class _FakePublisher:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.sent = []
+
+    async def publish(self, tag, body, event_type=None):
+        if self.fail:
+            raise ConnectionError("broker down")
+        self.sent.append((tag, json.loads(body)))
+
+
+def _event(i):
+    return json.dumps(
+        {"ts": 0, "event_type": "CREATE", "data": {"tag": "q", "message": {"i": i}}}
+    )
+
+
+def _setup(monkeypatch, publisher):
+    redis = _FakeRedis()
+    monkeypatch.setattr(redis_outbox, "get_client", lambda: redis)
+    monkeypatch.setattr(redis_outbox.rabbitmq, "get_publisher", lambda: publisher)
+    relay = redis_outbox.RedisOutboxRelay(key="outbox", batch_size=2, consumer="a")
+    redis.lists["outbox"] = [_event(i) for i in range(3)]
+    return redis, relay
+
+
+def test_drain_republishes_in_batches_and_empties_lists(monkeypatch):
+    publisher = _FakePublisher()
+    redis, relay = _setup(monkeypatch, publisher)
+
+    async def _run():
+        assert await relay.drain_once() == 2
+        assert relay.backlog == 1
+        assert await relay.drain_once() == 1
+
+    asyncio.run(_run())
+    assert [m["i"] for _, m in publisher.sent] == [0, 1, 2]
+    assert redis.lists["outbox"] == []
+    assert redis.lists["outbox:processing:a"] == []
+    assert relay.stats()["backlog"] == 0
+
+
+def test_failed_publish_requeues_at_head_with_backoff(monkeypatch):
+    redis, relay = _setup(monkeypatch, _FakePublisher(fail=True))
+
+    assert asyncio.run(relay.drain_once()) == 0
+    assert redis.lists["outbox"] == [_event(i) for i in range(3)]
+    assert redis.lists["outbox:processing:a"] == []
+    stats = relay.stats()
+    assert stats["failed"] == 2
+    assert stats["backlog"] == 3
+    assert stats["backoff_s"] > 0
+
+
+def test_undecodable_events_go_to_dead_letter_and_are_logged(monkeypatch, caplog):
+    publisher = _FakePublisher()
+    redis, relay = _setup(monkeypatch, publisher)
+    broken = [b"{not json", json.dumps({"event_type": "CREATE", "data": {}})]
+    redis.lists["outbox"] = [broken[0], _event(0), broken[1]]
+    relay.batch_size = 3
+
+    with caplog.at_level("ERROR", logger="API_logs"):
+        assert asyncio.run(relay.drain_once()) == 3
+    assert [m["i"] for _, m in publisher.sent] == [0]
+    assert redis.lists["outbox:dead"] == broken
+    assert redis.lists["outbox"] == []
+    assert redis.lists["outbox:processing:a"] == []
+    assert relay.stats()["dead_lettered"] == 2
+    assert relay.stats()["failed"] == 0
+    errors = [r.getMessage() for r in caplog.records if r.levelname == "ERROR"]
+    assert len(errors) == 2
+    assert repr(broken[0]) in errors[0] and repr(broken[1]) in errors[1]
+
+
+def test_recovery_leaves_live_consumers_alone(monkeypatch):
+    redis, relay = _setup(monkeypatch, _FakePublisher())
+    redis.lists["outbox"] = []
+    redis.lists["outbox:processing:a"] = ["own"]
+    redis.lists["outbox:processing:b"] = ["in-flight"]
+    redis.lists["outbox:processing:c"] = ["orphan"]
+    redis.lists["outbox:processing"] = ["legacy"]
+    redis.strings["outbox:consumer:b"] = "1"
+
+    async def _run():
+        # Al arrancar, cada réplica solo recupera lo suyo
+        assert await relay.recover() == 1
+        assert redis.lists["outbox:processing:b"] == ["in-flight"]
+        # Desde el CLI: los consumidores sin heartbeat y la lista sin sufijo
+        assert await relay.recover_orphans() == 2
+
+    asyncio.run(_run())
+    assert sorted(redis.lists["outbox"]) == ["legacy", "orphan", "own"]
+    assert redis.lists["outbox:processing:b"] == ["in-flight"]
+
+
+def test_drain_renews_heartbeat_and_stop_releases_it(monkeypatch):
+    redis, relay = _setup(monkeypatch, _FakePublisher())
+
+    async def _run():
+        await relay.drain_once()
+        assert redis.strings["outbox:consumer:a"] == "1"
+        redis.lists["outbox:processing:a"] = ["left-over"]
+        await relay.stop()
+
+    asyncio.run(_run())
+    assert "outbox:consumer:a" not in redis.strings
+    assert redis.lists["outbox"][0] == "left-over"
+
+
+def test_relay_stats_is_empty_until_the_relay_exists(monkeypatch):
+    monkeypatch.setattr(redis_outbox, "_relay", None)
+    assert redis_outbox.relay_stats() == {}
+    monkeypatch.setattr(redis_outbox, "_relay", redis_outbox.RedisOutboxRelay())
+    assert redis_outbox.relay_stats()["relayed"] == 0
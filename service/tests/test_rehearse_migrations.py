@@ -0,0 +1,84 @@
+import asyncio
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+SRC = ROOT / "src"
+for p in (ROOT, SRC):
+    if str(p) not in sys.path:
+        sys.path.insert(0, str(p))
+
+from db import check_plans, rehearse_migrations  # noqa: E402
+
+
+def test_latest_version_reads_the_migrations_dir():
+    names = [p.name for p in rehearse_migrations.MIGRATIONS.iterdir()]
+    head = rehearse_migrations.latest_version()
+    assert f"{head:06d}" in {n[:6] for n in names}
+    assert all(int(n[:6]) <= head for n in names if n.endswith(".up.sql"))
+
+
+def _setup(monkeypatch, fingerprints, problems=()):
+    steps = []
+
+    def _migrate(dsn, version):
+        steps.append(("migrate", version))
+        return f"{version}/u ok"
+
+    async def _seed(dsn, rows, threads, months):
+        steps.append(("seed", rows))
+
+    async def _fingerprint(dsn):
+        return fingerprints.pop(0)
+
+    async def _run(dsn, rows, threads):
+        steps.append(("check_plans",))
+        return {
+            "list_thread_messages_not_deleted_desc_first": {
+                "expect": check_plans.ORDERED,
+                "problems": list(problems),
+                "sort_nodes": [],
+                "scans": ["messages_p202503"],
+            }
+        }
+
+    monkeypatch.setattr(rehearse_migrations, "_migrate", _migrate)
+    monkeypatch.setattr(rehearse_migrations, "_seed", _seed)
+    monkeypatch.setattr(rehearse_migrations, "_fingerprint", _fingerprint)
+    monkeypatch.setattr(check_plans, "run", _run)
+    return steps
+
+
+def _print(rows=100, digest="abc", partitioned=False):
+    return {"rows": rows, "deleted": 10, "digest": digest, "partitioned": partitioned}
+
+
+def test_rehearsal_goes_up_down_and_up_comparing_fingerprints(monkeypatch):
+    head = rehearse_migrations.latest_version()
+    prints = [_print(), _print(partitioned=True), _print(), _print(partitioned=True)]
+    steps = _setup(monkeypatch, prints)
+
+    lines = asyncio.run(rehearse_migrations.rehearse("dsn", 100, 10, 6))
+    assert steps == [
+        ("migrate", 5),
+        ("seed", 100),
+        ("migrate", head),
+        ("check_plans",),
+        ("migrate", 5),
+        ("migrate", head),
+    ]
+    assert lines.count("- fingerprint: same as seeded") == 3
+    assert any(line.startswith("list_thread_messages_not_deleted") for line in lines)
+    assert lines[-1] == "PASS"
+
+
+def test_rehearsal_fails_on_lost_rows_or_bad_plans(monkeypatch):
+    prints = [_print(), _print(), _print(rows=99, digest="x"), _print()]
+    _setup(monkeypatch, prints)
+    lines = asyncio.run(rehearse_migrations.rehearse("dsn", 100, 10, 6))
+    assert "- fingerprint: CHANGED" in lines
+    assert lines[-1] == "FAIL"
+
+    _setup(monkeypatch, [_print()] * 4, problems=["plan has a Sort node"])
+    lines = asyncio.run(rehearse_migrations.rehearse("dsn", 100, 10, 6))
+    assert lines[-1] == "FAIL"
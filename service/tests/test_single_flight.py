@@ -0,0 +1,35 @@
+import asyncio
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+SRC = ROOT / "src"
+for p in (ROOT, SRC):
+    if str(p) not in sys.path:
+        sys.path.insert(0, str(p))
+
+from single_flight import SingleFlight  # noqa: E402
+
+
+def test_cancelled_leader_does_not_cancel_followers():
+    flights = SingleFlight()
+    calls = []
+
+    async def _load():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "ok"
+
+    async def _run():
+        leader = asyncio.ensure_future(flights.do("k", _load))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flights.do("k", _load))
+        await asyncio.sleep(0)
+        leader.cancel()
+        assert await follower == "ok"
+        # Terminada la carga, la clave queda libre para la siguiente
+        assert await flights.do("k", _load) == "ok"
+
+    asyncio.run(_run())
+    assert len(calls) == 2
+    assert flights.stats() == {"inflight": 0, "leaders": 2, "coalesced": 1}
@@ -0,0 +1,153 @@
+import asyncio
+import datetime
+import sys
+import time
+import uuid
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+SRC = ROOT / "src"
+for p in (ROOT, SRC):
+    if str(p) not in sys.path:
+        sys.path.insert(0, str(p))
+
+import request_context  # noqa: E402
+import slow_queries  # noqa: E402
+from db import connection as db_connection  # noqa: E402
+from db.sqlc import messages as sqlc_messages  # noqa: E402
+
+SQL = db_connection.COMPILED[
+    sqlc_messages.LIST_THREAD_MESSAGES_NOT_DELETED_DESC_FIRST
+].sql
+
+
+class _FakeSide:
+    def __init__(self):
+        self.calls = []
+        self.closed = False
+
+    def transaction(self):
+        side = self
+
+        class _Tr:
+            async def start(self):
+                side.calls.append("begin")
+
+            async def rollback(self):
+                side.calls.append("rollback")
+
+        return _Tr()
+
+    async def fetch(self, sql, *args):
+        self.calls.append((sql, args))
+        return [("Index Scan using idx_messages_thread_not_deleted_created",)]
+
+    async def close(self):
+        self.closed = True
+
+
+def _reset(monkeypatch):
+    monkeypatch.setattr(
+        slow_queries, "_records", slow_queries.collections.deque(maxlen=5)
+    )
+    monkeypatch.setattr(
+        slow_queries, "_plans", slow_queries.collections.deque(maxlen=5)
+    )
+    monkeypatch.setattr(slow_queries, "_explained", set())
+    monkeypatch.setattr(slow_queries, "_explain_task", None)
+
+
+def test_only_statements_over_threshold_reach_slow_observers(monkeypatch):
+    seen = []
+    monkeypatch.setattr(db_connection, "_slow_observers", [])
+    db_connection.add_slow_query_observer(
+        lambda sql, args, s: seen.append((sql, args)), 0.05
+    )
+    db_connection._observe(SQL, time.perf_counter(), ("fast",))
+    db_connection._observe(SQL, time.perf_counter() - 0.1, ("slow",))
+    assert seen == [(SQL, ("slow",))]
+
+
+def test_slow_query_record_and_single_explain(monkeypatch):
+    _reset(monkeypatch)
+    monkeypatch.setattr(slow_queries, "SLOW_QUERY_EXPLAIN", True)
+    side = _FakeSide()
+    opened = []
+
+    async def _connect_side(**kwargs):
+        opened.append(kwargs)
+        return side
+
+    monkeypatch.setattr(db_connection, "connect_side", _connect_side)
+
+    async def _run():
+        token = request_context.begin()
+        request_context.observe_pool_wait(0.003)
+        args = (uuid.uuid4(), 20)
+        slow_queries.observe(SQL, args, 0.25)
+        slow_queries.observe(SQL, (uuid.uuid4(), 50), 0.3)
+        await slow_queries._explain_task
+        stats = request_context.end(token)
+        return stats
+
+    stats = asyncio.run(_run())
+    # El EXPLAIN corre en otro contexto: no suma al request
+    assert stats.db_queries == 0
+
+    records = slow_queries.snapshot()["records"]
+    assert [r["duration_ms"] for r in records] == [300.0, 250.0]
+    assert records[0]["query"] == "list_thread_messages_not_deleted_desc_first"
+    assert records[0]["param_shape"] == records[1]["param_shape"]
+    assert records[0]["pool_wait_ms"] == 3.0
+
+    assert len(opened) == 1 and side.closed
+    assert side.calls[0] == "begin" and side.calls[-1] == "rollback"
+    assert side.calls[1][0].startswith("EXPLAIN (ANALYZE, BUFFERS) ")
+    plans = slow_queries.snapshot()["plans"]
+    assert len(plans) == 1 and "idx_messages_thread_not_deleted_created" in (
+        plans[0]["plan"]
+    )
+    assert plans[0]["analyze"] is True
+
+
+def test_param_shape_ignores_values():
+    a = (uuid.uuid4(), datetime.datetime(2025, 1, 1), 20)
+    b = (uuid.uuid4(), datetime.datetime(2026, 1, 1), 50)
+    assert slow_queries.param_shape(a) == slow_queries.param_shape(b)
+    assert slow_queries.param_shape(a) != slow_queries.param_shape(a[:2])
+
+
+def test_read_only_detects_dml():
+    assert slow_queries.read_only(SQL)
+    assert slow_queries.read_only("SELECT id FROM outbox FOR UPDATE SKIP LOCKED")
+    assert slow_queries.read_only("WITH t AS (SELECT 1) SELECT * FROM t")
+    for sql in (
+        "-- name: create_message :one\nINSERT INTO messages (id) VALUES ($1)",
+        "UPDATE outbox SET attempts = attempts + 1 WHERE id = $1",
+        "DELETE FROM outbox WHERE id = ANY($1)",
+        "WITH d AS (DELETE FROM outbox RETURNING id) SELECT count(*) FROM d",
+        "WITH u AS (UPDATE outbox AS o SET attempts = 0 RETURNING o.id) SELECT 1",
+    ):
+        assert not slow_queries.read_only(sql), sql
+
+
+def test_dml_is_explained_without_analyze(monkeypatch):
+    _reset(monkeypatch)
+    monkeypatch.setattr(slow_queries, "SLOW_QUERY_EXPLAIN", True)
+    side = _FakeSide()
+
+    async def _connect_side(**kwargs):
+        return side
+
+    monkeypatch.setattr(db_connection, "connect_side", _connect_side)
+    sql = "-- name: delete_outbox_events :exec\nDELETE FROM outbox WHERE id = ANY($1)"
+
+    async def _run():
+        slow_queries.observe(sql, ([1, 2],), 0.25)
+        await slow_queries._explain_task
+
+    asyncio.run(_run())
+    explained = side.calls[1][0]
+    assert explained == "EXPLAIN " + sql
+    assert "ANALYZE" not in explained
+    assert slow_queries.snapshot()["plans"][0]["analyze"] is False
@@ -0,0 +1,79 @@
+import json
+import logging
+import queue
+import sys
+from pathlib import Path
+
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+ROOT = Path(__file__).resolve().parents[1]
+SRC = ROOT / "src"
+for p in (ROOT, SRC):
+    if str(p) not in sys.path:
+        sys.path.insert(0, str(p))
+
+import request_context  # noqa: E402
+import structured_logging  # noqa: E402
+
+
+class _ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.setFormatter(structured_logging.JsonFormatter())
+        self.lines = []
+
+    def emit(self, record):
+        self.lines.append(json.loads(self.format(record)))
+
+
+def _app(monkeypatch, rate):
+    monkeypatch.setattr(structured_logging, "LOG_SUCCESS_SAMPLE_RATE", rate)
+    handler = _ListHandler()
+    logger = logging.getLogger("test_access")
+    logger.handlers = [handler]
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+    app = FastAPI()
+    app.add_middleware(
+        structured_logging.AccessLogMiddleware, logger_name="test_access"
+    )
+
+    @app.get("/threads/{thread_id}/messages")
+    async def _list(thread_id: str):
+        request_context.note_cache("hit")
+        request_context.observe_query("SELECT 1", 0.002)
+        return {"ok": True}
+
+    @app.get("/boom")
+    async def _boom():
+        raise HTTPException(status_code=404)
+
+    return TestClient(app), handler
+
+
+def test_access_line_has_route_template_cache_and_db_time(monkeypatch):
+    client, handler = _app(monkeypatch, 1.0)
+    assert client.get("/threads/abc/messages").status_code == 200
+    (line,) = handler.lines
+    assert line["event"] == "access"
+    assert line["route"] == "/threads/{thread_id}/messages"
+    assert line["status"] == 200
+    assert line["cache"] == "hit"
+    assert line["db_queries"] == 1 and line["db_ms"] == 2.0
+
+
+def test_sampling_drops_successes_but_keeps_errors(monkeypatch):
+    client, handler = _app(monkeypatch, 0.0)
+    client.get("/threads/abc/messages")
+    client.get("/boom")
+    assert [line["status"] for line in handler.lines] == [404]
+
+
+def test_full_queue_drops_instead_of_blocking():
+    h = structured_logging.DroppingQueueHandler(queue.Queue(1))
+    record = logging.LogRecord("x", logging.INFO, __file__, 1, "m", None, None)
+    h.handle(record)
+    h.handle(record)
+    assert h.dropped == 1